@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# ANOMALY DETECTION
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Keeps an exponentially weighted mean and variance (EWMA) of every telemetry series (port, receiver card,
+#   metric) seen by check_runner.py, updated in constant time per sample
+# - Only registers read from the cards during the sweep count as samples (history.fresh_samples), a value served
+#   from the register cache would otherwise be counted again on every sweep and shrink the spread
+# - A sample further than "threshold" standard deviations from the baseline of its own series is an anomaly,
+#   e.g. a cabinet heating up or a PSU voltage dropping while still within its valid range
+# - The spread never goes below "minDeviation" of the metric, so a series which barely moves (brightness fixed
+#   at 100%) does not flag every small step
+# - Nothing is flagged during the first "warmup" samples of a series, the baseline starts as a plain average
+# - Settings from "anomalyDetection" in config.json, read on every update so a reload applies at once
+# - Baselines live in memory only and are rebuilt after a restart of the runner
+# ------------------------------------------------------------------------------------------------------------
+import math
+from history import fresh_samples
+
+ALPHA = 0.05 # weight of a new sample, about the last 40 samples make the baseline
+THRESHOLD = 4.0 # standard deviations
+WARMUP = 30 # samples
+MIN_DEVIATION = { # smallest spread per metric, in the unit of the metric
+   "temperature": 1.0,
+   "voltage": 0.05,
+   "brightness": 2.0,
+   "ambient_light": 5.0,
+   "module_faults": 1.0,
+   "block_faults": 1.0,
+}
+
+class Ewma:
+   """Exponentially weighted mean and variance of one series."""
+   def __init__(self):
+      self.count = 0
+      self.mean = 0.0
+      self.variance = 0.0
+
+   def update(self, value, alpha):
+      self.count += 1
+      alpha = max(alpha, 1.0/self.count) # plain average until 1/alpha samples were seen
+      difference = value - self.mean
+      increment = alpha * difference
+      self.mean += increment
+      self.variance = (1 - alpha) * (self.variance + difference * increment)
+
+class Detectors:
+   def __init__(self):
+      self.series = {} # (port, receiver, metric) -> Ewma
+
+   def update(self, snapshot, settings=None):
+      """Scores every fresh sample of the snapshot against the baseline of its series, then adds it to the baseline.
+      Returns {port: {receiver: {metric: {"value", "baseline", "spread", "deviation", "anomaly"}}}}."""
+      settings = settings or {}
+      alpha = float(settings.get("alpha", ALPHA))
+      threshold = float(settings.get("threshold", THRESHOLD))
+      warmup = int(settings.get("warmup", WARMUP))
+      min_deviation = dict(MIN_DEVIATION, **settings.get("minDeviation", {}))
+      result = {}
+      for _, port, receiver, metric, value in fresh_samples(snapshot):
+         ewma = self.series.setdefault((port, receiver, metric), Ewma())
+         if ewma.count:
+            spread = max(math.sqrt(ewma.variance), float(min_deviation.get(metric, 0)) or 1e-9)
+            deviation = (value - ewma.mean) / spread
+            result.setdefault(port, {}).setdefault(receiver, {})[metric] = {
+               "value": value,
+               "baseline": round(ewma.mean, 3),
+               "spread": round(spread, 3),
+               "deviation": round(deviation, 2),
+               "anomaly": ewma.count >= warmup and abs(deviation) > threshold,
+            }
+         ewma.update(value, alpha)
+      return result
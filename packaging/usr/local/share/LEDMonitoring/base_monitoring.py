@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
-import serial, sys, os, time, logging, datetime, json, methods, asyncio
+import serial, sys, os, time, logging, datetime, json, methods, asyncio, protocol, check_results
 from serial import SerialException
 import serial.tools.list_ports
 from sys import platform
 from logging.handlers import TimedRotatingFileHandler
 from methods import read_data, write_data, loadConfig
+from status_store import StatusStore
 from command import *
 # ------------------------------------------------------------------------------------------------------------
 # DEFINITIONS AND INITIALISATIONS
@@ -32,24 +33,66 @@ WARNING = 1
 CRITICAL = 2
 UNKNOWN = 3
 
-async def communicate_with_server(callback, check_name):
-   global data
+async def communicate_with_server(callback, check_name, ports=None, priority=None, deadline=None, last_good=True):
    global logger
    logger = methods.get_logger("ASYNCIO","ASYNCIO",FORMATTER,LOGGER_SCHEDULE,LOGGER_INTERVAL,LOGGER_BACKUPS) # Set up the logging
-   """Asynchronous client communication with the server."""
+   """Asynchronous client communication with the server (framed messages, see protocol.py). Without ports the
+   server hands out every COM port, priority is the class the server queues the request in (control, fast or
+   heavy). With a deadline (epoch seconds) the server rejects the request when the ports can't be granted in time.
+   With last_good the check answers its last known good result when the COM ports can't be obtained. Off for the
+   sweeps of the check runner, which are no Icinga checks: they get ConnectionError instead of an answer."""
    logger.info("ESTABLISHING CONNECTION WITH LOCAL SERVER QUEUE")
-   reader, writer = await asyncio.open_connection("127.0.0.1",8888)
-   if not reader and not writer:
-      logger.error("COULD NOT ESTABLISH CONNECTION WITH 127.0.0.1 ON PORT 8888")
-   writer.write(f"{check_name}".encode())
-   await writer.drain()
+   endpoint = methods.listener_endpoint() # monitoring_listener.py, hands out access to the COM ports
+   try:
+      reader, writer = await protocol.open_connection(endpoint)
+   except OSError as e:
+      logger.error(f"COULD NOT ESTABLISH CONNECTION WITH {endpoint}: {e}")
+      await com_ports_unavailable("Could not make connection with localserver to access com port", None, check_name, last_good)
+   request = {"type": "request", "task": check_name}
+   if ports:
+      request["ports"] = list(ports)
+   if priority:
+      request["priority"] = priority
+   if deadline:
+      request["deadline"] = deadline
+   await protocol.write_message(writer, request)
    logger.info("AWAITING PERMISSION TO USE COM PORTS FROM LOCAL SERVER")
-   data = await reader.read(1024)
-   if not data.decode().strip() == "START":
-      logger.error("")
-      await icinga_output("Could not make connection with localserver to access com port", UNKNOWN,reader, writer)
-   logger.info(f"PERMISSION TO USE COM PORT GRANTED STARTING {check_name} SCRIPT")
+   answer = await protocol.read_message(reader) # local, the runner has several sweeps waiting for their ports at once
+   if answer and answer["type"] == "reject":
+      logger.warning(f"{check_name} REJECTED BY LOCAL SERVER ({answer.get('reason')}), COM PORTS NOT AVAILABLE BEFORE THE DEADLINE")
+      await com_ports_unavailable("COM ports not available before the check deadline", writer, check_name, last_good)
+   if not answer or answer["type"] != "start":
+      logger.error(f"UNEXPECTED ANSWER FROM LOCAL SERVER: {answer}")
+      await com_ports_unavailable("Could not make connection with localserver to access com port", writer, check_name, last_good)
+   logger.info(f"PERMISSION TO USE COM PORT GRANTED AFTER {answer.get('waited', 0)}s STARTING {check_name} SCRIPT")
    await callback(reader, writer)
+async def com_ports_unavailable(message, writer, check_name, last_good):
+   """Ends a request the listener did not grant. The connection is closed without "done", the task never held the
+   ports. A check answers Icinga (its last known good result or UNKNOWN) and exits, a sweep of the check runner
+   prints nothing and gets ConnectionError."""
+   if writer is not None:
+      writer.close()
+   if not last_good:
+      raise ConnectionError(message)
+   await icinga_output(message, UNKNOWN, None, None, check_name, unavailable=True)
+async def run_check(reader, writer, check_name):
+   """Main of the check_*.py scripts: reads the registers of the check from every sender card, merges them into
+   status.json and answers with the evaluator check_runner.py answers the check with (snapshot_checks.py)."""
+   import snapshot_checks # imports read_engine.py, which imports this module
+   logger = methods.get_logger(LOGGER_NAME,LOG_FILE,FORMATTER,LOGGER_SCHEDULE,LOGGER_INTERVAL,LOGGER_BACKUPS) # Set up the logging
+   logger.info(f"5Eyes - Starting {check_name}")
+   config = loadConfig(LOGGER_NAME) # Load the configuration information
+   try:
+      output, exit_code, sweep = snapshot_checks.live_check(check_name, config)
+      status_store = StatusStore(STATUS_FILE)
+      status_store.update_snapshot(sweep) # merged into status.json, the sections of the other checks stay untouched
+      if status_store.flush():
+         logger.info(f"Written to {STATUS_FILE}")
+   except Exception as e:
+      logger.exception(f"{check_name} failed: {e}")
+      output, exit_code = f"{check_name} failed: {e}", UNKNOWN
+   logger.info("EXIT CODE: {}, {}".format(exit_code, output))
+   await icinga_output(output, exit_code, reader, writer, check_name)
 def initialize_program():
    global sleep_time
    global flash_wait_time
@@ -70,6 +113,7 @@ def initialize_program():
    data = read_data(STATUS_FILE,LOGGER_NAME)
    status = {} # Initialise variable to store status data\
    modules_ok = True # assume all modules are ok to start off
+   return config, sleep_time, flash_wait_time, status
 def search_devices(ser, sleep_time, status): # Searches for all sender cards connected to each USB port (/dev/ttyUSBX) on the system
    logger = logging.getLogger(LOGGER_NAME)
    ports = serial.tools.list_ports.comports()
@@ -140,10 +184,13 @@ def check_response(received_data):
    except Exception as e:
       logger.error('Command failed due to error: {}'.format(e))
       return False
-async def icinga_output(message, exit_status, reader, writer):
-   global data
+async def icinga_output(message, exit_status, reader, writer, check_name=None, unavailable=False):
    global logger
-   """Outputs the result to Icinga and notifies the server."""
+   """Outputs the result to Icinga and notifies the server. With check_name a definitive result is stored as the
+   last known good result of the check, and when unavailable (COM ports busy or listener unreachable) an UNKNOWN is
+   replaced by it."""
+   if isinstance(exit_status, int):
+      exit_status = [exit_status]
    exit_code = 0
    if 2 in exit_status:
       exit_code = 2
@@ -151,14 +198,31 @@ async def icinga_output(message, exit_status, reader, writer):
       exit_code = 1
    elif 3 in exit_status:
       exit_code = 3 
-        
+   if isinstance(message, list):
+      message = "\n".join(str(line) for line in message)
+   if check_name is not None:
+      try:
+         exit_code, message = check_results.with_fallback(check_name, exit_code, message, loadConfig(LOGGER_NAME), logger, unavailable)
+      except Exception as e:
+         logger.error(f"Error reading or storing the last known good result of {check_name}: {e}")
+   print(str(message).strip())
+   if writer is not None:
+      await release_com_port(reader, writer, {"exit_code": exit_code, "output": str(message)})
+   sys.exit(exit_code)
+async def yield_com_port(reader, writer):
+   """Lets a waiting task with a better priority use the COM ports, returns once they are granted again."""
+   await protocol.write_message(writer, {"type": "yield"})
+   data = await protocol.read_message(reader)
+   if not data or data["type"] != "start":
+      raise ConnectionError("Server did not give the COM ports back after yielding")
+async def release_com_port(reader, writer, result=None):
+   """Tells the server the COM ports are free again, with the result of the check, and waits for its acknowledgement."""
    try:
-      writer.write(b"Done")
-      await writer.drain()
-      await reader.read(1024)
+      await protocol.write_message(writer, {"type": "done", "result": result})
+      data = await protocol.read_message(reader)
       writer.close()
       await writer.wait_closed()
-      logger.info("Sent 'done' to server.")
+      if data:
+         logger.info("Sent 'done' to server, ports held {}s".format(data.get("held")))
    except Exception as e:
       logger.error(f"Error sending completion message: {e}")
-   sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# ICINGA CLIENT FOR THE RESIDENT CHECK RUNNER
+#
+# USAGE
+# Linux: python3 check_client.py CHECK_DVI ;echo $?
+#
+# DESCRIPTION
+# - Sends a request for the check to check_runner.py (framed JSON, see protocol.py), prints the check output and exits with the check exit code
+# - request_checks() asks for several checks in one round trip (batch request)
+# - Only uses the standard library: no pyserial or logger setup before the answer comes back, config.json is only
+#   read for "runnerEndpoint" (protocol.endpoints())
+# ------------------------------------------------------------------------------------------------------------
+import sys, protocol
+
+TIMEOUT = 120 # seconds, a module check on a large wall can take more than a minute
+
+# EXIT CODES
+UNKNOWN = 3
+
+def request_checks(check_names, timeout=TIMEOUT):
+   """Asks check_runner.py for several checks in one round trip. Returns a list of {"check", "exit_code",
+   "output"} in the same order, raises OSError when the runner can't be reached or doesn't answer."""
+   endpoint = protocol.endpoints()["runner"]
+   with protocol.connect(endpoint, timeout=timeout) as sock:
+      protocol.send_message(sock, {"type": "request", "id": 1, "checks": list(check_names)})
+      reply = protocol.recv_message(sock)
+   if reply is None or reply.get("type") != "results":
+      raise ConnectionError(f"No answer from check runner on {endpoint}")
+   return reply["results"]
+
+def main(argv):
+   if len(argv) < 2:
+      print("USAGE: check_client.py <CHECK_NAME>")
+      return UNKNOWN
+   endpoint = protocol.endpoints()["runner"]
+   try:
+      with protocol.connect(endpoint, timeout=TIMEOUT) as sock:
+         protocol.send_message(sock, {"type": "request", "id": 1, "check": argv[1]})
+         result = protocol.recv_message(sock)
+   except (OSError, ValueError) as e:
+      print(f"Could not reach check runner on {endpoint} - {e}")
+      return UNKNOWN
+   if result is None or result.get("type") != "result":
+      print(f"No answer from check runner on {endpoint}")
+      return UNKNOWN
+   print(str(result.get("output", "")).strip())
+   exit_code = result.get("exit_code")
+   return exit_code if isinstance(exit_code, int) else UNKNOWN
+
+if __name__ == "__main__":
+   sys.exit(main(sys.argv))
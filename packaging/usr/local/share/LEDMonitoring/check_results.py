@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# LAST KNOWN GOOD CHECK RESULTS
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Keeps the last definitive result (OK, WARNING or CRITICAL) of every check in check_results.json, with the
+#   time it was obtained
+# - A check which would answer UNKNOWN because the COM ports are busy or the listener can't be reached (rejected
+#   before its deadline, no answer, no fresh sweep in time) answers with its stored result instead, as long as it
+#   is younger than "lastGoodMaxAge" seconds (0 disables the fallback). Any other UNKNOWN is passed on as it is. The output then starts with "(cached, <age>s old)" so it is never mistaken for a
+#   fresh reading
+# - Cached answers are never stored again, a result can not outlive its maximum age by being passed on
+# - Written like status.json: under a lock, merged per check, temporary file renamed over the old one
+# ------------------------------------------------------------------------------------------------------------
+import json, time
+from status_store import atomic_write
+try:
+   import fcntl
+except ImportError: # Windows, writers are not serialised there
+   fcntl = None
+
+RESULTS_FILE = "check_results.json"
+MAX_AGE = 900 # seconds, a stored result older than this is not used
+CACHED_PREFIX = "(cached"
+UNKNOWN = 3
+
+def is_cached(output):
+   return str(output).startswith(CACHED_PREFIX)
+
+def mark_cached(output, age):
+   return "{}, {:.0f}s old) {}".format(CACHED_PREFIX, age, output)
+
+def read(filename=RESULTS_FILE):
+   try:
+      with open(filename, "r") as f:
+         return json.load(f)
+   except (IOError, ValueError):
+      return {}
+
+def store(results, filename=RESULTS_FILE, timestamp=None):
+   """Stores {check name: (exit code, output)}, leaving out UNKNOWN and cached answers. Returns how many were
+   stored."""
+   timestamp = time.time() if timestamp is None else timestamp
+   fresh = {check_name: {"exitCode": exit_code, "output": str(output), "timestamp": timestamp}
+            for check_name, (exit_code, output) in results.items() if exit_code != UNKNOWN and not is_cached(output)}
+   if not fresh:
+      return 0
+   lock = open(filename + ".lock", "a")
+   try:
+      if fcntl is not None:
+         fcntl.flock(lock, fcntl.LOCK_EX) # the runner and the check scripts store into the same file
+      data = read(filename)
+      data.update(fresh)
+      atomic_write(filename, json.dumps(data, separators=(",", ":"), sort_keys=True))
+   finally:
+      lock.close()
+   return len(fresh)
+
+def last_good(check_name, max_age=MAX_AGE, filename=RESULTS_FILE):
+   """Returns (exit code, output marked as cached) of the stored result of the check, None when there is none
+   younger than max_age."""
+   result = read(filename).get(check_name)
+   if not max_age or not result:
+      return None
+   age = time.time() - result["timestamp"]
+   if age > float(max_age) or age < 0:
+      return None
+   return result["exitCode"], mark_cached(result["output"], age)
+
+def with_fallback(check_name, exit_code, output, config, logger=None, unavailable=False):
+   """Stores a definitive answer. An UNKNOWN caused by unavailable COM ports is replaced by the last known good
+   result when there is one. Returns (exit code, output)."""
+   filename = config.get("lastGoodFile", RESULTS_FILE)
+   if exit_code != UNKNOWN:
+      store({check_name: (exit_code, output)}, filename)
+      return exit_code, output
+   if not unavailable:
+      return exit_code, output
+   fallback = last_good(check_name, config.get("lastGoodMaxAge", MAX_AGE), filename)
+   if fallback is None:
+      return exit_code, output
+   if logger is not None:
+      logger.warning(f"{check_name} UNKNOWN ({str(output).strip()}), answering the last known good result")
+   return fallback
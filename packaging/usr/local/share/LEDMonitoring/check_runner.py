@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# RESIDENT CHECK RUNNER
+# Please read the README.TXT file for further information and details.
+#
+# USAGE
+# Linux: python3 check_runner.py (run by led-monitoring-runner.service, or by /usr/local/bin/monitoring_tool
+#        when the unit is not enabled)
+# Icinga: python3 check_client.py CHECK_DVI ;echo $?
+#
+# DESCRIPTION
+# - Long running process which keeps pyserial, config.json and the loggers loaded, so an Icinga check no longer
+#   pays for a new python3 interpreter and its imports on every run
+# - Every check is evaluated by snapshot_checks.py (SNAPSHOT_CHECKS) under the name sent by the Icinga wrappers
+#   (check_client.py), from a snapshot or from a live sweep. The check_*.py scripts run
+#   the same evaluators on a live sweep of their own, for running by hand
+# - Requests and results are framed JSON messages (protocol.py), one connection can carry several requests
+# - A batch request names several checks and gets every result back in one message, evaluated from one snapshot
+#   or one live sweep, so all LED services of a host can be submitted at once
+# - Checks still obtain the COM ports through base_monitoring.communicate_with_server, so the listener keeps
+#   serialising access to the sender cards
+#
+# SNAPSHOT MODE ("snapshotMode": "Enabled" in config.json)
+# - A background sweep (read_engine.py) reads every register the checks need once every "sweepInterval" seconds,
+#   holding the COM ports through the listener for the duration of the sweep only
+# - Checks are evaluated against the latest snapshot in memory (snapshot_checks.py) and never queue on the port
+# - A snapshot older than "snapshotMaxAge" seconds is never used: the check waits for a fresh sweep instead
+#   and answers UNKNOWN if that sweep fails
+# - Registers are cached between sweeps (register_cache.py) and only read again once older than their
+#   "pollingCadence" entry, registers with a cadence are swept even when no check needs them (e.g. module_flash)
+# - Every sweep is merged into status.json per port and receiver card (status_store.py)
+# - With "historyMode": "Enabled" the telemetry of every sweep is also appended to the history database
+#   (history.py, "historyFile", at most "historyMaxBytes")
+# - With "ringMode": "Enabled" it is written to the memory-mapped ring buffer "ringFile" as well (ringbuffer.py),
+#   which never grows and which other processes read without locking
+# - With "anomalyMode": "Enabled" every sweep is scored against the EWMA baseline of each series (anomaly.py)
+#   before the checks see it, temperature, voltage and brightness far from their baseline answer WARNING
+# - Discovery holds every COM port, the sweep itself then asks the listener for one port per sender card so
+#   sender cards on different ports are read in parallel
+# - Sweeps reading module registers are queued as heavy and yield their port between two receiver cards, so
+#   display control does not wait for a whole module flash sweep
+#
+# LIVE MODE ("snapshotMode" not "Enabled")
+# - Requests arriving within "coalesceWindow" seconds of each other are merged: the registers they need are
+#   read in one sweep under one listener slot, and every request is then evaluated against that sweep
+#
+# PASSIVE MODE ("passiveMode": "Enabled" in config.json)
+# - Every "passiveInterval" seconds all checks are answered in one batch and pushed to Icinga as passive check
+#   results (passive.py), the Icinga services then need no active check at all
+#
+# EXPORTER ("exporterMode": "Enabled" in config.json)
+# - Serves the snapshot as OpenMetrics text on http://"exporterHost":"exporterPort"/metrics (exporter.py), a
+#   scrape never reads from the sender cards
+#
+# CONFIG RELOAD
+# - config.json is read once and kept in memory. It is read again on SIGHUP or when its modification time changes
+# - A new configuration is validated first and replaces the running one in a single step, a sweep already
+#   running finishes with the configuration it started with. An invalid file is logged and ignored
+# - Only the cached registers depending on a changed key are dropped (CONFIG_REGISTERS), thresholds, cadences and
+#   expected counts apply from the next evaluation on
+#
+# DEADLINES
+# - Every request must be answered within "checkTimeout" seconds (keep it below the Icinga plugin timeout). The
+#   deadline is passed on to the listener, which rejects a sweep that can't get its COM ports in time
+# - A request whose client closed the connection (Icinga gave up) is cancelled, a live batch left without any
+#   request is not swept
+# - A live check whose sweep was rejected is answered from the last sweep when younger than "snapshotMaxAge",
+#   marked as cached, UNKNOWN otherwise
+# - Every definitive answer is stored in check_results.json. An answer still UNKNOWN because the sender cards
+#   could not be read in time is replaced by the last known good result of the check when younger than
+#   "lastGoodMaxAge" seconds, marked as cached as well
+# ------------------------------------------------------------------------------------------------------------
+from base_monitoring import *
+import functools, json, signal, exporter, passive, protocol, read_engine
+from register_cache import RegisterCache
+from status_store import StatusStore
+from history import History, HISTORY_FILE, MAX_BYTES, RAW_MAX_AGE
+from ringbuffer import RingBuffer, RING_FILE, CAPACITY
+from anomaly import Detectors
+import check_results
+from snapshot_checks import SNAPSHOT_CHECKS, sweep_registers
+
+# LOGGER
+LOG_FILE = "debug_runner.log"
+LOGGER_NAME = "check_runner"
+
+# SNAPSHOT DEFAULTS, used when the keys are missing from config.json
+SWEEP_INTERVAL = 60 # seconds between two background sweeps
+SNAPSHOT_MAX_AGE = 180 # seconds, older snapshots are refreshed before a check is answered
+COALESCE_WINDOW = 0.5 # seconds a live request waits for others to share its sweep
+CHECK_TIMEOUT = 50 # seconds, below the 60s default Icinga plugin timeout
+PASSIVE_INTERVAL = 60 # seconds between two pushes of passive check results
+EXPORTER_HOST = "0.0.0.0" # OpenMetrics endpoint, reached by Prometheus from outside
+EXPORTER_PORT = 9877
+CONFIG_WATCH_INTERVAL = 5 # seconds between two looks at the modification time of config.json
+
+# Cached registers depending on a config.json key, None for all of them (another baudrate may find other devices)
+CONFIG_REGISTERS = {
+   "baudrate": None,
+   "modules": ["module_status", "module_flash"], # the number of modules sets the length read
+}
+# UNKNOWN answers caused by the COM ports, answered from the last known good result instead (check_results.py)
+NO_SNAPSHOT = "No status snapshot younger than {:.0f}s available"
+NOT_READ = "Could not read the sender cards in time, see debug_runner.log"
+RESTART_KEYS = ("listenerEndpoint", "runnerEndpoint", "exporterMode", "exporterHost", "exporterPort", "historyMode", "historyFile", "historyMaxBytes", "historyRawMaxAge", "ringMode", "ringFile", "ringCapacity") # only applied when the runner starts
+
+# ------------------------------------------------------------------------------------------------------------
+# SNAPSHOT
+def snapshot_enabled():
+   return config.get("snapshotMode", "Disabled") == "Enabled"
+
+def snapshot_registers():
+   """Registers needed by the snapshot checks plus every register given a polling cadence in config.json."""
+   registers = sweep_registers(SNAPSHOT_CHECKS)
+   for register in config.get("pollingCadence", {}):
+      if register not in registers and (register in read_engine.SENDER_READERS or register in read_engine.RECEIVER_READERS):
+         registers.append(register)
+   return registers
+
+def snapshot_age():
+   if snapshot is None:
+      return None
+   return time.time() - snapshot["timestamp"]
+
+async def with_com_ports(task_name, function, *args, ports=None, priority=None, yielding=False, deadline=None):
+   """Runs a blocking read_engine function in a thread while the listener grants the given COM ports (all
+   ports when None). With yielding the function gets a yield_point() giving the ports to more urgent tasks.
+   Returns the function result, None when the ports were not granted or the function failed."""
+   result = {}
+   async def run(reader, writer):
+      loop = asyncio.get_event_loop()
+      call = function
+      if yielding:
+         def yield_point():
+            asyncio.run_coroutine_threadsafe(yield_com_port(reader, writer), loop).result()
+         call = functools.partial(function, yield_point=yield_point)
+      try:
+         result["value"] = await loop.run_in_executor(None, call, *args)
+      finally:
+         await release_com_port(reader, writer)
+   try:
+      await communicate_with_server(run, task_name, ports, priority, deadline, last_good=False)
+   except ConnectionError as e: # the listener did not hand out the COM ports
+      logger.error(f"Listener refused the COM ports for {task_name}: {e}")
+   except Exception as e:
+      logger.exception(f"{task_name} failed: {e}")
+   return result.get("value")
+
+async def locked_sweep(registers, register_cache, deadline=None, name="SNAPSHOT"):
+   """Discovers the sender cards holding every COM port, then sweeps each sender card in parallel holding its
+   own port only. The sweeps are queued as "SWEEP:<name>" (the checks of a live batch), so the listener learns
+   the duration of each register set on its own. Returns None when the discovery could not run."""
+   start_time = time.time()
+   ports = await with_com_ports("DISCOVERY", read_engine.discover, config, deadline=deadline)
+   if ports is None:
+      return None
+   priority = "heavy" if any(register in read_engine.HEAVY_REGISTERS for register in registers) else "fast"
+   results = await asyncio.gather(*(
+      with_com_ports(f"SWEEP:{name}", read_engine.sweep_single_port, config, port, registers, ports[port], register_cache,
+                     ports=[port], priority=priority, yielding=True, deadline=deadline)
+      for port in sorted(ports)
+   ))
+   fresh = {}
+   for port, read in zip(sorted(ports), results):
+      if read is None:
+         ports[port]["error"] = "COM port not granted by the listener"
+      else:
+         fresh[port] = read
+   logger.info("Sweep of {} device(s) finished in {:.2f}s".format(len(ports), time.time()-start_time))
+   return read_engine.make_snapshot(ports, fresh)
+
+async def take_snapshot():
+   """Sweeps every snapshot register and stores the result as the current snapshot."""
+   global snapshot
+   result = await locked_sweep(snapshot_registers(), cache)
+   if result is not None:
+      score(result)
+      snapshot = result
+      asyncio.ensure_future(store_snapshot(result))
+   return snapshot
+
+def score(result):
+   """Adds the deviation of every sample from the baseline of its series to the sweep ("baselines")."""
+   if config.get("anomalyMode", "Disabled") == "Enabled":
+      result["baselines"] = detectors.update(result, config.get("anomalyDetection"))
+
+async def store_snapshot(result):
+   """Merges a sweep into status.json, per port and receiver card, and appends it to the history, without
+   blocking the event loop on the writes."""
+   status.update_snapshot(result)
+   if ring is not None:
+      try:
+         ring.record(result) # memory writes only, no need for an executor
+      except Exception as e:
+         logger.error(f"Error writing the ring buffer: {e}")
+   async with status_lock: # one write at a time, later sweeps queue their updates meanwhile
+      try:
+         if await asyncio.get_event_loop().run_in_executor(None, status.flush):
+            logger.info(f"Written to {STATUS_FILE}")
+      except Exception as e:
+         logger.error(f"Error writing {STATUS_FILE}: {e}")
+      if history is not None:
+         try:
+            count = await asyncio.get_event_loop().run_in_executor(None, history.record, result)
+            logger.info(f"Recorded {count} sample(s) in {history.filename}")
+         except Exception as e:
+            logger.error(f"Error recording history: {e}")
+
+async def refresh_snapshot():
+   """Starts a sweep unless one is already running and waits for it, concurrent callers share the same sweep."""
+   global sweep_task
+   if sweep_task is None or sweep_task.done():
+      sweep_task = asyncio.ensure_future(take_snapshot())
+   return await asyncio.shield(sweep_task)
+
+async def sweep_loop():
+   while snapshot_enabled(): # ends when a config reload disables snapshot mode
+      start_time = time.time()
+      await refresh_snapshot()
+      logger.info("Snapshot sweep finished in {:.2f}s".format(time.time()-start_time))
+      await asyncio.sleep(float(config.get("sweepInterval", SWEEP_INTERVAL)))
+
+async def evaluate_snapshot(check_names, deadline):
+   """Answers the checks from one snapshot, refreshing it first when it is older than the allowed maximum age."""
+   max_age = float(config.get("snapshotMaxAge", SNAPSHOT_MAX_AGE))
+   age = snapshot_age()
+   if age is None or age > max_age:
+      logger.info(f"Snapshot too old for {', '.join(check_names)}, waiting for a fresh sweep")
+      try:
+         await asyncio.wait_for(refresh_snapshot(), deadline - time.time()) # the sweep itself goes on when the wait times out
+      except asyncio.TimeoutError:
+         logger.warning(f"No fresh snapshot before the deadline of {', '.join(check_names)}")
+      age = snapshot_age()
+      if age is None or age > max_age:
+         return [(UNKNOWN, NO_SNAPSHOT.format(max_age))] * len(check_names)
+   current = snapshot # every check of the request sees the same sweep, even when the next one lands meanwhile
+   return [evaluate(check_name, current) for check_name in check_names]
+
+def cached_answer(check_name):
+   """Answers from the last sweep when it is recent enough, UNKNOWN otherwise."""
+   max_age = float(config.get("snapshotMaxAge", SNAPSHOT_MAX_AGE))
+   age = snapshot_age()
+   if age is None or age > max_age:
+      return UNKNOWN, NOT_READ
+   exit_code, output = evaluate(check_name, snapshot)
+   return exit_code, check_results.mark_cached(output, age)
+
+def evaluate(check_name, sweep_result):
+   try:
+      output, exit_code = SNAPSHOT_CHECKS[check_name](sweep_result, config)
+   except Exception as e:
+      logger.exception(f"{check_name} failed on snapshot: {e}")
+      return UNKNOWN, f"{check_name} failed in check runner: {e}"
+   return exit_code, output
+
+# ------------------------------------------------------------------------------------------------------------
+# LIVE SWEEPS
+async def run_live(check_name, deadline):
+   """Adds the check to the batch collecting within the coalesce window and waits for its result."""
+   global pending
+   if pending is None:
+      pending = {}
+      asyncio.ensure_future(run_batch())
+   future = asyncio.get_event_loop().create_future()
+   pending.setdefault(check_name, []).append((future, deadline))
+   return await future
+
+async def run_batch():
+   """Reads the registers of every check in the batch in one sweep and answers each request from it."""
+   global pending
+   global snapshot
+   await asyncio.sleep(float(config.get("coalesceWindow", COALESCE_WINDOW)))
+   batch, pending = pending, None
+   batch = {check_name: [(future, deadline) for future, deadline in requests if not future.cancelled()] for check_name, requests in batch.items()}
+   batch = {check_name: requests for check_name, requests in batch.items() if requests}
+   if not batch: # every client of the batch went away meanwhile
+      return
+   registers = sweep_registers(batch)
+   deadline = min(deadline for requests in batch.values() for _, deadline in requests) # the most urgent request sets the pace
+   logger.info("Live sweep for {} request(s) of {} - registers: {}".format(sum(len(r) for r in batch.values()), ', '.join(sorted(batch)), ', '.join(registers)))
+   try:
+      result = await locked_sweep(registers, RegisterCache(), deadline, "+".join(sorted(batch))) # empty cache, a live check reads every register
+   except Exception as e:
+      logger.exception(f"Live sweep failed: {e}")
+      result = None
+   if result is not None:
+      score(result)
+      snapshot = result # kept to answer later requests whose sweep misses its deadline
+      asyncio.ensure_future(store_snapshot(result))
+   for check_name, requests in batch.items():
+      if result is None:
+         answer = cached_answer(check_name)
+      else:
+         answer = evaluate(check_name, result)
+      for future, _ in requests:
+         if not future.done():
+            future.set_result(answer)
+
+# ------------------------------------------------------------------------------------------------------------
+# PASSIVE RESULTS
+def passive_enabled():
+   return config.get("passiveMode", "Disabled") == "Enabled"
+
+async def passive_loop():
+   """Answers every check in one batch and pushes the results to Icinga, once every passive interval."""
+   check_names = sorted(SNAPSHOT_CHECKS)
+   while passive_enabled(): # ends when a config reload disables passive mode
+      start_time = time.time()
+      try:
+         answers = await answer(check_names, start_time + float(config.get("checkTimeout", CHECK_TIMEOUT)))
+         results = [(check_name, exit_code, output) for check_name, (exit_code, output) in zip(check_names, answers)]
+         target = await asyncio.get_event_loop().run_in_executor(None, passive.submit, config, results) # the pipe may be full
+         logger.info("Pushed {} passive result(s) to {} in {:.2f}s".format(len(results), target, time.time()-start_time))
+      except Exception as e:
+         logger.error(f"Error pushing passive results: {e}")
+      await asyncio.sleep(max(0.0, float(config.get("passiveInterval", PASSIVE_INTERVAL)) - (time.time()-start_time)))
+
+# ------------------------------------------------------------------------------------------------------------
+# CONFIG RELOAD
+def validate_config(new_config):
+   """Returns the problems found in a configuration, an empty list when it can be used."""
+   problems = []
+   for key, kind, minimum in (("baudrate", int, 1), ("sleepTime", float, 0), ("flashWaitTime", float, 0),
+                              ("devices", int, 0), ("receiver_cards", int, 0), ("modules", int, 0)):
+      try:
+         if kind(new_config[key]) < minimum:
+            problems.append(f"{key} below {minimum}")
+      except KeyError:
+         problems.append(f"{key} missing")
+      except (TypeError, ValueError):
+         problems.append(f"{key} is not a number")
+   for key in ("sweepInterval", "snapshotMaxAge", "coalesceWindow", "checkTimeout", "passiveInterval", "lastGoodMaxAge"):
+      try:
+         if key in new_config and float(new_config[key]) < 0:
+            problems.append(f"{key} below 0")
+      except (TypeError, ValueError):
+         problems.append(f"{key} is not a number")
+   cadences = new_config.get("pollingCadence", {})
+   if not isinstance(cadences, dict) or any(not isinstance(seconds, (int, float)) or seconds < 0 for seconds in cadences.values()):
+      problems.append("pollingCadence must give seconds per register")
+   anomaly_settings = new_config.get("anomalyDetection", {})
+   if not isinstance(anomaly_settings, dict) or not isinstance(anomaly_settings.get("minDeviation", {}), dict):
+      problems.append("anomalyDetection must be an object, minDeviation giving the smallest spread per metric")
+   outlier_settings = new_config.get("outlierDetection", {})
+   if not isinstance(outlier_settings, dict) or not isinstance(outlier_settings.get("minDeviation", {}), dict):
+      problems.append("outlierDetection must be an object, minDeviation giving the smallest MAD per metric")
+   return problems
+
+def invalidate_cache(changed):
+   """Drops the cached registers depending on the changed keys, returns True when anything was dropped."""
+   registers = set()
+   for key in changed:
+      if key not in CONFIG_REGISTERS:
+         continue
+      if CONFIG_REGISTERS[key] is None:
+         logger.info(f"{key} changed, dropping every cached register")
+         cache.invalidate()
+         return True
+      registers.update(CONFIG_REGISTERS[key])
+   for register in sorted(registers):
+      cache.invalidate(register=register)
+   if registers:
+      logger.info(f"Dropped cached registers: {', '.join(sorted(registers))}")
+   return bool(registers)
+
+async def reload_config(reason):
+   """Reads config.json again and applies it when valid."""
+   global config
+   try:
+      with open(methods.CONFIG, "r") as f:
+         new_config = json.load(f)
+   except (IOError, ValueError) as e:
+      logger.error(f"Config reload ({reason}) failed, keeping the running configuration: {e}")
+      return
+   problems = validate_config(new_config)
+   if problems:
+      logger.error(f"Config reload ({reason}) rejected, keeping the running configuration: {'; '.join(problems)}")
+      return
+   changed = sorted(key for key in set(config) | set(new_config) if config.get(key) != new_config.get(key))
+   if not changed:
+      return
+   config = new_config # one assignment, nothing ever sees half of each configuration
+   logger.info(f"Config reloaded ({reason}), changed: {', '.join(changed)}")
+   if any(key in RESTART_KEYS for key in changed):
+      logger.warning(f"{', '.join(key for key in changed if key in RESTART_KEYS)} only apply after a restart of the check runner")
+   if invalidate_cache(changed) and snapshot_enabled():
+      asyncio.ensure_future(refresh_snapshot()) # don't serve values read with the old settings until the next sweep
+   start_loops()
+
+async def config_watch_loop():
+   last_modified = os.stat(methods.CONFIG).st_mtime
+   while True:
+      await asyncio.sleep(CONFIG_WATCH_INTERVAL)
+      try:
+         modified = os.stat(methods.CONFIG).st_mtime
+      except OSError as e:
+         logger.error(f"Can not watch {methods.CONFIG}: {e}")
+         continue
+      if modified != last_modified:
+         last_modified = modified
+         await reload_config("config.json changed")
+
+def start_loops():
+   """Starts the background loops enabled in the configuration that are not running yet."""
+   for name, enabled, loop_function, message in (
+      ("sweep", snapshot_enabled(), sweep_loop, "Snapshot mode enabled, sweeping every {}s".format(config.get("sweepInterval", SWEEP_INTERVAL))),
+      ("passive", passive_enabled(), passive_loop, "Passive mode enabled, pushing results every {}s".format(config.get("passiveInterval", PASSIVE_INTERVAL))),
+   ):
+      if enabled and (name not in loops or loops[name].done()):
+         loops[name] = asyncio.ensure_future(loop_function())
+         logger.info(message)
+
+# ------------------------------------------------------------------------------------------------------------
+# REQUESTS
+async def answer(check_names, deadline):
+   """Evaluates the checks and returns their exit codes and Icinga outputs in the same order. The checks of one
+   request are all answered from the same snapshot or live sweep."""
+   start_time = time.time()
+   answers = {}
+   swept = [check_name for check_name in check_names if check_name in SNAPSHOT_CHECKS]
+   if swept and snapshot_enabled():
+      answers.update(zip(swept, await evaluate_snapshot(swept, deadline)))
+      source = "snapshot"
+   elif swept:
+      # requested in the same pass of the event loop, so they always end up in the same live batch
+      answers.update(zip(swept, await asyncio.gather(*(run_live(check_name, deadline) for check_name in swept))))
+      source = "live sweep"
+   for check_name in swept:
+      logger.info("{} answered from {} in {:.3f}s - EXIT CODE: {}".format(check_name, source, time.time()-start_time, answers[check_name][0]))
+   results = [answers.get(check_name, (UNKNOWN, f"Unknown check: {check_name}")) for check_name in check_names]
+   return await last_known_good(check_names, results)
+
+def unavailable(output):
+   return output == NOT_READ or output.startswith(NO_SNAPSHOT.split("{")[0])
+
+async def last_known_good(check_names, results):
+   """Stores the definitive answers and replaces an UNKNOWN caused by unavailable COM ports (NO_SNAPSHOT, NOT_READ)
+   by the last known good result of the check when it is younger than "lastGoodMaxAge" (check_results.py), so a
+   busy COM port does not make Icinga flap."""
+   filename = config.get("lastGoodFile", check_results.RESULTS_FILE)
+   try:
+      await asyncio.get_event_loop().run_in_executor(None, check_results.store, dict(zip(check_names, results)), filename)
+   except Exception as e:
+      logger.error(f"Error writing {filename}: {e}")
+   answered = []
+   for check_name, (exit_code, output) in zip(check_names, results):
+      if exit_code == UNKNOWN and unavailable(output):
+         fallback = check_results.last_good(check_name, config.get("lastGoodMaxAge", check_results.MAX_AGE), filename)
+         if fallback is not None:
+            logger.warning(f"{check_name} UNKNOWN ({output.strip()}), answering the last known good result")
+            exit_code, output = fallback
+      answered.append((exit_code, output))
+   return answered
+
+async def handle_message(message, writer):
+   """Answers a request for one check ("check") with a result message, a batch request ("checks") with a single
+   results message holding every check."""
+   start_time = time.time()
+   batch = "checks" in message
+   checks = message.get("checks") if batch else [message.get("check", "")]
+   if not isinstance(checks, list):
+      checks = []
+   check_names = [str(check_name).strip().upper() for check_name in checks]
+   deadline = start_time + float(config.get("checkTimeout", CHECK_TIMEOUT))
+   logger.info(f"Received request: {', '.join(check_names)}")
+   answers = await answer(check_names, deadline)
+   timing = {"elapsed": round(time.time()-start_time, 3)}
+   if batch:
+      reply = {"type": "results", "id": message.get("id"), "timing": timing, "results": [
+         {"check": check_name, "exit_code": exit_code, "output": output}
+         for check_name, (exit_code, output) in zip(check_names, answers)
+      ]}
+   else:
+      exit_code, output = answers[0]
+      reply = {"type": "result", "id": message.get("id"), "check": check_names[0], "exit_code": exit_code, "output": output, "timing": timing}
+   try:
+      await protocol.write_message(writer, reply)
+   except Exception as e:
+      logger.error(f"Error sending result of {', '.join(check_names)}: {e}")
+
+async def handle_request(reader, writer):
+   """Answers every request of a connection (see protocol.py), several requests can be in flight at once. Requests
+   still unanswered when the client closes the connection are cancelled."""
+   pending_requests = []
+   try:
+      while True:
+         message = await protocol.read_message(reader)
+         if message is None:
+            break
+         if message.get("type") != "request":
+            logger.warning(f"Unexpected message: {message}")
+            continue
+         pending_requests.append(asyncio.ensure_future(handle_message(message, writer)))
+      abandoned = [request for request in pending_requests if not request.done()]
+      if abandoned: # the client closed the connection (Icinga timeout), nobody reads these answers any more
+         logger.warning(f"Client gone, cancelling {len(abandoned)} unanswered request(s)")
+         for request in abandoned:
+            request.cancel()
+         await asyncio.gather(*abandoned, return_exceptions=True)
+   except Exception as e:
+      logger.error(f"Error handling requests: {e}")
+   finally:
+      writer.close()
+
+async def main():
+   global logger
+   global config
+   global snapshot
+   global sweep_task
+   global cache
+   global pending
+   global loops
+   global status
+   global status_lock
+   global history
+   global ring
+   global detectors
+   logger = methods.get_logger(LOGGER_NAME,LOG_FILE,FORMATTER,LOGGER_SCHEDULE,LOGGER_INTERVAL,LOGGER_BACKUPS) # Set up the logging
+   config = loadConfig(LOGGER_NAME) # Load the configuration information
+   snapshot = None
+   sweep_task = None
+   cache = RegisterCache()
+   status = StatusStore(STATUS_FILE)
+   status_lock = asyncio.Lock()
+   history = None
+   if config.get("historyMode", "Disabled") == "Enabled":
+      history = History(config.get("historyFile", HISTORY_FILE), int(config.get("historyMaxBytes", MAX_BYTES)), int(config.get("historyRawMaxAge", RAW_MAX_AGE)))
+      logger.info(f"Recording telemetry history in {history.filename}")
+   detectors = Detectors()
+   ring = None
+   if config.get("ringMode", "Disabled") == "Enabled":
+      ring = RingBuffer(config.get("ringFile", RING_FILE), int(config.get("ringCapacity", CAPACITY)))
+      logger.info(f"Writing telemetry samples to {ring.filename}")
+   pending = None
+   loops = {} # background loops by name
+   start_loops()
+   asyncio.ensure_future(config_watch_loop())
+   try:
+      asyncio.get_event_loop().add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(reload_config("SIGHUP")))
+   except (AttributeError, NotImplementedError): # no SIGHUP on Windows, the modification time is still watched
+      pass
+   if config.get("exporterMode", "Disabled") == "Enabled":
+      host, port = config.get("exporterHost", EXPORTER_HOST), int(config.get("exporterPort", EXPORTER_PORT))
+      await exporter.serve(host, port, lambda: snapshot)
+      logger.info(f"OpenMetrics exporter listening on {host}:{port}/metrics")
+   endpoint = protocol.endpoints()["runner"]
+   server = await protocol.start_server(handle_request, endpoint)
+   logger.info(f"Check runner listening on {endpoint} - checks: {', '.join(sorted(SNAPSHOT_CHECKS))}")
+   async with server:
+      await server.serve_forever()
+
+# ------------------------------------------------------------------------------------------------------------
+# PROGRAM ENTRY POINT - this won't be run only when imported from external module
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+   try:
+      asyncio.run(main())
+   except KeyboardInterrupt:
+      logger.info("Check runner shut down manually.")
@@ -27,5 +27,6 @@ ribbon_cable = list (b"\x55\xAA\x00\x32\xFE\x00\x01\x00\x00\x00\x00\x00\x42\x00\
 edid_register = list (b"\x55\xAA\x00\x15\xFE\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x08\x7F\x00\xE2\x56")
 check_redundancy = list (b"\x55\xAA\x00\x15\xFE\x00\x00\x00\x00\x00\x00\x00\x00\x1E\x00\x02\x01\x00\xE2\x56")
 check_function_card = list (b"\x55\xAA\x00\x32\xFE\x00\x02\x00\x00\x00\x00\x00\x02\x00\x00\x00\x02\x00\x8B\x56")
+function_card_refresh_register = list (b"\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x01\x00\x00\x00\x00\x06\x0B\x00\x00\x00\x00\x00\x55\xAA\x01\x02\x80\xFF\x81\x7E\x59")
 
 check_module_status = list (b"\x55\xAA\x00\xC4\xFE\x00\x01\x00\x00\x00\x00\x00\x0A\x00\x00\x0A\x18\x00\x7E\x59")
\ No newline at end of file
@@ -49,6 +49,7 @@ import datetime
 import json
 import methods
 from methods import read_data, write_data, loadConfig
+from status_store import StatusStore
 # ------------------------------------------------------------------------------------------------------------
 # DEFINITIONS AND INITIALISATIONS
 
@@ -204,7 +205,10 @@ def main():
                ser.close()
                i += 1
                my_logger.info("Writing to JSON file")
-               write_data(STATUS_FILE, status, LOGGER_NAME) # This could go to the end to include EXIT_CODE and output message
+               status_store = StatusStore(STATUS_FILE)
+               status_store.update(status) # merged into status.json, the sections of the other checks stay untouched
+               if status_store.flush():
+                  my_logger.info(f"Written to {STATUS_FILE}")
                message = f"Receiver card not connected. {sender_card_index}"
                EXIT_CODE = WARNING
      
@@ -44,6 +44,7 @@ from serial import SerialException
 import serial.tools.list_ports
 from logging.handlers import TimedRotatingFileHandler
 from methods import read_data, write_data, loadConfig
+from status_store import StatusStore
 from command import *
 # ------------------------------------------------------------------------------------------------------------
 # DEFINITIONS AND INITIALISATIONS
@@ -179,7 +180,10 @@ def main():
       ser.close() #closing 
       i += 1
       my_logger.info("Writing to JSON file")
-      write_data(STATUS_FILE, status, LOGGER_NAME) # This could go to the end to include EXIT_CODE and output message
+      status_store = StatusStore(STATUS_FILE)
+      status_store.update(status) # merged into status.json, the sections of the other checks stay untouched
+      if status_store.flush():
+         my_logger.info(f"Written to {STATUS_FILE}")
 
       if (device_found < config["devices"]):# Check if a device is missing
          message = "DEVICE MISSING (SENDER CARD) - {} EXPECTED, {} FOUND".format(config["devices"],device_found)
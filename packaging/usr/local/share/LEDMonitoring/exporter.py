@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# OPENMETRICS EXPORTER
+# Please read the README.TXT file for further information and details.
+#
+# USAGE
+# Enabled with "exporterMode": "Enabled" in config.json, served by check_runner.py on "exporterHost":"exporterPort"
+# Prometheus: scrape http://<host>:9877/metrics
+#
+# DESCRIPTION
+# - Renders the snapshot held by check_runner.py as OpenMetrics text: temperature, voltage, brightness, ambient
+#   light, DVI signal, module faults and receiver counts, labelled by port, sender model and receiver index
+# - A scrape only reads the snapshot in memory and never touches the serial line, however often it comes
+# - Values read as "N/A" are left out instead of being exported as 0
+# - Self metrics: number of scrapes, render time of the scrape and age of the snapshot
+# ------------------------------------------------------------------------------------------------------------
+import asyncio, time
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "led_"
+scrapes = 0 # scrapes served since the start of the runner
+
+def flag(on):
+   """Conversion to 1 when the value equals on, 0 for any other value and None (left out) when it is N/A."""
+   return lambda value: None if value == "N/A" else int(value == on)
+
+# Sender card values: metric name, help text, snapshot key, conversion
+SENDER_METRICS = [
+   ("brightness_percent", "Brightness of the sender card in percent", "brightnessLevelPC", None),
+   ("brightness_level", "Brightness of the sender card, 0 to 255", "brightnessLevel", None),
+   ("ambient_light_lux", "Ambient light measured by the light sensor", "ambientLightLevel", None),
+   ("dvi_signal_valid", "1 when a valid video signal is present on the DVI input", "DVISignal", flag("Valid")),
+]
+
+# Receiver card values, labelled with the receiver index as well
+RECEIVER_METRICS = [
+   ("receiver_temperature_celsius", "Temperature of the receiver card", "temperature", None),
+   ("receiver_voltage_volts", "Supply voltage of the receiver card", "voltage", None),
+   ("receiver_cabinet_on", "1 when the cabinet is switched on (kill mode)", "kill", lambda v: {"On": 1, "Off": 0}.get(v)),
+   ("receiver_modules_ok", "1 when every module of the receiver card reports no fault", "modulesOk", flag(True)),
+   ("receiver_module_faults", "Modules of the receiver card reporting a fault", "moduleFaults", None),
+   ("receiver_block_faults", "Data groups of the receiver card reporting a fault", "blockFaults", None),
+   ("receiver_module_flash_ok", "1 when the flash of every module of the receiver card is readable", "moduleFlashOk", flag(True)),
+]
+
+def escape(value):
+   return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def labels(**names):
+   return "{" + ",".join('{}="{}"'.format(name, escape(value)) for name, value in names.items()) + "}"
+
+def number(value, convert=None):
+   """Returns the value as a number, None when it is not one (N/A, invalid data)."""
+   if convert is not None and value is not None:
+      value = convert(value)
+   if isinstance(value, bool):
+      return int(value)
+   if isinstance(value, (int, float)):
+      return value
+   return None
+
+class Metrics:
+   """Collects the samples of each metric so every family is written in one block, as OpenMetrics requires."""
+   def __init__(self):
+      self.families = {} # name -> (type, help, [samples])
+
+   def add(self, name, help_text, value, label_text="", metric_type="gauge", suffix=""):
+      if value is None:
+         return
+      family = self.families.setdefault(PREFIX + name, (metric_type, help_text, []))
+      family[2].append(f"{PREFIX}{name}{suffix}{label_text} {value}")
+
+   def render(self):
+      lines = []
+      for name, (metric_type, help_text, samples) in self.families.items():
+         lines.append(f"# TYPE {name} {metric_type}")
+         lines.append(f"# HELP {name} {help_text}")
+         lines.extend(samples)
+      lines.append("# EOF")
+      return "\n".join(lines) + "\n"
+
+def collect(snapshot, metrics):
+   if snapshot is None:
+      return
+   metrics.add("snapshot_timestamp_seconds", "Time the snapshot was taken", round(snapshot["timestamp"], 3))
+   metrics.add("sender_cards", "Sender cards found by the last sweep", snapshot["devices"])
+   for port in sorted(snapshot["ports"]):
+      entry = snapshot["ports"][port]
+      sender = {"port": port, "model": entry.get("controllerModel", "N/A")}
+      metrics.add("sender_up", "1 when the sender card could be read by the last sweep", int("error" not in entry), labels(**sender))
+      for name, help_text, key, convert in SENDER_METRICS:
+         metrics.add(name, help_text, number(entry.get(key), convert), labels(**sender))
+      if "receiverCard" in entry:
+         metrics.add("receiver_cards", "Receiver cards found behind the sender card", len(entry["receiverCard"]), labels(**sender))
+      for receiver in sorted(entry.get("receiverCard", {})):
+         values = entry["receiverCard"][receiver]
+         for name, help_text, key, convert in RECEIVER_METRICS:
+            metrics.add(name, help_text, number(values.get(key), convert), labels(**sender, receiver=receiver))
+
+def render(snapshot):
+   """Returns the OpenMetrics text of the snapshot (None before the first sweep) plus the self metrics."""
+   global scrapes
+   start_time = time.perf_counter()
+   scrapes += 1
+   metrics = Metrics()
+   collect(snapshot, metrics)
+   metrics.add("exporter_scrapes", "Scrapes served since the check runner started", scrapes, metric_type="counter", suffix="_total")
+   if snapshot is not None:
+      metrics.add("snapshot_age_seconds", "Age of the snapshot at scrape time", round(time.time() - snapshot["timestamp"], 3))
+   metrics.add("exporter_scrape_duration_seconds", "Time spent rendering this scrape", round(time.perf_counter() - start_time, 6))
+   return metrics.render()
+
+async def handle_scrape(reader, writer, get_snapshot):
+   """Minimal HTTP/1.0 handler: GET /metrics answers the OpenMetrics text, everything else 404."""
+   try:
+      request_line = (await reader.readline()).decode(errors="replace").split()
+      while (await reader.readline()).strip(): # skip the headers
+         pass
+      if len(request_line) >= 2 and request_line[0] == "GET" and request_line[1].split("?")[0] == "/metrics":
+         status, content_type, body = "200 OK", CONTENT_TYPE, render(get_snapshot()).encode()
+      else:
+         status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"Not found, try /metrics\n"
+      writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+      await writer.drain()
+   finally:
+      writer.close()
+
+async def serve(host, port, get_snapshot):
+   """Starts the HTTP endpoint, get_snapshot() returns the current snapshot of the runner."""
+   return await asyncio.start_server(lambda r, w: handle_scrape(r, w, get_snapshot), host, port)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# TELEMETRY HISTORY
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Keeps every decoded temperature, voltage, brightness, ambient light and module fault count in a SQLite
+#   database ("historyFile" in config.json), so slow trends (a receiver heating up, a PSU voltage sagging over
+#   weeks) remain visible after status.json moved on
+# - One row per (time, port, receiver, metric), indexed on (port, receiver, metric, time). Sender card metrics
+#   use receiver SENDER (-1)
+# - WAL journal: the sweep appends while readers (history_query.py) keep reading
+# - All samples of a sweep are written in one transaction. Only registers read from the card during the sweep
+#   are recorded, with the time they were read: a value served from the register cache is not a new sample
+# - Every sample also updates min/max/sum/count rollups of its 1 minute, 15 minute and 1 day bucket
+#   (RESOLUTIONS), so trend queries over months read a few thousand rollups instead of millions of samples
+# - Raw samples are deleted once older than "historyRawMaxAge" seconds, rollups once older than the retention of
+#   their resolution (1 day rollups are kept)
+# - The database never uses more than "historyMaxBytes": the oldest samples are dropped first and their pages
+#   reused, the file does not grow any further
+# ------------------------------------------------------------------------------------------------------------
+import sqlite3, threading, time
+
+HISTORY_FILE = "history.db"
+MAX_BYTES = 50*1024*1024 # bytes, a week of a large wall sampled every 30s stays below this
+PRUNE_FRACTION = 0.1 # share of the samples dropped at once when the database is full
+SENDER = -1 # receiver index of sender card metrics
+RAW_MAX_AGE = 7*86400 # seconds raw samples are kept
+RESOLUTIONS = {60: 31*86400, 900: 400*86400, 86400: None} # rollup bucket size in seconds -> retention in seconds
+EXPIRE_INTERVAL = 3600 # seconds between two runs of the age based expiry
+
+# Metric name -> status.json key
+SENDER_METRICS = {
+   "brightness": "brightnessLevelPC",
+   "ambient_light": "ambientLightLevel",
+}
+RECEIVER_METRICS = {
+   "temperature": "temperature",
+   "voltage": "voltage",
+   "module_faults": "moduleFaults",
+   "block_faults": "blockFaults",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+   ts REAL NOT NULL,
+   port TEXT NOT NULL,
+   receiver INTEGER NOT NULL,
+   metric TEXT NOT NULL,
+   value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_series ON samples (port, receiver, metric, ts);
+CREATE TABLE IF NOT EXISTS rollups (
+   resolution INTEGER NOT NULL,
+   port TEXT NOT NULL,
+   receiver INTEGER NOT NULL,
+   metric TEXT NOT NULL,
+   bucket INTEGER NOT NULL,
+   low REAL NOT NULL,
+   high REAL NOT NULL,
+   total REAL NOT NULL,
+   count INTEGER NOT NULL,
+   PRIMARY KEY (resolution, port, receiver, metric, bucket)
+) WITHOUT ROWID;
+"""
+
+# Adds one sample to its bucket, the average of a bucket is total / count
+ROLLUP = """
+INSERT INTO rollups (resolution, port, receiver, metric, bucket, low, high, total, count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT (resolution, port, receiver, metric, bucket) DO UPDATE SET
+   low = min(low, excluded.low), high = max(high, excluded.high), total = total + excluded.total, count = count + 1
+"""
+
+def number(value):
+   """Numeric value of a sample, None for N/A and invalid readings."""
+   if isinstance(value, bool) or not isinstance(value, (int, float)):
+      return None
+   return float(value)
+
+def rollups(rows):
+   """Returns the rollup parameters of (ts, port, receiver, metric, value) rows, one per resolution."""
+   return [(resolution, port, receiver, metric, int(ts // resolution * resolution), value, value, value)
+           for ts, port, receiver, metric, value in rows for resolution in RESOLUTIONS]
+
+def samples(snapshot):
+   """Returns the (ts, port, receiver, metric, value) rows of a snapshot."""
+   ts = snapshot["timestamp"]
+   rows = []
+   for port, entry in snapshot["ports"].items():
+      for metric, key in SENDER_METRICS.items():
+         value = number(entry.get(key))
+         if value is not None:
+            rows.append((ts, port, SENDER, metric, value))
+      for receiver, values in entry.get("receiverCard", {}).items():
+         for metric, key in RECEIVER_METRICS.items():
+            value = number(values.get(key))
+            if value is not None:
+               rows.append((ts, port, int(receiver), metric, value))
+   return rows
+
+def fresh_samples(snapshot):
+   """Returns the rows of a snapshot read from the cards during its sweep (snapshot["fresh"]), each with the
+   time it was read."""
+   fresh = snapshot.get("fresh", {})
+   rows = []
+   for ts, port, receiver, metric, value in samples(snapshot):
+      key = SENDER_METRICS[metric] if receiver == SENDER else RECEIVER_METRICS[metric]
+      read = fresh.get(port, {}).get((None if receiver == SENDER else receiver, key))
+      if read is not None:
+         rows.append((read, port, receiver, metric, value))
+   return rows
+
+class History:
+   def __init__(self, filename=HISTORY_FILE, max_bytes=MAX_BYTES, raw_max_age=RAW_MAX_AGE):
+      self.filename = filename
+      self.max_bytes = max_bytes
+      self.raw_max_age = raw_max_age
+      self.expired = 0 # time of the last expiry
+      self.lock = threading.Lock() # called from executor threads
+      self.db = sqlite3.connect(filename, check_same_thread=False)
+      self.db.execute("PRAGMA journal_mode=WAL")
+      self.db.execute("PRAGMA synchronous=NORMAL") # WAL stays consistent on power loss, only the last sweep may be lost
+      self.db.executescript(SCHEMA)
+
+   def record(self, snapshot):
+      """Writes the fresh samples of a snapshot and updates their rollups in one transaction, returns how many
+      samples there were."""
+      rows = fresh_samples(snapshot)
+      if not rows:
+         return 0
+      with self.lock:
+         with self.db:
+            self.db.executemany("INSERT INTO samples (ts, port, receiver, metric, value) VALUES (?, ?, ?, ?, ?)", rows)
+            self.db.executemany(ROLLUP, rollups(rows))
+         if time.time() - self.expired >= EXPIRE_INTERVAL:
+            self.expire()
+         self.prune()
+      return len(rows)
+
+   def used_bytes(self):
+      page_size = self.db.execute("PRAGMA page_size").fetchone()[0]
+      page_count = self.db.execute("PRAGMA page_count").fetchone()[0]
+      free_pages = self.db.execute("PRAGMA freelist_count").fetchone()[0]
+      return (page_count - free_pages) * page_size
+
+   def expire(self):
+      """Deletes the raw samples and rollups older than their retention."""
+      now = time.time()
+      with self.db:
+         self.db.execute("DELETE FROM samples WHERE ts < ?", (now - self.raw_max_age,))
+         for resolution, max_age in RESOLUTIONS.items():
+            if max_age is not None:
+               self.db.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?", (resolution, now - max_age))
+      self.expired = now
+
+   def prune(self):
+      """Drops the oldest samples while the database uses more than max_bytes."""
+      while self.used_bytes() > self.max_bytes:
+         count = self.db.execute("SELECT count(*) FROM samples").fetchone()[0]
+         if not count:
+            break
+         with self.db: # rowids grow with time, the lowest ones are the oldest samples
+            self.db.execute("DELETE FROM samples WHERE rowid < (SELECT min(rowid) FROM samples) + ?", (max(1, int(count*PRUNE_FRACTION)),))
+      self.db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+   def close(self):
+      with self.lock:
+         self.db.close()
+
+def open_readonly(filename=HISTORY_FILE):
+   """Connection for queries, it never writes and never waits for the recording runner (WAL)."""
+   return sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+
+def series(db, metric=None, port=None, receiver=None):
+   """Returns the (port, receiver, metric) series matching the filters, from the daily rollups which are kept
+   for as long as the series exists."""
+   query, parameters = "SELECT DISTINCT port, receiver, metric FROM rollups WHERE resolution = ?", [max(RESOLUTIONS)]
+   for column, value in (("metric", metric), ("port", port), ("receiver", receiver)):
+      if value is not None:
+         query += f" AND {column} = ?"
+         parameters.append(value)
+   return db.execute(query + " ORDER BY port, receiver, metric", parameters).fetchall()
+
+def raw_values(db, port, receiver, metric, start, end):
+   """Values of one series between start and end, through the (port, receiver, metric, ts) index."""
+   return [value for value, in db.execute("SELECT value FROM samples WHERE port = ? AND receiver = ? AND metric = ? AND ts >= ? AND ts < ?", (port, receiver, metric, start, end))]
+
+def rollup_values(db, resolution, port, receiver, metric, start, end):
+   """(low, high, total, count) of the buckets of one series overlapping start to end."""
+   return db.execute("SELECT low, high, total, count FROM rollups WHERE resolution = ? AND port = ? AND receiver = ? AND metric = ? AND bucket > ? AND bucket < ?",
+                     (resolution, port, receiver, metric, start - resolution, end)).fetchall()
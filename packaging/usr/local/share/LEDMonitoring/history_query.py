@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# HISTORY QUERY
+# Please read the README.TXT file for further information and details.
+#
+# USAGE
+# Linux: python3 history_query.py -m temperature --since 24h                  min/max/avg/p95 per receiver card
+#        python3 history_query.py -m voltage -p /dev/ttyUSB0 -r 3 --since 30d  one receiver card over a month
+#        python3 history_query.py --since 7d --by port --format csv           every metric per port, as CSV
+#        python3 history_query.py -m brightness --start 2026-01-01 --end 2026-02-01 --format json
+#
+# DESCRIPTION
+# - Reads the telemetry history recorded by check_runner.py (history.py, "historyFile" in config.json) and
+#   prints count, min, max, avg and p95 per series (port, receiver card, metric), per port or per metric
+# - Recent short ranges are answered from the raw samples, longer ones from the 1 minute, 15 minute or 1 day
+#   rollups so a year of data is read in well under a second. p95 of a rollup query is the p95 of the bucket
+#   averages, min and max stay exact
+# - Opens the database read-only, the runner keeps recording meanwhile
+# ------------------------------------------------------------------------------------------------------------
+import argparse, csv, json, math, sqlite3, sys, time, datetime, methods, history
+
+LOGGER_NAME = "history_query"
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7*86400}
+RAW_MAX_RANGE = 86400 # seconds, longer ranges read rollups
+ROLLUP_MAX_BUCKETS = 20000 # buckets per series, the finest resolution staying below is used
+COLUMNS = ["port", "receiver", "metric", "count", "min", "max", "avg", "p95"]
+
+def parse_time(text):
+   """Unix time of a timestamp, an ISO date ("2026-01-01", "2026-01-01T12:00") or a duration before now ("24h")."""
+   if text[-1:] in DURATION_UNITS:
+      try:
+         return time.time() - float(text[:-1]) * DURATION_UNITS[text[-1]]
+      except ValueError:
+         pass
+   try:
+      return float(text)
+   except ValueError:
+      pass
+   try:
+      return datetime.datetime.fromisoformat(text).timestamp()
+   except ValueError:
+      raise argparse.ArgumentTypeError(f"invalid time: {text}")
+
+def choose_resolution(start, end, raw_max_age):
+   """None (raw samples) for short ranges still within the raw retention, the finest fitting rollup otherwise."""
+   if end - start <= RAW_MAX_RANGE and start >= time.time() - raw_max_age:
+      return None
+   for resolution in sorted(history.RESOLUTIONS):
+      if (end - start) / resolution <= ROLLUP_MAX_BUCKETS:
+         return resolution
+   return max(history.RESOLUTIONS)
+
+def p95(values):
+   """Nearest rank 95th percentile."""
+   if not values:
+      return None
+   values = sorted(values)
+   return values[max(0, math.ceil(0.95 * len(values)) - 1)]
+
+def group_key(port, receiver, metric, by):
+   if by == "port":
+      return (port, "*", metric)
+   if by == "metric":
+      return ("*", "*", metric)
+   return (port, receiver, metric)
+
+def aggregate(db, args, resolution):
+   """Returns one result row per group, with the aggregates of every series of the group."""
+   groups = {} # key -> [low, high, total, count, values]
+   for port, receiver, metric in history.series(db, args.metric, args.port, args.receiver):
+      if resolution is None:
+         values = history.raw_values(db, port, receiver, metric, args.start, args.end)
+         buckets = [(value, value, value, 1) for value in values]
+      else:
+         buckets = history.rollup_values(db, resolution, port, receiver, metric, args.start, args.end)
+         values = [total / count for _, _, total, count in buckets]
+      if not buckets:
+         continue
+      group = groups.setdefault(group_key(port, receiver, metric, args.by), [math.inf, -math.inf, 0.0, 0, []])
+      for low, high, total, count in buckets:
+         group[0] = min(group[0], low)
+         group[1] = max(group[1], high)
+         group[2] += total
+         group[3] += count
+      group[4].extend(values)
+   rows = []
+   for (port, receiver, metric), (low, high, total, count, values) in sorted(groups.items(), key=lambda item: [str(k) for k in item[0]]):
+      rows.append({"port": port, "receiver": receiver, "metric": metric, "count": count, "min": round(low, 3), "max": round(high, 3),
+                   "avg": round(total / count, 3), "p95": round(p95(values), 3)})
+   return rows
+
+def print_table(rows):
+   print("{:<16} {:>8} {:<14} {:>8} {:>9} {:>9} {:>9} {:>9}".format(*COLUMNS))
+   for row in rows:
+      receiver = "sender" if row["receiver"] == history.SENDER else row["receiver"]
+      print("{:<16} {:>8} {:<14} {:>8} {:>9} {:>9} {:>9} {:>9}".format(row["port"], receiver, row["metric"], row["count"], row["min"], row["max"], row["avg"], row["p95"]))
+
+def main(argv):
+   parser = argparse.ArgumentParser(description="Aggregates of the telemetry history recorded by check_runner.py")
+   parser.add_argument("-m", "--metric", choices=list(history.SENDER_METRICS) + list(history.RECEIVER_METRICS), help="metric, every metric when left out")
+   parser.add_argument("-p", "--port", help="sender card port, e.g. /dev/ttyUSB0 or COM3")
+   parser.add_argument("-r", "--receiver", type=int, help=f"receiver card index, {history.SENDER} for sender card metrics")
+   parser.add_argument("--since", dest="start", type=parse_time, help="start of the range: duration before now (30m, 24h, 7d), ISO date or unix time (default 24h)")
+   parser.add_argument("--start", dest="start", type=parse_time, help="same as --since")
+   parser.add_argument("--end", type=parse_time, help="end of the range (default now)")
+   parser.add_argument("--by", choices=["series", "port", "metric"], default="series", help="aggregate per port, receiver card and metric (default), per port or per metric")
+   parser.add_argument("--resolution", choices=["auto", "raw"] + [str(r) for r in sorted(history.RESOLUTIONS)], default="auto", help="raw samples or rollup size in seconds (default auto)")
+   parser.add_argument("--format", choices=["table", "csv", "json"], default="table")
+   args = parser.parse_args(argv[1:])
+   config = methods.loadConfig(LOGGER_NAME)
+   args.end = time.time() if args.end is None else args.end
+   args.start = args.end - DURATION_UNITS["d"] if args.start is None else args.start
+   if args.resolution == "auto":
+      resolution = choose_resolution(args.start, args.end, int(config.get("historyRawMaxAge", history.RAW_MAX_AGE)))
+   else:
+      resolution = None if args.resolution == "raw" else int(args.resolution)
+   try:
+      db = history.open_readonly(config.get("historyFile", history.HISTORY_FILE))
+      rows = aggregate(db, args, resolution)
+   except sqlite3.Error as e:
+      print(f"Error reading the history: {e}", file=sys.stderr)
+      return 1
+   if args.format == "json":
+      print(json.dumps({"start": args.start, "end": args.end, "resolution": resolution or "raw", "results": rows}, indent=4))
+   elif args.format == "csv":
+      writer = csv.DictWriter(sys.stdout, fieldnames=COLUMNS)
+      writer.writeheader()
+      writer.writerows(rows)
+   else:
+      print_table(rows)
+   return 0
+
+if __name__ == "__main__":
+   sys.exit(main(sys.argv))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# LISTENER STATUS
+# Please read the README.TXT file for further information and details.
+#
+# USAGE
+# Linux: python3 listener_status.py          summary per task name
+#        python3 listener_status.py --json   full status answer, histograms included
+#
+# DESCRIPTION
+# - Asks monitoring_listener.py for its instrumentation: queue depth, COM ports held and per task name the
+#   time spent in the queue, holding the ports and waiting for the client, plus the outcome of every task
+# - Helps telling a slow serial line (long hold), a busy queue (long queue wait) and a stuck client (long
+#   client wait, "gone" outcomes) apart when checks time out
+# ------------------------------------------------------------------------------------------------------------
+import json, sys, methods, protocol
+
+TIMEOUT = 10 # seconds
+
+def quantile(histogram, q):
+   """Upper bound of the bucket holding the q quantile, from the cumulative bucket counts."""
+   rank = q * histogram["count"]
+   for bound, count in histogram["buckets"].items():
+      if count and count >= rank:
+         return histogram["max"] if bound == "+Inf" else min(float(bound), histogram["max"])
+   return 0.0
+
+def main(argv):
+   with protocol.connect(methods.listener_endpoint(), timeout=TIMEOUT) as sock:
+      protocol.send_message(sock, {"type": "status"})
+      status = protocol.recv_message(sock)
+   if "--json" in argv:
+      print(json.dumps(status, indent=4))
+      return 0
+   print("Uptime {:.0f}s - queue depth {} - holding: {}".format(status["uptime"], status["queue_depth"], status["holding"] or "none"))
+   for task_name, task in status["tasks"].items():
+      print(task_name)
+      for label in ("queue_wait", "lock_hold", "client_wait"):
+         histogram = task[label]
+         print("   {:<12} n={:<6} p50={:.2f}s p95={:.2f}s max={:.2f}s".format(label, histogram["count"], quantile(histogram, 0.5), quantile(histogram, 0.95), histogram["max"]))
+      print(f"   outcomes     {task['outcomes']}")
+   return 0
+
+if __name__ == "__main__":
+   sys.exit(main(sys.argv))
@@ -4,7 +4,8 @@ import json
 import time
 import logging
 from logging.handlers import TimedRotatingFileHandler
-import os, sys
+import os, sys, protocol
+from status_store import atomic_write, StatusStore, STATUS_FILE
 from sys import platform
 status = {} # Initialise variable to store status data
 global last_updated
@@ -16,6 +17,7 @@ os.chdir(dir)
 #os.chdir("/data/opt/LEDMonitoring")
 #os.chdir(r'C:\LEDMonitoring')
 CONFIG = "config.json"
+UNKNOWN = 3 # exit code, as in base_monitoring.py
 
 def loadConfig(logger_name):
    logger = logging.getLogger(logger_name)
@@ -33,6 +35,11 @@ def loadConfig(logger_name):
             data = json.load(f)
             return data
    
+def listener_endpoint():
+   """Endpoint of monitoring_listener.py, a Unix socket path or "host:port" ("listenerEndpoint" in config.json,
+   read once per process)."""
+   return protocol.endpoints()["listener"]
+
 def loadConfig_old(text,target_port):
    with open(f'{CONFIG}', 'r') as f:
     data = json.load(f)
@@ -55,15 +62,22 @@ def read_data(filename,logger_name):
       temp_data = {}
    return temp_data
 
-def write_data(filename,json_data,logger_name):#, content): #TODO: needs error handling
+def write_data(filename,json_data,logger_name):
+   """Replaces the file with the JSON document, atomically (see status_store.py). status.json is never replaced:
+   the {port: values} document is merged into it by StatusStore, under its lock and with status.bin and the
+   change journal."""
    logger = logging.getLogger(logger_name)
    try:
-       with open(filename, "w") as outfile:
-         data=json.dumps(json_data, indent=4)
-         outfile.write(data)
-       logger.info('Written to {}'.format(filename))
-   except IOError: # TODO: or read from backup file
-      logger.error('Error: {} not found.'.format(filename))
+      if os.path.basename(filename) == STATUS_FILE:
+         status_store = StatusStore(filename)
+         status_store.update(json_data)
+         if status_store.flush():
+            logger.info('Written to {}'.format(filename))
+         return
+      atomic_write(filename, json.dumps(json_data, separators=(",", ":")))
+      logger.info('Written to {}'.format(filename))
+   except (IOError, OSError) as e:
+      logger.error('Error writing {}: {}'.format(filename, e))
    return
 
 def checkConnections():
@@ -132,6 +146,8 @@ def get_console_handler(formatter):
 def get_logger(logger_name,log_file, log_formatter, log_schedule, log_interval, log_backups):
    logger = logging.getLogger(logger_name)
    logger.setLevel(logging.DEBUG) # better to have too much log than not enough
+   if logger.handlers: # already set up, e.g. a check run again inside the resident check runner
+      return logger
    logger.addHandler(get_file_handler(log_file, log_formatter, log_schedule, log_interval, log_backups))
    #logger.addHandler(get_console_handler(log_formatter))  #writes to the console
    logger.propagate = False # with this pattern, it's rarely necessary to propagate the error up to parent
@@ -201,5 +217,37 @@ def check_response(logger_name,received_data):
       logger.error('Command failed due to error: {}'.format(e))
       return False
 
-
-
+def acquire_com_ports(task_name, ports, priority, logger_name, timeout=30):
+   """Blocking request to the listener for the given COM ports. Returns the connection to pass to
+   release_com_ports(), None when no listener is running (the caller goes on without it). Exits with UNKNOWN when
+   the listener is running but does not grant the ports in time, the ports are then in use by another task."""
+   logger = logging.getLogger(logger_name)
+   sock = None
+   try:
+      sock = protocol.connect(listener_endpoint(), timeout=timeout)
+      protocol.send_message(sock, {"type": "request", "task": task_name, "ports": list(ports), "priority": priority})
+      answer = protocol.recv_message(sock)
+      if not answer or answer["type"] != "start":
+         raise ConnectionError(f"COM ports not granted: {answer}")
+      logger.info(f"Listener granted {', '.join(ports)} to {task_name}")
+      return sock
+   except (ConnectionRefusedError, FileNotFoundError) as e: # nothing listening on the endpoint
+      logger.warning(f"Continuing without the listener for {task_name}: {e}")
+      return None
+   except (OSError, ValueError) as e: # timeout, reject or broken connection: never touch ports someone else holds
+      logger.error(f"{task_name} did not get {', '.join(ports)} from the listener: {e}")
+      if sock is not None:
+         sock.close()
+      sys.exit(UNKNOWN)
+
+def release_com_ports(sock, logger_name):
+   if sock is None:
+      return
+   logger = logging.getLogger(logger_name)
+   try:
+      protocol.send_message(sock, {"type": "done"})
+      protocol.recv_message(sock)
+   except (OSError, ValueError) as e:
+      logger.warning(f"Error releasing COM ports: {e}")
+   finally:
+      sock.close()
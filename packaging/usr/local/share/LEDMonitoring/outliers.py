@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# CROSS-RECEIVER OUTLIERS
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Compares the receiver cards behind one sender card with each other on every sweep: per metric the median
+#   and the median absolute deviation (MAD) of all receiver cards, and a robust z-score per receiver card
+#   (0.6745 * (value - median) / MAD, Iglewicz and Hoaglin)
+# - A receiver card scoring above "threshold" is an outlier, e.g. one cabinet running 15 °C hotter than the
+#   rest of the wall although still within its valid range
+# - Median and MAD are barely moved by the outliers themselves, a single failing cabinet does not shift the
+#   reference the way a mean and standard deviation would
+# - The MAD never goes below "minDeviation" of the metric, so a wall where every cabinet reads the same value
+#   does not flag a difference of one step
+# - Needs at least "minReceivers" receiver cards with a valid value, stateless, settings from
+#   "outlierDetection" in config.json
+# ------------------------------------------------------------------------------------------------------------
+from statistics import median
+from history import RECEIVER_METRICS, number
+
+THRESHOLD = 3.5
+MIN_RECEIVERS = 4
+MAD_SCALE = 0.6745 # MAD of a normal distribution in standard deviations
+MIN_DEVIATION = { # smallest MAD per metric, in the unit of the metric
+   "temperature": 1.0,
+   "voltage": 0.05,
+   "module_faults": 1.0,
+   "block_faults": 1.0,
+}
+
+def columns(entry):
+   """Turns the receiver cards of a sender card into one column of (receiver, value) per metric."""
+   table = {metric: [] for metric in RECEIVER_METRICS}
+   for receiver, values in sorted(entry.get("receiverCard", {}).items()):
+      for metric, key in RECEIVER_METRICS.items():
+         value = number(values.get(key))
+         if value is not None:
+            table[metric].append((receiver, value))
+   return table
+
+def find(entry, settings=None):
+   """Returns {metric: [{"receiver", "value", "median", "mad", "score"}]} of the outliers of a sender card."""
+   settings = settings or {}
+   threshold = float(settings.get("threshold", THRESHOLD))
+   min_receivers = int(settings.get("minReceivers", MIN_RECEIVERS))
+   min_deviation = dict(MIN_DEVIATION, **settings.get("minDeviation", {}))
+   result = {}
+   for metric, column in columns(entry).items():
+      if len(column) < min_receivers:
+         continue
+      values = [value for _, value in column]
+      centre = median(values)
+      mad = max(median(abs(value - centre) for value in values), float(min_deviation.get(metric, 0)) or 1e-9)
+      for receiver, value in column:
+         score = MAD_SCALE * (value - centre) / mad
+         if abs(score) > threshold:
+            result.setdefault(metric, []).append({"receiver": receiver, "value": value, "median": centre, "mad": round(mad, 3), "score": round(score, 2)})
+   return result
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# PASSIVE CHECK RESULTS
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Turns check results into Icinga/Nagios PROCESS_SERVICE_CHECK_RESULT external commands, pushed by
+#   check_runner.py every "passiveInterval" seconds when "passiveMode" is "Enabled" in config.json
+# - The commands are written to the external command pipe ("passiveCommandFile", e.g. the icinga2.cmd pipe of
+#   the Icinga compat feature) or, when "passiveSpoolDir" is set, as one file per push into that directory
+# - Spool files are written under a temporary name and renamed, a consumer never reads a partial file
+# - The runner pushes from a worker thread: a full command pipe is waited for (up to WRITE_TIMEOUT seconds) without
+#   holding up the checks, and a command written in parts is completed before the next one
+# - "passiveHost" is the Icinga host name (defaults to the hostname), "passiveServices" maps a check name to its
+#   Icinga service name (defaults to the check name)
+# ------------------------------------------------------------------------------------------------------------
+import os, select, socket, time, itertools
+
+COMMAND_FILE = "/var/run/icinga2/cmd/icinga2.cmd"
+WRITE_TIMEOUT = 10 # seconds a full command pipe may take to drain before the push is given up
+SPOOL_SUFFIX = ".cmd"
+sequence = itertools.count() # keeps spool file names unique within the same second
+
+def service_name(config, check_name):
+   return config.get("passiveServices", {}).get(check_name, check_name)
+
+def host_name(config):
+   return config.get("passiveHost") or socket.gethostname()
+
+def format_result(host, service, exit_code, output, timestamp=None):
+   """Returns one external command line. Newlines of the output are escaped, an external command is one line."""
+   timestamp = int(time.time() if timestamp is None else timestamp)
+   output = str(output).strip().replace("\\", "\\\\").replace("\n", "\\n")
+   return f"[{timestamp}] PROCESS_SERVICE_CHECK_RESULT;{host};{service};{exit_code};{output}\n"
+
+def format_results(config, results, timestamp=None):
+   """Builds the command lines of (check name, exit code, output) results."""
+   host = host_name(config)
+   return [format_result(host, service_name(config, check_name), exit_code, output, timestamp) for check_name, exit_code, output in results]
+
+def write_command_file(path, lines, timeout=WRITE_TIMEOUT):
+   """Writes the lines to the external command pipe. Opened non-blocking so a stopped Icinga raises OSError
+   (no reader on the pipe) instead of blocking the runner. A full pipe is waited for up to timeout seconds, then
+   TimeoutError is raised."""
+   deadline = time.time() + timeout
+   fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_NONBLOCK)
+   try:
+      for line in lines: # one write per command, writes up to PIPE_BUF never interleave with other writers
+         data = line.encode()
+         while data: # a command longer than PIPE_BUF may be written in parts
+            try:
+               data = data[os.write(fd, data):]
+            except BlockingIOError: # Icinga has not read the pipe yet
+               remaining = deadline - time.time()
+               if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+                  raise TimeoutError(f"{path} stayed full for {timeout}s")
+   finally:
+      os.close(fd)
+
+def write_spool_file(directory, lines):
+   """Writes the lines into a new file of the spool directory and returns its path."""
+   os.makedirs(directory, exist_ok=True)
+   name = "{}-{}-{}{}".format(int(time.time()), os.getpid(), next(sequence), SPOOL_SUFFIX)
+   path = os.path.join(directory, name)
+   temporary = os.path.join(directory, "." + name + ".tmp") # hidden and without suffix until complete
+   with open(temporary, "w") as f:
+      f.writelines(lines)
+   os.rename(temporary, path)
+   return path
+
+def submit(config, results, timestamp=None):
+   """Pushes (check name, exit code, output) results to the spool directory when configured, to the command
+   pipe otherwise. Returns where the results went, raises OSError when they could not be written."""
+   lines = format_results(config, results, timestamp)
+   spool_dir = config.get("passiveSpoolDir")
+   if spool_dir:
+      return write_spool_file(spool_dir, lines)
+   command_file = config.get("passiveCommandFile", COMMAND_FILE)
+   write_command_file(command_file, lines)
+   return command_file
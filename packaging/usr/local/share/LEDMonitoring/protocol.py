@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# LOCAL SERVER PROTOCOL
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Framing shared by the listener (monitoring_listener.py keeps its own copy), the check runner and their clients
+# - Every message is a JSON object preceded by its length as a 4 byte big endian unsigned integer
+# - Standard library only, so check_client.py stays light
+# - An endpoint is either the path of a Unix domain socket ("/run/LEDMonitoring/listener.sock") or "host:port"
+# - Both endpoints come from config.json ("listenerEndpoint", "runnerEndpoint"), read once per process by
+#   endpoints(). Unix sockets by default, only root and the nagios group may connect. On Windows, which has no
+#   Unix sockets for asyncio, 127.0.0.1:8888 and 127.0.0.1:8889
+#
+# LISTENER MESSAGES
+# client -> listener: {"type": "request", "id": ..., "task": "CHECK_DVI", "ports": [...], "priority": "fast",
+#                      "deadline": <epoch seconds>, "options": {...}}
+# listener -> client: {"type": "start", "id": ..., "waited": <s>} or {"type": "reject", "id": ..., "reason": ...}
+#                      (reason "deadline", or "ports" when "ports" is not a list of serial ports allowed by the
+#                      listener, or is missing while the listener knows no port)
+# client -> listener: {"type": "yield", "id": ...}, answered with "start" once the ports are granted again
+# client -> listener: {"type": "done", "id": ..., "result": {"exit_code": 0, "output": "..."}}
+# listener -> client: {"type": "finished", "id": ..., "waited": <s>, "held": <s>}
+# client -> listener: {"type": "cancel", "id": ...}, drops a request still waiting for its ports
+# listener -> client: {"type": "abort", "id": ..., "reason": "watchdog"}, the task held its ports too long or was
+#                      silent for too long, the ports were taken back
+# client -> listener: {"type": "status"}, answered with {"type": "status", "uptime": <s>, "queue_depth": ...,
+#                      "holding": {port: task}, "tasks": {task: {"queue_wait", "lock_hold", "client_wait": histogram,
+#                      "outcomes": {outcome: count}}}} (see listener_status.py)
+# Several requests can share one connection, the id tells them apart (a message without id goes to the only
+# request of the connection)
+#
+# CHECK RUNNER MESSAGES
+# client -> runner: {"type": "request", "id": ..., "check": "CHECK_DVI"}
+# runner -> client: {"type": "result", "id": ..., "check": "CHECK_DVI", "exit_code": 0, "output": "...",
+#                    "timing": {"elapsed": <s>}}
+# client -> runner: {"type": "request", "id": ..., "checks": ["CHECK_DVI", "CHECK_BRIGHTNESS", ...]}
+# runner -> client: {"type": "results", "id": ..., "results": [{"check": ..., "exit_code": ..., "output": ...}, ...],
+#                    "timing": {"elapsed": <s>}}, every check evaluated from the same snapshot or sweep
+# ------------------------------------------------------------------------------------------------------------
+import asyncio, functools, json, os, socket, struct
+try:
+   import grp
+except ImportError: # Windows
+   grp = None
+
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 16*1024*1024 # a module status answer of a large wall stays far below this
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json") # /data/opt/LEDMonitoring
+if os.name == "nt":
+   LISTENER_ENDPOINT = "127.0.0.1:8888"
+   RUNNER_ENDPOINT = "127.0.0.1:8889"
+else:
+   LISTENER_ENDPOINT = "/run/LEDMonitoring/listener.sock" # monitoring_listener.py
+   RUNNER_ENDPOINT = "/run/LEDMonitoring/runner.sock" # check_runner.py
+SOCKET_MODE = 0o660 # only root and SOCKET_GROUP may connect to a Unix socket
+SOCKET_GROUP = "nagios" # Icinga runs the checks as nagios
+
+@functools.lru_cache(maxsize=None)
+def endpoints(config_file=CONFIG_FILE):
+   """Returns {"listener": ..., "runner": ...} from config.json, read on the first call only."""
+   try:
+      with open(config_file, "r") as f:
+         config = json.load(f)
+   except (IOError, ValueError):
+      config = {}
+   return {"listener": config.get("listenerEndpoint", LISTENER_ENDPOINT), "runner": config.get("runnerEndpoint", RUNNER_ENDPOINT)}
+
+def parse_endpoint(endpoint):
+   """Returns ("unix", path) for a socket path and ("tcp", (host, port)) for "host:port"."""
+   if endpoint.startswith("/"):
+      return "unix", endpoint
+   host, _, port = endpoint.rpartition(":")
+   return "tcp", (host or "127.0.0.1", int(port))
+
+async def open_connection(endpoint):
+   kind, address = parse_endpoint(endpoint)
+   if kind == "unix":
+      return await asyncio.open_unix_connection(address)
+   return await asyncio.open_connection(*address)
+
+async def start_server(client_connected, endpoint):
+   """Serves the endpoint, a Unix socket is created with SOCKET_MODE and handed to SOCKET_GROUP."""
+   kind, address = parse_endpoint(endpoint)
+   if kind == "tcp":
+      return await asyncio.start_server(client_connected, *address)
+   os.makedirs(os.path.dirname(address), exist_ok=True)
+   if os.path.exists(address):
+      os.unlink(address) # left behind by a server that did not shut down cleanly
+   server = await asyncio.start_unix_server(client_connected, address)
+   os.chmod(address, SOCKET_MODE)
+   try:
+      os.chown(address, -1, grp.getgrnam(SOCKET_GROUP).gr_gid)
+   except (KeyError, PermissionError):
+      pass # group missing or not running as root, only the owner may connect
+   return server
+
+def connect(endpoint, timeout=None):
+   """Blocking counterpart of open_connection(), returns a plain socket."""
+   kind, address = parse_endpoint(endpoint)
+   if kind == "tcp":
+      return socket.create_connection(address, timeout=timeout)
+   sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+   sock.settimeout(timeout)
+   try:
+      sock.connect(address)
+   except OSError:
+      sock.close()
+      raise
+   return sock
+
+def encode(message):
+   payload = json.dumps(message, separators=(",", ":")).encode()
+   return HEADER.pack(len(payload)) + payload
+
+def decode(payload):
+   message = json.loads(payload.decode())
+   if not isinstance(message, dict):
+      raise ValueError("Message is not a JSON object")
+   return message
+
+async def read_message(reader):
+   """Returns the next message of the stream, None once the other side closed the connection."""
+   try:
+      header = await reader.readexactly(HEADER.size)
+      (length,) = HEADER.unpack(header)
+      if length > MAX_MESSAGE_SIZE:
+         raise ValueError(f"Message of {length} bytes exceeds the limit of {MAX_MESSAGE_SIZE} bytes")
+      return decode(await reader.readexactly(length))
+   except asyncio.IncompleteReadError:
+      return None
+
+async def write_message(writer, message):
+   writer.write(encode(message))
+   await writer.drain()
+
+def send_message(sock, message):
+   """Blocking counterpart of write_message() for plain sockets."""
+   sock.sendall(encode(message))
+
+def recv_message(sock):
+   """Blocking counterpart of read_message() for plain sockets."""
+   header = recv_exactly(sock, HEADER.size)
+   if header is None:
+      return None
+   (length,) = HEADER.unpack(header)
+   if length > MAX_MESSAGE_SIZE:
+      raise ValueError(f"Message of {length} bytes exceeds the limit of {MAX_MESSAGE_SIZE} bytes")
+   payload = recv_exactly(sock, length)
+   if payload is None:
+      return None
+   return decode(payload)
+
+def recv_exactly(sock, size):
+   data = b""
+   while len(data) < size:
+      chunk = sock.recv(size - len(data))
+      if not chunk:
+         return None
+      data += chunk
+   return data
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# READ ENGINE
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Reads the sender and receiver card registers used by the checks and decodes them into one status snapshot
+# - Decoding follows display_status.py and the check_*.py scripts, the snapshot uses the status.json key names
+# - Used by the resident check runner (check_runner.py) for its background and live sweeps, and by the check_*.py
+#   scripts (snapshot_checks.live_check())
+# - Every function takes the serial port object as an argument, values kept between sweeps live in the
+#   RegisterCache passed to sweep_port(): a register is only read again once older than its "pollingCadence"
+# - sweep_port() tells which keys were read from the card in this sweep, and when, apart from those taken from
+#   the cache: only fresh readings go into the telemetry history (snapshot["fresh"])
+#
+# SNAPSHOT LAYOUT
+# {"timestamp": <epoch>, "lastUpdated": "dd/mm/YYYY HH:MM", "devices": <sender cards found>,
+#  "ports": {"/dev/ttyUSB0": {<sender card keys>, "receiverCard": {0: {<receiver card keys>}, ...}}},
+#  "fresh": {"/dev/ttyUSB0": {(receiver or None for the sender card, key): <epoch read>, ...}}}
+# ------------------------------------------------------------------------------------------------------------
+import time, datetime, logging, methods
+from serial import SerialException
+from base_monitoring import search_devices
+from command import *
+
+LOGGER_NAME = "check_runner"
+MAX_RECEIVER_CARDS = 256 # the receiver index is a single byte in the command frame
+RECEIVERS = "receivers" # cache entry holding the number of receiver cards behind a sender card
+HEAVY_REGISTERS = ("module_status", "module_flash") # long transactions, swept in the listener's heavy class
+
+def send_command(ser, command, sleep_time, receiver=None, checksum=True):
+   """Sends one command to the open port and returns the acknowledged response, None on any failure."""
+   logger = logging.getLogger(LOGGER_NAME)
+   command = list(command) # the lists in command.py are shared, never patch them in place
+   if receiver is not None:
+      command[8] = receiver
+   if checksum:
+      command = methods.checksum(command)
+   logger.debug("Sending command: "+' '.join('{:02X}'.format(a) for a in command))
+   ser.write(command)
+   time.sleep(sleep_time)
+   if ser.inWaiting()>0:
+      rx_data = list(ser.read(size=ser.inWaiting()))
+      logger.debug("Received data: "+' '.join('{:02X}'.format(a) for a in rx_data))
+      if methods.check_response(LOGGER_NAME, rx_data):
+         return rx_data
+      return None
+   logger.warning("No data available at the input buffer")
+   return None
+
+# ------------------------------------------------------------------------------------------------------------
+# SENDER CARD REGISTERS
+# Each reader takes (ser, config, entry) and returns the status.json keys it decoded
+def read_sender_model(ser, config, entry):
+# Base Address: 0x0000_0000H, Data Length: 2H
+   rx_data = send_command(ser, sender_model, float(config["sleepTime"]))
+   if rx_data is None:
+      model = "N/A"
+   elif rx_data[18]==1 and rx_data[19]==1:
+      model = "MCTRL500"
+   elif rx_data[18]==1 and rx_data[19]==0:
+      model = "MSD300/MCTRL300"
+   elif rx_data[18]==1 and rx_data[19]==0x11:
+      model = "MSD600/MCTRL600/MCTRL610/MCTRL660"
+   else:
+      model = "UNKNOWN"
+   return {"controllerModel": model}
+
+def read_sender_firmware(ser, config, entry):
+# Base Address: 0x0400_0000H, Data Length: 4H
+   rx_data = send_command(ser, sender_firmware, float(config["sleepTime"]))
+   if rx_data is None:
+      return {"controllerFirmware": "N/A"}
+   return {"controllerFirmware": "{}.{}.{}.{}".format(rx_data[18],rx_data[19],rx_data[20],rx_data[21])}
+
+def read_function_card(ser, config, entry):
+   rx_data = send_command(ser, check_function_card, float(config["sleepTime"]))
+   if rx_data is None:
+      model = "N/A"
+   elif rx_data[18]==1 and rx_data[19]==0x81:
+      model = "MFN300/MFN300-B"
+   else:
+      model = "UNKNOWN"
+   return {"functionCardModel": model}
+
+def read_dvi(ser, config, entry):
+# Base Address: 0x0200_0000H, Data Length: 1H - the DVI command is sent as is, without checksum
+   rx_data = send_command(ser, check_DVI_signal, float(config["sleepTime"]), checksum=False)
+   if rx_data is None:
+      dvi = "N/A"
+   elif rx_data[18]==0x00:
+      dvi = "Not valid"
+   elif rx_data[18]==0x01:
+      dvi = "Valid"
+   else:
+      dvi = "UNKNOWN"
+   return {"DVISignal": dvi}
+
+def read_brightness(ser, config, entry):
+   rx_data = send_command(ser, display_brightness, float(config["sleepTime"]))
+   if rx_data is None:
+      return {"brightnessLevel": "N/A", "brightnessLevelPC": "N/A"}
+   return {"brightnessLevel": rx_data[18], "brightnessLevelPC": round(100*rx_data[18]/255)}
+
+def read_ambient_light(ser, config, entry):
+# Read through the multifunction card when one is connected, directly from the sender card otherwise
+   sleep_time = float(config["sleepTime"])
+   if entry.get("functionCardModel", "N/A") != "N/A":
+      send_command(ser, function_card_refresh_register, sleep_time) # refresh the function card register first
+      rx_data = send_command(ser, check_ALS_function, sleep_time)
+      valid_byte, value_byte = 20, 21
+   else:
+      rx_data = send_command(ser, check_ALS_direct, sleep_time)
+      valid_byte, value_byte = 19, 18
+   if rx_data is None:
+      lux = "N/A"
+   elif rx_data[valid_byte]&0x80==0x80:
+      lux = rx_data[value_byte]*(0xFFFF/0xFF)
+   else:
+      lux = "Data invalid (0x{:02X})".format(int(rx_data[18]*(0xFFFF/0xFF)))
+   return {"ambientLightLevel": lux}
+
+def read_als_mode(ser, config, entry):
+# Base Address: 0x0A00_0000H, Data Length: 1H
+   rx_data = send_command(ser, check_auto_bright, float(config["sleepTime"]))
+   if rx_data is None:
+      mode = "N/A"
+   elif rx_data[18]==0x7D:
+      mode = "Enabled"
+   elif rx_data[18]==0xFF:
+      mode = "Disabled"
+   else:
+      mode = "UNKNOWN (0x{:02X})".format(rx_data[18])
+   return {"ALSMode": mode}
+
+def read_cabinet_width(ser, config, entry):
+   rx_data = send_command(ser, check_cabinet_width, float(config["sleepTime"]))
+   return {"cabinetWidth": "N/A" if rx_data is None else (rx_data[19]<<8) + rx_data[18]}
+
+def read_cabinet_height(ser, config, entry):
+   rx_data = send_command(ser, check_cabinet_height, float(config["sleepTime"]))
+   return {"cabinetHeight": "N/A" if rx_data is None else (rx_data[19]<<8) + rx_data[18]}
+
+def read_edid(ser, config, entry):
+# EDID 1.3 register, kept as raw hex (see get_edid() in display_status.py for the parsing notes)
+   rx_data = send_command(ser, edid_register, float(config["sleepTime"]))
+   return {"edid": "N/A" if rx_data is None else ' '.join('{:02X}'.format(a) for a in rx_data[18:146])}
+
+# ------------------------------------------------------------------------------------------------------------
+# RECEIVER CARD REGISTERS
+# Each reader takes (ser, config, entry, receiver) and returns the status.json keys it decoded
+RECEIVER_MODELS = {
+   (0x45, 0x06): "Nova A4s",
+   (0x45, 0x08): "Nova A5s",
+   (0x45, 0x0A): "Nova A7s",
+   (0x45, 0x09): "Nova A8s",
+   (0x45, 0x0F): "Nova MRV 366/ MRV 316",
+   (0x45, 0x10): "Nova MRV 328",
+   (0x45, 0x0E): "Nova MRV 308",
+   (0x46, 0x21): "Nova A5s Plus",
+}
+
+def decode_receiver_model(rx_data):
+   if rx_data is None:
+      return {"receiverModel": "N/A"}
+   return {"receiverModel": RECEIVER_MODELS.get((rx_data[19], rx_data[18]), hex(rx_data[19]))}
+
+def read_receiver_model(ser, config, entry, receiver):
+   return decode_receiver_model(send_command(ser, check_receiver_model, float(config["sleepTime"]), receiver))
+
+def read_receiver_firmware(ser, config, entry, receiver):
+   rx_data = send_command(ser, check_receiver_fw, float(config["sleepTime"]), receiver)
+   if rx_data is None:
+      return {"receiverFPGA": "N/A"}
+   return {"receiverFPGA": "{}.{}.{}.{:02x}".format(rx_data[18],rx_data[19],rx_data[20],rx_data[21])}
+
+def read_kill_mode(ser, config, entry, receiver):
+# Kill mode is essentially information about whether the cabinet is ON or OFF
+   rx_data = send_command(ser, kill_mode, float(config["sleepTime"]), receiver)
+   if rx_data is None:
+      kill = "N/A"
+   elif rx_data[18]==0x00:
+      kill = "On"
+   elif rx_data[18]==0xFF:
+      kill = "Off"
+   else:
+      kill = "UNKNOWN"
+   return {"kill": kill}
+
+def read_temperature_voltage(ser, config, entry, receiver):
+# Base Address: 0x0A00_0000H, Data Length: 100H - temperature in 0.5C steps, voltage in 0.1V steps
+   rx_data = send_command(ser, check_monitoring, float(config["sleepTime"]), receiver)
+   if rx_data is None:
+      return {"tempValid": "N/A", "temperature": "N/A", "voltageValid": "N/A", "voltage": "N/A", "monitorCard": "N/A"}
+   values = {}
+   if (rx_data[18]&0x80)==0x80:
+      sign = -1 if (rx_data[18]&0x1) else 1
+      values["tempValid"] = "Yes"
+      values["temperature"] = round(sign*(rx_data[19]&0xFE)*0.5, 2)
+   else:
+      values["tempValid"] = "No"
+      values["temperature"] = "N/A"
+   if (rx_data[21]&0x80)==0x80:
+      values["voltageValid"] = "Yes"
+      values["voltage"] = round(0.1*(rx_data[21]&0x7F), 2)
+   else:
+      values["voltageValid"] = "No"
+      values["voltage"] = "N/A"
+   values["monitorCard"] = "Yes" if rx_data[50]==0xFF else "No"
+   return values
+
+def read_module_status(ser, config, entry, receiver):
+# Payload holds, per module, the LED module status (0xFF = NORMAL, 0x00 = PROBLEM) followed by data groups of
+# 2 bytes; a non zero low nibble in a data group is a block (ribbon cable) fault
+   number_of_modules = int(config["modules"])
+   data_groups = 4
+   element_length = 22 + (data_groups*2)
+   data_length = number_of_modules * element_length
+   command = list(check_module_status)
+   command[16] = data_length & 0x00FF
+   command[17] = (data_length & 0xFF00)>>8
+   rx_data = send_command(ser, command, float(config["sleepTime"]), receiver)
+   if rx_data is None:
+      return {"module": "N/A", "modulesOk": "N/A", "moduleFaults": "N/A", "blockFaults": "N/A"}
+   modules = {}
+   module_faults = 0
+   block_faults = 0
+   for j in range(number_of_modules):
+      element = rx_data[18+j*element_length:(18+j*element_length)+element_length]
+      if len(element) < element_length:
+         modules[j] = "N/A"
+         module_faults += 1
+         continue
+      if element[0]==0xFF:
+         modules[j] = "OK"
+      elif element[0]==0x00:
+         modules[j] = "Error or no module available"
+         module_faults += 1
+      else:
+         modules[j] = "Unkown module state"
+      if any(element[22+2*g] & 0xF for g in range(data_groups)):
+         block_faults += 1
+   return {"module": modules, "modulesOk": module_faults==0, "moduleFaults": module_faults, "blockFaults": block_faults}
+
+def read_module_flash(ser, config, entry, receiver):
+# Starts the module flash check, waits "flashWaitTime" and reads back 4 bytes per module:
+# 0x05 0x05 = OK, 0x03 in either byte = error or no module flash available
+   sleep_time = float(config["sleepTime"])
+   if send_command(ser, start_check_module_flash, sleep_time, receiver) is not None:
+      time.sleep(float(config["flashWaitTime"]))
+   rx_data = send_command(ser, read_back_module_flash, sleep_time, receiver)
+   if rx_data is None:
+      return {"moduleFlash": "N/A", "moduleFlashOk": "N/A"}
+   flash = {}
+   flash_ok = True
+   for j in range(int(rx_data[16]/4)):
+      element = rx_data[18+j*4:(18+j*4)+4]
+      if element[0]==0x05 and element[1]==0x05:
+         flash[j] = "OK"
+      elif element[0]==0x03 or element[1]==0x03:
+         flash[j] = "Error or no module flash available"
+         flash_ok = False
+      else:
+         flash[j] = "UNKNOWN module state"
+   return {"moduleFlash": flash, "moduleFlashOk": flash_ok}
+
+SENDER_READERS = {
+   "sender_model": read_sender_model,
+   "sender_firmware": read_sender_firmware,
+   "function_card": read_function_card,
+   "dvi": read_dvi,
+   "brightness": read_brightness,
+   "ambient_light": read_ambient_light,
+   "als_mode": read_als_mode,
+   "cabinet_width": read_cabinet_width,
+   "cabinet_height": read_cabinet_height,
+   "edid": read_edid,
+}
+RECEIVER_READERS = {
+   "receiver_model": read_receiver_model,
+   "receiver_firmware": read_receiver_firmware,
+   "kill_mode": read_kill_mode,
+   "temperature_voltage": read_temperature_voltage,
+   "module_status": read_module_status,
+   "module_flash": read_module_flash,
+}
+# Registers another register depends on, these are read first
+DEPENDENCIES = {
+   "ambient_light": ["function_card"],
+}
+
+def plan(registers):
+   """Returns the sender and receiver registers to read, dependencies first, each register once."""
+   ordered = []
+   for register in registers:
+      for dependency in DEPENDENCIES.get(register, []) + [register]:
+         if dependency not in ordered:
+            ordered.append(dependency)
+   return [r for r in ordered if r in SENDER_READERS], [r for r in ordered if r in RECEIVER_READERS]
+
+# ------------------------------------------------------------------------------------------------------------
+# SWEEP
+def cadence(config, register):
+   """Seconds a register stays valid in the cache, 0 (read on every sweep) when not configured."""
+   return float(config.get("pollingCadence", {}).get(register, 0))
+
+def cacheable(values):
+   """Failed reads are not cached, the next sweep tries again."""
+   return "N/A" not in values.values()
+
+def open_port(ser, port):
+   """Opens the port on the first register that actually has to be read."""
+   if not ser.isOpen():
+      ser.port = port
+      ser.open()
+      ser.flushInput() #flush input buffer, discarding all its contents
+      ser.flushOutput() #flush output buffer, aborting current output and discard all that is in buffer
+
+def count_receivers(ser, port, config, cache):
+   """Walks the receiver cards until one does not answer; the model answers are cached on the way."""
+   receiver = 0
+   while receiver < MAX_RECEIVER_CARDS:
+      rx_data = send_command(ser, check_receiver_model, float(config["sleepTime"]), receiver)
+      if rx_data is None:
+         break
+      cache.put(port, "receiver_model", decode_receiver_model(rx_data), receiver)
+      receiver += 1
+   return receiver
+
+def sweep_port(ser, port, config, registers, entry, cache, yield_point=None):
+   """Fills entry with the given registers of one sender card and of every receiver card behind it. Returns
+   {(receiver, key): time read} of the keys read from the card, receiver None for sender card keys, leaving out
+   those taken from the cache.
+   yield_point() is called between two receiver cards with the port closed, so a more urgent task (e.g. display
+   control) can use the port in between."""
+   logger = logging.getLogger(LOGGER_NAME)
+   sender_registers, receiver_registers = plan(registers)
+   reads = 0
+   fresh = {}
+   try:
+      for register in sender_registers:
+         values = cache.get(port, register, max_age=cadence(config, register))
+         if values is None:
+            open_port(ser, port)
+            values = SENDER_READERS[register](ser, config, entry)
+            reads += 1
+            fresh.update(dict.fromkeys([(None, key) for key in values], time.time()))
+            if cacheable(values):
+               cache.put(port, register, values)
+         entry.update(values)
+      if receiver_registers:
+         topology = cache.get(port, RECEIVERS, max_age=cadence(config, RECEIVERS))
+         if topology is None:
+            open_port(ser, port)
+            topology = {"count": count_receivers(ser, port, config, cache)}
+            reads += topology["count"] + 1
+            cache.put(port, RECEIVERS, topology)
+         entry["receiverCard"] = {}
+         for receiver in range(topology["count"]):
+            if receiver and yield_point is not None:
+               ser.close() # reopened by open_port() on the next read
+               yield_point()
+            receiver_entry = {}
+            for register in receiver_registers:
+               values = cache.get(port, register, receiver, max_age=cadence(config, register))
+               if values is None:
+                  open_port(ser, port)
+                  values = RECEIVER_READERS[register](ser, config, entry, receiver)
+                  reads += 1
+                  fresh.update(dict.fromkeys([(receiver, key) for key in values], time.time()))
+                  if cacheable(values):
+                     cache.put(port, register, values, receiver)
+               receiver_entry.update(values)
+            entry["receiverCard"][receiver] = receiver_entry
+      logger.info(f"{port}: {reads} register(s) read, {len(entry.get('receiverCard', {}))} receiver card(s)")
+   except SerialException as e:
+      logger.error(f"Error opening serial port: {port} - {e}")
+      entry["error"] = str(e)
+   except Exception as e:
+      logger.exception(f"Error reading {port}: {e}")
+      entry["error"] = str(e)
+   finally:
+      ser.close()
+   return fresh
+
+def discover(config):
+   """Finds the sender cards on all serial ports and returns the status entry of each port. Needs every port."""
+   ser = methods.setupSerialPort(config["baudrate"],LOGGER_NAME) # Initialise serial port
+   ports = {}
+   search_devices(ser, float(config["sleepTime"]), ports)
+   return ports
+
+def sweep_single_port(config, port, registers, entry, cache, yield_point=None):
+   """Sweeps one sender card on its own serial port object, so different ports can be read in parallel."""
+   ser = methods.setupSerialPort(config["baudrate"],LOGGER_NAME)
+   return sweep_port(ser, port, config, registers, entry, cache, yield_point)
+
+def make_snapshot(ports, fresh=None):
+   return {
+      "timestamp": time.time(),
+      "lastUpdated": datetime.datetime.now().strftime("%d/%m/%Y %H:%M"),
+      "devices": len(ports),
+      "ports": ports,
+      "fresh": fresh or {},
+   }
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# REGISTER CACHE
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Keeps the values decoded by read_engine.py per (port, register, receiver) together with the time they were read
+# - read_engine.sweep_port() only goes to the serial line for entries older than the cadence of their register
+#   ("pollingCadence" in config.json, seconds), everything else is served from here
+# ------------------------------------------------------------------------------------------------------------
+import time
+
+class RegisterCache:
+   def __init__(self):
+      self.entries = {}
+
+   def get(self, port, register, receiver=None, max_age=None):
+      """Returns the cached values, None when missing or older than max_age seconds."""
+      entry = self.entries.get((port, register, receiver))
+      if entry is None:
+         return None
+      timestamp, values = entry
+      if max_age is not None and time.time() - timestamp > max_age:
+         return None
+      return values
+
+   def put(self, port, register, values, receiver=None):
+      self.entries[(port, register, receiver)] = (time.time(), values)
+
+   def invalidate(self, port=None, register=None):
+      """Drops the entries matching port and/or register, everything when both are None."""
+      for key in list(self.entries):
+         if (port is None or key[0] == port) and (register is None or key[1] == register):
+            del self.entries[key]
+
+   def __len__(self):
+      return len(self.entries)
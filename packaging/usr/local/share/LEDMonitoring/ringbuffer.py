@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# TELEMETRY RING BUFFER
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Fixed-size memory-mapped file ("ringFile" in config.json) holding the last "ringCapacity" telemetry samples
+#   of check_runner.py, so frequent polling does not go through JSON or SQLite writes on the SD card / eMMC
+# - Layout: header (magic, version, record size, capacity, sequence, count), port name table, then fixed-width
+#   records (timestamp, port id, receiver index, metric id, value). The file never grows, a write overwrites the
+#   oldest record in place
+# - One writer (the runner). Readers mmap the file read-only and need no lock: the writer makes the sequence odd
+#   while it writes and even again afterwards (seqlock), a reader retries when the sequence was odd or changed
+#   while it copied
+# - Placing the file on tmpfs (e.g. /run/LEDMonitoring) keeps the samples off the flash entirely
+# ------------------------------------------------------------------------------------------------------------
+import mmap, os, struct, time
+from history import SENDER_METRICS, RECEIVER_METRICS, fresh_samples
+
+RING_FILE = "telemetry.ring"
+CAPACITY = 65536 # records, 1.5MB
+MAGIC = b"LEDR"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQQ") # magic, version, record size, capacity, sequence, count
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = 12
+COUNT_OFFSET = 20
+PORT_SLOTS = 64
+PORT_NAME_SIZE = 32 # bytes, NUL padded
+RECORDS_OFFSET = HEADER_SIZE + PORT_SLOTS*PORT_NAME_SIZE
+RECORD = struct.Struct("<dHhHxxd") # timestamp, port id, receiver index, metric id, value
+METRICS = list(SENDER_METRICS) + list(RECEIVER_METRICS) # metric id -> name, only ever append
+READ_RETRIES = 100
+
+def file_size(capacity):
+   return RECORDS_OFFSET + capacity*RECORD.size
+
+class RingBuffer:
+   """Writer side, owned by a single process."""
+   def __init__(self, filename=RING_FILE, capacity=CAPACITY):
+      self.filename = filename
+      self.capacity = capacity
+      if not self.valid():
+         self.create()
+      self.file = open(filename, "r+b")
+      self.map = mmap.mmap(self.file.fileno(), file_size(capacity))
+      self.ports = {} # port name -> id
+      for port_id in range(PORT_SLOTS):
+         name = self.port_name(port_id)
+         if name:
+            self.ports[name] = port_id
+
+   def valid(self):
+      """True when the file exists with the layout and capacity asked for, its samples are kept then."""
+      try:
+         with open(self.filename, "rb") as f:
+            magic, version, record_size, capacity, _, _ = HEADER.unpack(f.read(HEADER.size))
+         return (magic, version, record_size, capacity) == (MAGIC, VERSION, RECORD.size, self.capacity) and os.path.getsize(self.filename) == file_size(self.capacity)
+      except (IOError, struct.error):
+         return False
+
+   def create(self):
+      """Writes an empty ring under a temporary name and renames it: readers of an older file keep their mapping."""
+      directory = os.path.dirname(os.path.abspath(self.filename))
+      os.makedirs(directory, exist_ok=True)
+      temporary = self.filename + ".tmp"
+      with open(temporary, "wb") as f:
+         f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.capacity, 0, 0))
+         f.truncate(file_size(self.capacity)) # sparse, zero filled
+      os.replace(temporary, self.filename)
+
+   def port_name(self, port_id):
+      offset = HEADER_SIZE + port_id*PORT_NAME_SIZE
+      return self.map[offset:offset+PORT_NAME_SIZE].rstrip(b"\0").decode(errors="replace")
+
+   def port_id(self, port):
+      """Id of the port, added to the table on first use. None when the table is full."""
+      if port not in self.ports:
+         if len(self.ports) >= PORT_SLOTS:
+            return None
+         port_id = len(self.ports)
+         offset = HEADER_SIZE + port_id*PORT_NAME_SIZE
+         self.map[offset:offset+PORT_NAME_SIZE] = port.encode()[:PORT_NAME_SIZE-1].ljust(PORT_NAME_SIZE, b"\0")
+         self.ports[port] = port_id
+      return self.ports[port]
+
+   def append(self, rows):
+      """Writes (ts, port, receiver, metric, value) rows, constant time per row. Returns how many were written."""
+      sequence, count = struct.unpack_from("<QQ", self.map, SEQUENCE_OFFSET)
+      struct.pack_into("<Q", self.map, SEQUENCE_OFFSET, sequence + 1) # odd: readers retry
+      written = 0
+      try:
+         for ts, port, receiver, metric, value in rows:
+            port_id = self.port_id(port)
+            if port_id is None or metric not in METRICS:
+               continue
+            RECORD.pack_into(self.map, RECORDS_OFFSET + (count % self.capacity)*RECORD.size, ts, port_id, receiver, METRICS.index(metric), value)
+            count += 1
+            written += 1
+         struct.pack_into("<Q", self.map, COUNT_OFFSET, count)
+      finally:
+         struct.pack_into("<Q", self.map, SEQUENCE_OFFSET, sequence + 2)
+      return written
+
+   def record(self, snapshot):
+      """Writes the fresh samples of a snapshot, as History.record() does."""
+      return self.append(fresh_samples(snapshot))
+
+   def close(self):
+      self.map.close()
+      self.file.close()
+
+class RingReader:
+   """Reader side, any number of processes, never blocks the writer."""
+   def __init__(self, filename=RING_FILE):
+      self.file = open(filename, "rb")
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+      magic, version, record_size, self.capacity, _, _ = HEADER.unpack_from(self.map, 0)
+      if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+         raise ValueError(f"{filename} is not a telemetry ring buffer")
+
+   def read(self, since=0):
+      """Returns (count, rows): the samples written since the count of an earlier read (all kept ones for 0),
+      oldest first, and the count to pass next time."""
+      for _ in range(READ_RETRIES):
+         sequence, count = struct.unpack_from("<QQ", self.map, SEQUENCE_OFFSET)
+         if sequence % 2:
+            time.sleep(0.001)
+            continue
+         first = max(since, count - self.capacity)
+         ports = self.map[HEADER_SIZE:RECORDS_OFFSET]
+         records = [self.map[self.offset(index):self.offset(index)+RECORD.size] for index in range(first, count)]
+         if struct.unpack_from("<Q", self.map, SEQUENCE_OFFSET)[0] == sequence: # nothing written while copying
+            return count, self.decode(ports, records)
+      raise TimeoutError("Ring buffer kept changing while being read")
+
+   def offset(self, index):
+      return RECORDS_OFFSET + (index % self.capacity)*RECORD.size
+
+   def decode(self, ports, records):
+      names = [ports[i:i+PORT_NAME_SIZE].rstrip(b"\0").decode(errors="replace") for i in range(0, len(ports), PORT_NAME_SIZE)]
+      rows = []
+      for record in records:
+         ts, port_id, receiver, metric_id, value = RECORD.unpack(record)
+         rows.append((ts, names[port_id], receiver, METRICS[metric_id] if metric_id < len(METRICS) else str(metric_id), value))
+      return rows
+
+   def close(self):
+      self.map.close()
+      self.file.close()
@@ -34,6 +34,7 @@ def main(argv):
     serial_port = argv
     my_logger_debug.info("Using port: {}".format(serial_port))
     ser.port = serial_port
+    listener = methods.acquire_com_ports("SET_DISPLAY_OFF", [serial_port], "control", LOGGER_NAME_DEBUG) # goes ahead of queued checks
     try: 
         ser.open()
     except Exception as e:
@@ -67,6 +68,7 @@ def main(argv):
     else:
         my_logger_debug.error("Error communicating with device: "+ser.name)
         #exit()
+    methods.release_com_ports(listener, LOGGER_NAME_DEBUG)
     
     
 
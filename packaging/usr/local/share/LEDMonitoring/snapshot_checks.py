@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# SNAPSHOT CHECKS
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Evaluates the Icinga checks against a snapshot swept by read_engine.py instead of the serial ports
+# - Every evaluator takes (snapshot, config) and returns (output, exit code). It is the only implementation of
+#   the check: the runner and the check_*.py scripts both answer with it, so Icinga notifications are the same
+# - CHECK_REGISTERS lists the registers each check needs, the runner sweeps their union
+# - live_check() sweeps the registers of one check and evaluates it, for the check_*.py scripts
+# - When the runner scored the snapshot against the baselines of anomaly.py ("baselines"), the temperature,
+#   voltage and brightness checks turn GOOD into WARNING for a value far from its baseline, and add the values
+#   and their deviations as perfdata
+# - With "outlierMode": "Enabled" the temperature, voltage and module checks also compare the receiver cards of a
+#   sender card with each other (outliers.py) and answer WARNING for a receiver card far from the others
+# ------------------------------------------------------------------------------------------------------------
+from base_monitoring import GOOD, WARNING, CRITICAL, UNKNOWN
+from history import SENDER, samples
+from register_cache import RegisterCache
+import outliers, read_engine
+
+NO_DEVICE = "NO DEVICE - make sure a valid controller is connected, that the correct baudrate is defined in config.json and ensure the NOVA LCT is not running on the host system \nThis can also mean that you don't run the tool as administrator"
+
+# Brightness ranges in %
+BRIGHTNESS_RANGES = {
+   WARNING: ((10,30),(85, 90)),
+   CRITICAL: ((0,10), (90, 100)),
+}
+
+def worst(exit_codes):
+   """Combines exit codes the way base_monitoring.icinga_output() does."""
+   for exit_code in (CRITICAL, WARNING, UNKNOWN):
+      if exit_code in exit_codes:
+         return exit_code
+   return GOOD
+
+def per_port(snapshot, evaluate_port):
+   """Runs evaluate_port(port, entry) on every sender card and joins the results."""
+   if not snapshot["ports"]:
+      return NO_DEVICE, CRITICAL
+   output = []
+   exit_codes = []
+   for port in sorted(snapshot["ports"]):
+      entry = snapshot["ports"][port]
+      if "error" in entry:
+         message, exit_code = f"Error reading serial port: {port} - {entry['error']}", CRITICAL
+      else:
+         message, exit_code = evaluate_port(port, entry)
+      output.append(message)
+      exit_codes.append(exit_code)
+   return "\n".join(output), worst(exit_codes)
+
+def receivers(entry):
+   return [entry["receiverCard"][r] for r in sorted(entry.get("receiverCard", {}))]
+
+def anomalies(snapshot, port, metric, label):
+   """Returns a message line per anomaly of the metric on the port, [] without baselines."""
+   lines = []
+   for receiver, metrics in sorted(snapshot.get("baselines", {}).get(port, {}).items()):
+      score = metrics.get(metric)
+      if score and score["anomaly"]:
+         name = "sender card" if receiver == SENDER else f"receiver card {receiver+1}"
+         lines.append(f"{name} {label} {score['value']:g} ANOMALY - baseline {score['baseline']:g} +/- {score['spread']:g}")
+   return lines
+
+def outlier_lines(entry, config, metric, label):
+   """Returns a message line per receiver card standing out from the others of the sender card."""
+   if config.get("outlierMode", "Disabled") != "Enabled":
+      return []
+   found = outliers.find(entry, config.get("outlierDetection")).get(metric, [])
+   return [f"receiver card {outlier['receiver']+1} {label} {outlier['value']:g} OUTLIER - median of the wall {outlier['median']:g}" for outlier in found]
+
+def with_anomalies(message, exit_code, lines):
+   if lines and exit_code == GOOD:
+      exit_code = WARNING
+   return "\n".join([message] + lines), exit_code
+
+def with_perfdata(output, snapshot, metric):
+   """Appends the values of the metric, and their deviation from the baseline, as Icinga perfdata."""
+   perfdata = []
+   for _, port, receiver, name, value in samples(snapshot):
+      if name != metric:
+         continue
+      label = port if receiver == SENDER else f"{port} rc{receiver+1}"
+      perfdata.append(f"'{label} {metric}'={value:g}")
+      score = snapshot.get("baselines", {}).get(port, {}).get(receiver, {}).get(metric)
+      if score:
+         perfdata.append(f"'{label} {metric} deviation'={score['deviation']:g}")
+   return output + "\n| " + " ".join(perfdata) if perfdata else output
+
+# ------------------------------------------------------------------------------------------------------------
+# EVALUATORS
+def check_brightness(snapshot, config):
+   def evaluate_port(port, entry):
+      brightness = entry.get("brightnessLevelPC", "N/A")
+      if brightness == "N/A":
+         return f"{port}\nBRIGHTNESS N/A", UNKNOWN
+      exit_code = GOOD
+      for level in (CRITICAL, WARNING):
+         if any(low <= brightness < high for low, high in BRIGHTNESS_RANGES[level]):
+            exit_code = level
+            break
+      return with_anomalies(f"{port}\nBRIGHTNESS {brightness}%", exit_code, anomalies(snapshot, port, "brightness", "BRIGHTNESS"))
+   output, exit_code = per_port(snapshot, evaluate_port)
+   return with_perfdata(output, snapshot, "brightness"), exit_code
+
+def check_cabinet(snapshot, config):
+   def evaluate_port(port, entry):
+      if any(receiver.get("kill") == "Off" for receiver in receivers(entry)):
+         return f"{port}\nONE OR MORE CABINETS OFF - DISPLAY NOK", CRITICAL
+      return f"{port}\nAll CABINETS OK - DISPLAY OK", GOOD
+   return per_port(snapshot, evaluate_port)
+
+def check_dvi(snapshot, config):
+   def evaluate_port(port, entry):
+      if entry.get("DVISignal") != "Valid": # Check if a video input on DVI is valid
+         return "DVI SIGNAL MISSING", CRITICAL
+      return "DVI SIGNAL OK", GOOD
+   return per_port(snapshot, evaluate_port)
+
+def check_modules(snapshot, config):
+   def evaluate_port(port, entry):
+      message = ""
+      for receiver, values in sorted(entry.get("receiverCard", {}).items()):
+         if values.get("modulesOk") is not True: # False, or N/A when the modules could not be read
+            detected_modules = int(config["modules"]) - values["moduleFaults"] if isinstance(values.get("moduleFaults"), int) else 0
+            message += f"ERROR IN ONE OR MORE MODULES - {config['modules']} EXPECTED, {detected_modules} FOUND, RECEIVER_NR {receiver} \n"
+      if message:
+         return message.strip(), CRITICAL
+      lines = outlier_lines(entry, config, "module_faults", "MODULE FAULTS") + outlier_lines(entry, config, "block_faults", "BLOCK FAULTS")
+      return with_anomalies("ALL MODULES OK", GOOD, lines)
+   return per_port(snapshot, evaluate_port)
+
+def check_receiving_cards(snapshot, config):
+   def evaluate_port(port, entry):
+      no_of_receiver_cards = len(entry.get("receiverCard", {}))
+      message = f"NO of receiver cards {no_of_receiver_cards} EXPECTED {config['receiver_cards']}"
+      return message, GOOD if no_of_receiver_cards == config["receiver_cards"] else CRITICAL
+   return per_port(snapshot, evaluate_port)
+
+def check_receiving_cards_temperature(snapshot, config):
+   def evaluate_port(port, entry):
+      cards = receivers(entry)
+      message = [f"receiver card {k+1} TEMPERATURE {card.get('temperature', 'N/A')}" for k, card in enumerate(cards)]
+      exit_code = CRITICAL if any(card.get("tempValid") != "Yes" for card in cards) else GOOD
+      lines = anomalies(snapshot, port, "temperature", "TEMPERATURE") + outlier_lines(entry, config, "temperature", "TEMPERATURE")
+      return with_anomalies("\n".join([port] + message), exit_code, lines)
+   output, exit_code = per_port(snapshot, evaluate_port)
+   return with_perfdata(output, snapshot, "temperature"), exit_code
+
+def check_receiving_cards_voltage(snapshot, config):
+   def evaluate_port(port, entry):
+      cards = receivers(entry)
+      message = [f"receiver card {k+1} VOLTAGE {card.get('voltage', 'N/A')}" for k, card in enumerate(cards)]
+      exit_code = CRITICAL if any(card.get("voltageValid") != "Yes" for card in cards) else GOOD
+      lines = anomalies(snapshot, port, "voltage", "VOLTAGE") + outlier_lines(entry, config, "voltage", "VOLTAGE")
+      return with_anomalies("\n".join([port] + message), exit_code, lines)
+   output, exit_code = per_port(snapshot, evaluate_port)
+   return with_perfdata(output, snapshot, "voltage"), exit_code
+
+def check_sender_cards(snapshot, config):
+   device_found = len(snapshot["ports"])
+   if not device_found:
+      return NO_DEVICE, CRITICAL
+   if device_found < config["devices"]: # Check if a device is missing
+      return "DEVICE MISSING (SENDER CARD) - {} EXPECTED, {} FOUND".format(config["devices"],device_found), CRITICAL
+   return "SENDER CARD OK", GOOD
+
+SNAPSHOT_CHECKS = {
+   "CHECK_BRIGHTNESS": check_brightness,
+   "CHECK_CABINET": check_cabinet,
+   "CHECK_DVI": check_dvi,
+   "CHECK_MODULES": check_modules,
+   "CHECK_RECEIVING_CARDS": check_receiving_cards,
+   "CHECK_RECEIVING_CARDS_TEMPERATURE": check_receiving_cards_temperature,
+   "CHECK_RECEIVING_CARDS_VOLTAGE": check_receiving_cards_voltage,
+   "CHECK_SENDER_CARDS": check_sender_cards,
+}
+
+# Registers read by read_engine.py for each check
+CHECK_REGISTERS = {
+   "CHECK_BRIGHTNESS": ["brightness"],
+   "CHECK_CABINET": ["kill_mode"],
+   "CHECK_DVI": ["dvi"],
+   "CHECK_MODULES": ["module_status"],
+   "CHECK_RECEIVING_CARDS": ["receiver_model"],
+   "CHECK_RECEIVING_CARDS_TEMPERATURE": ["temperature_voltage"],
+   "CHECK_RECEIVING_CARDS_VOLTAGE": ["temperature_voltage"],
+   "CHECK_SENDER_CARDS": ["sender_model"],
+}
+
+def sweep_registers(check_names):
+   """Returns the registers needed by the given checks, each register once."""
+   registers = []
+   for check_name in check_names:
+      for register in CHECK_REGISTERS[check_name]:
+         if register not in registers:
+            registers.append(register)
+   return registers
+
+def live_check(check_name, config):
+   """Reads the registers of the check from every sender card and evaluates it, as the runner answers a live
+   check. Needs every COM port. Returns (output, exit code, sweep)."""
+   ports = read_engine.discover(config)
+   registers = CHECK_REGISTERS[check_name]
+   fresh = {port: read_engine.sweep_single_port(config, port, registers, ports[port], RegisterCache()) for port in sorted(ports)}
+   sweep = read_engine.make_snapshot(ports, fresh)
+   output, exit_code = SNAPSHOT_CHECKS[check_name](sweep, config)
+   return output, exit_code, sweep
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# BINARY STATUS SNAPSHOT
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - status.bin is written by status_store.py next to status.json every time status.json changes: the telemetry
+#   of every sender and receiver card in fixed-width records, so frequent readers (exporter, CLI, dashboard) do
+#   not parse JSON on every look
+# - Layout (little endian): HEADER, then per sender card PORT followed by one RECEIVER per receiver card. A
+#   reader refuses a file with another magic or version
+# - The generation in the header grows by one on every write. StatusReader keeps the file mapped and only
+#   decodes it again when the generation changed, checking costs a stat() and an 8 byte read
+# - Written to a temporary file and renamed like status.json, a reader never sees a partial file
+# - Missing values ("N/A"): NaN for floats, 255 for states, -1 for counts
+# ------------------------------------------------------------------------------------------------------------
+import math, mmap, os, struct, time, zlib
+
+MAGIC = b"LEDS"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxQdII") # magic, version, generation, time written, sender cards, crc32 of the records
+GENERATION_OFFSET = 8
+PORT = struct.Struct("<32s24sBBfffH") # port, model, up, DVI signal, brightness %, brightness level, ambient light, receiver cards
+RECEIVER = struct.Struct("<HffBBBBhh") # index, temperature, voltage, cabinet on, modules ok, module flash ok, valid flags, module faults, block faults
+TEMPERATURE_VALID = 1
+VOLTAGE_VALID = 2
+UNKNOWN_STATE = 255
+
+def binary_filename(status_filename):
+   return os.path.splitext(status_filename)[0] + ".bin"
+
+def real(value):
+   return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else math.nan
+
+def count(value):
+   return int(value) if isinstance(value, int) and not isinstance(value, bool) else -1
+
+def state(value, on=True):
+   """1 when value equals on, 0 for any other value, UNKNOWN_STATE when missing."""
+   if value is None or value == "N/A":
+      return UNKNOWN_STATE
+   return int(value == on)
+
+def text(value, size):
+   return str(value if value is not None else "").encode(errors="replace")[:size]
+
+def encode(status, generation):
+   """Returns status.bin content of a status.json document."""
+   records = []
+   ports = [port for port in sorted(status) if isinstance(status[port], dict)]
+   for port in ports:
+      entry = status[port]
+      receivers = entry.get("receiverCard", {})
+      records.append(PORT.pack(text(port, 32), text(entry.get("controllerModel"), 24), int("error" not in entry),
+                               state(entry.get("DVISignal"), "Valid"), real(entry.get("brightnessLevelPC")),
+                               real(entry.get("brightnessLevel")), real(entry.get("ambientLightLevel")), len(receivers)))
+      for receiver in sorted(receivers, key=int):
+         values = receivers[receiver]
+         flags = (TEMPERATURE_VALID if values.get("tempValid") == "Yes" else 0) | (VOLTAGE_VALID if values.get("voltageValid") == "Yes" else 0)
+         records.append(RECEIVER.pack(int(receiver), real(values.get("temperature")), real(values.get("voltage")),
+                                      state(values.get("kill"), "On"), state(values.get("modulesOk")), state(values.get("moduleFlashOk")),
+                                      flags, count(values.get("moduleFaults")), count(values.get("blockFaults"))))
+   body = b"".join(records)
+   return HEADER.pack(MAGIC, VERSION, generation, time.time(), len(ports), zlib.crc32(body)) + body
+
+def generation(filename):
+   """Generation of an existing file, 0 when there is none."""
+   try:
+      with open(filename, "rb") as f:
+         magic, version, current, _, _, _ = HEADER.unpack(f.read(HEADER.size))
+      return current if (magic, version) == (MAGIC, VERSION) else 0
+   except (IOError, struct.error):
+      return 0
+
+def decode(data):
+   """Returns (generation, status) of status.bin content, status shaped like status.json with "N/A" for
+   missing values. Raises ValueError for a foreign or damaged file."""
+   try:
+      magic, version, current, _, ports, crc = HEADER.unpack_from(data, 0)
+   except struct.error:
+      raise ValueError("status.bin too short")
+   if (magic, version) != (MAGIC, VERSION):
+      raise ValueError("not a status.bin of this version")
+   if zlib.crc32(data[HEADER.size:]) != crc:
+      raise ValueError("status.bin damaged")
+   def value(number):
+      return "N/A" if math.isnan(number) else round(number, 3)
+   def flag(byte, on=True, off=False):
+      return "N/A" if byte == UNKNOWN_STATE else (on if byte else off)
+   status = {}
+   offset = HEADER.size
+   for _ in range(ports):
+      port, model, up, dvi, brightness_pc, brightness, ambient, receivers = PORT.unpack_from(data, offset)
+      offset += PORT.size
+      entry = status[port.rstrip(b"\0").decode(errors="replace")] = {
+         "controllerModel": model.rstrip(b"\0").decode(errors="replace"), "up": bool(up), "DVISignal": flag(dvi, "Valid", "Missing"),
+         "brightnessLevelPC": value(brightness_pc), "brightnessLevel": value(brightness), "ambientLightLevel": value(ambient),
+         "receiverCard": {},
+      }
+      for _ in range(receivers):
+         index, temperature, voltage, kill, modules_ok, flash_ok, flags, module_faults, block_faults = RECEIVER.unpack_from(data, offset)
+         offset += RECEIVER.size
+         entry["receiverCard"][str(index)] = {
+            "temperature": value(temperature), "voltage": value(voltage), "kill": flag(kill, "On", "Off"),
+            "modulesOk": flag(modules_ok), "moduleFlashOk": flag(flash_ok),
+            "tempValid": "Yes" if flags & TEMPERATURE_VALID else "No", "voltageValid": "Yes" if flags & VOLTAGE_VALID else "No",
+            "moduleFaults": "N/A" if module_faults < 0 else module_faults, "blockFaults": "N/A" if block_faults < 0 else block_faults,
+         }
+   return current, status
+
+class StatusReader:
+   """Keeps status.bin mapped and decodes it only when its generation changed."""
+   def __init__(self, filename):
+      self.filename = filename
+      self.inode = None
+      self.map = None
+      self.generation = None
+      self.status = None
+
+   def remap(self):
+      stat = os.stat(self.filename)
+      if (stat.st_ino, stat.st_size) != self.inode: # renamed over by a new write
+         if self.map is not None:
+            self.map.close()
+         with open(self.filename, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+         self.inode = (stat.st_ino, stat.st_size)
+
+   def changed(self):
+      """True when the file holds another generation than the last read()."""
+      self.remap()
+      return struct.unpack_from("<Q", self.map, GENERATION_OFFSET)[0] != self.generation
+
+   def read(self):
+      """Returns the latest status, decoded again only after a write."""
+      if self.changed():
+         self.generation, self.status = decode(self.map)
+      return self.status
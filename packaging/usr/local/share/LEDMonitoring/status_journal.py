@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# STATUS CHANGE JOURNAL
+# Please read the README.TXT file for further information and details.
+#
+# USAGE
+# Linux: python3 status_journal.py                     every change kept in the journal
+#        python3 status_journal.py --since 1200        changes after sequence number 1200
+#        python3 status_journal.py --since 1200 -f     same, then keeps printing new changes as they come
+#
+# DESCRIPTION
+# - status_store.py compares status.json before and after every write, key by key per sender card and receiver
+#   card, and appends one JSON line per changed key to status_journal.jsonl:
+#   {"seq": 1201, "time": 1760000000.0, "port": "/dev/ttyUSB0", "receiver": 3, "key": "kill", "old": "On", "new": "Off"}
+#   ("receiver" is left out for sender card keys, "old" / "new" is null when the key appeared / went away)
+# - Sequence numbers grow by one per change and never restart, a consumer keeps the last one it handled and
+#   reads on from there (read_since, follow) instead of diffing status.json itself
+# - Measurements changing on every sweep (IGNORED_KEYS: temperature, voltage, brightness, ambient light) are left
+#   out, their trend is in the telemetry history (history.py)
+# - Once the journal is larger than JOURNAL_MAX_BYTES it is renamed to status_journal.jsonl.1 and a new one is
+#   started, readers go through both
+# ------------------------------------------------------------------------------------------------------------
+import argparse, json, os, sys, time
+
+IGNORED_KEYS = ("lastUpdated", "temperature", "voltage", "brightnessLevel", "brightnessLevelPC", "ambientLightLevel")
+JOURNAL_MAX_BYTES = 1024*1024
+TAIL_BYTES = 4096 # read from the end of the journal to find the last sequence number
+FOLLOW_INTERVAL = 1 # seconds
+
+def journal_filename(status_filename):
+   return os.path.splitext(status_filename)[0] + "_journal.jsonl"
+
+def plain(value):
+   """The value as it reads back from status.json, int keys of nested dicts (e.g. "module") become strings."""
+   return json.loads(json.dumps(value)) if isinstance(value, (dict, list)) else value
+
+def flatten(status):
+   """Returns {(port, receiver, key): value} of a status.json document, receiver None for sender card keys."""
+   values = {}
+   for port, entry in status.items():
+      if not isinstance(entry, dict):
+         continue
+      for key, value in entry.items():
+         if key == "receiverCard" and isinstance(value, dict):
+            for receiver, receiver_values in value.items():
+               for receiver_key, receiver_value in receiver_values.items():
+                  if receiver_key not in IGNORED_KEYS:
+                     values[(port, int(receiver), receiver_key)] = plain(receiver_value)
+         elif key not in IGNORED_KEYS:
+            values[(port, None, key)] = plain(value)
+   return values
+
+def diff(old, new):
+   """Returns the changes between two status.json documents, without sequence numbers."""
+   old_values, new_values = flatten(old), flatten(new)
+   changes = []
+   for port, receiver, key in sorted(set(old_values) | set(new_values), key=lambda k: (k[0], -2 if k[1] is None else k[1], k[2])):
+      before, after = old_values.get((port, receiver, key)), new_values.get((port, receiver, key))
+      if before != after:
+         change = {"port": port, "receiver": receiver, "key": key, "old": before, "new": after}
+         if receiver is None:
+            del change["receiver"]
+         changes.append(change)
+   return changes
+
+def last_sequence(filename):
+   """Sequence number of the last change in the journal (or its rotated file), 0 for a new journal."""
+   for path in (filename, filename + ".1"):
+      try:
+         with open(path, "rb") as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - TAIL_BYTES))
+            lines = f.read().splitlines()
+      except IOError:
+         continue
+      for line in reversed(lines):
+         try:
+            return json.loads(line)["seq"]
+         except (ValueError, KeyError, TypeError):
+            continue # first line cut by the seek, or an unfinished line
+   return 0
+
+def append(filename, changes, timestamp=None):
+   """Numbers the changes and appends them in a single write. The caller serialises the writers (status.json
+   lock). Returns the last sequence number."""
+   sequence = last_sequence(filename)
+   if not changes:
+      return sequence
+   timestamp = time.time() if timestamp is None else timestamp
+   lines = []
+   for change in changes:
+      sequence += 1
+      lines.append(json.dumps(dict({"seq": sequence, "time": round(timestamp, 3)}, **change), separators=(",", ":")) + "\n")
+   try:
+      if os.path.getsize(filename) > JOURNAL_MAX_BYTES:
+         os.replace(filename, filename + ".1")
+   except OSError:
+      pass
+   fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+   try:
+      os.write(fd, "".join(lines).encode())
+      os.fsync(fd)
+   finally:
+      os.close(fd)
+   return sequence
+
+def read_since(filename, sequence=0):
+   """Returns the changes after the given sequence number still kept in the journal, oldest first."""
+   changes = []
+   for path in (filename + ".1", filename):
+      try:
+         with open(path, "r") as f:
+            for line in f:
+               try:
+                  change = json.loads(line)
+               except ValueError:
+                  break # line still being written, read again next time
+               if change["seq"] > sequence:
+                  changes.append(change)
+      except IOError:
+         continue
+   return changes
+
+def follow(filename, sequence=0, interval=FOLLOW_INTERVAL):
+   """Yields the changes after the given sequence number, then every new one as it is appended."""
+   while True:
+      for change in read_since(filename, sequence):
+         sequence = change["seq"]
+         yield change
+      time.sleep(interval)
+
+def main(argv):
+   import methods # changes to the LEDMonitoring directory
+   from status_store import STATUS_FILE
+   parser = argparse.ArgumentParser(description="Changes of status.json, from the status change journal")
+   parser.add_argument("--since", type=int, default=0, help="last sequence number already handled")
+   parser.add_argument("-f", "--follow", action="store_true", help="keep printing new changes")
+   args = parser.parse_args(argv[1:])
+   filename = journal_filename(STATUS_FILE)
+   changes = follow(filename, args.since) if args.follow else read_since(filename, args.since)
+   try:
+      for change in changes:
+         print(json.dumps(change), flush=True)
+   except KeyboardInterrupt:
+      pass
+   return 0
+
+if __name__ == "__main__":
+   sys.exit(main(sys.argv))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------------------------------------
+# STATUS STORE
+# Please read the README.TXT file for further information and details.
+#
+# DESCRIPTION
+# - Collects updates of status.json per sender card port and per receiver card, from any check or sweep, and
+#   merges them into the file instead of replacing it, so one check no longer wipes the sections of another
+# - flush() re-reads the file under a lock, merges the pending updates and writes compact JSON to a temporary
+#   file which is fsynced and renamed over status.json: a reader or a power cut never sees a truncated file
+# - Nothing is written when the merge leaves the file unchanged
+# - A value of None removes the key (e.g. the "error" of a sender card which answers again)
+# - Every write of status.json also replaces status.bin, the same telemetry in fixed-width records with a
+#   generation counter (status_bin.py)
+# - The keys which changed are appended to the status change journal with a sequence number (status_journal.py)
+# ------------------------------------------------------------------------------------------------------------
+import json, os, tempfile, status_bin, status_journal
+try:
+   import fcntl
+except ImportError: # Windows, writers are not serialised there
+   fcntl = None
+
+STATUS_FILE = "status.json"
+RECEIVERS = "receiverCard"
+
+def atomic_write(filename, text):
+   """Replaces the file with the text (or bytes) in one step: temporary file in the same directory, fsync, rename."""
+   directory = os.path.dirname(os.path.abspath(filename))
+   fd, temporary = tempfile.mkstemp(prefix="." + os.path.basename(filename) + ".", suffix=".tmp", dir=directory)
+   try:
+      with os.fdopen(fd, "wb" if isinstance(text, bytes) else "w") as f:
+         f.write(text)
+         f.flush()
+         os.fsync(f.fileno())
+      os.replace(temporary, filename)
+   except BaseException:
+      os.unlink(temporary)
+      raise
+   if hasattr(os, "O_DIRECTORY"): # make the rename itself survive a power cut
+      dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+      try:
+         os.fsync(dir_fd)
+      finally:
+         os.close(dir_fd)
+
+def merge(target, values, remove=True):
+   """Merges values into target, None removes a key (kept as None when remove is False, for pending updates).
+   receiverCard entries are merged per receiver card."""
+   for key, value in values.items():
+      if value is None and remove:
+         target.pop(key, None)
+      elif key == RECEIVERS and isinstance(value, dict):
+         receivers = target.setdefault(RECEIVERS, {})
+         for receiver, receiver_values in value.items():
+            merge(receivers.setdefault(str(receiver), {}), receiver_values, remove) # JSON keys are strings
+      else:
+         target[key] = value
+
+class StatusStore:
+   def __init__(self, filename=STATUS_FILE):
+      self.filename = filename
+      self.pending = {} # port -> values, merged into the file by flush()
+
+   def update_port(self, port, values):
+      merge(self.pending.setdefault(port, {}), values, remove=False)
+
+   def update_receiver(self, port, receiver, values):
+      self.update_port(port, {RECEIVERS: {receiver: values}})
+
+   def update(self, status):
+      """Queues a whole {port: values} document, as built by the check scripts."""
+      for port, values in status.items():
+         self.update_port(port, values)
+
+   def update_snapshot(self, snapshot):
+      """Queues every sender card of a read_engine.py sweep, stamped with its time. A card read without error
+      loses the error of an earlier sweep."""
+      for port, entry in snapshot["ports"].items():
+         self.update_port(port, dict(entry, lastUpdated=snapshot["lastUpdated"], error=entry.get("error")))
+
+   def read(self):
+      """Returns the current content of the file, empty when missing or unreadable."""
+      try:
+         with open(self.filename, "r") as f:
+            return json.load(f)
+      except (IOError, ValueError):
+         return {}
+
+   def flush(self):
+      """Merges the pending updates into the file. Returns True when the file was written."""
+      pending, self.pending = self.pending, {} # updates arriving meanwhile wait for the next flush
+      if not pending:
+         return False
+      lock = open(self.filename + ".lock", "a")
+      try:
+         if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX) # other processes merge into the same file
+         data = self.read()
+         before = json.dumps(data, separators=(",", ":"), sort_keys=True)
+         for port, values in pending.items():
+            merge(data.setdefault(port, {}), values)
+         after = json.dumps(data, separators=(",", ":"), sort_keys=True)
+         if after == before:
+            return False
+         atomic_write(self.filename, after)
+         data = json.loads(after) # as a reader sees it: receiver keys of nested dicts (e.g. "module") become strings
+         binary = status_bin.binary_filename(self.filename)
+         atomic_write(binary, status_bin.encode(data, status_bin.generation(binary) + 1))
+         status_journal.append(status_journal.journal_filename(self.filename), status_journal.diff(json.loads(before), data))
+         return True
+      finally:
+         lock.close()
@@ -1,4 +1,4 @@
 # !/bin/bash
-python3 /data/opt/LEDMonitoring/check_brightness.py
+python3 /data/opt/LEDMonitoring/check_client.py CHECK_BRIGHTNESS
 EXIT_CODE=$?
 return $EXIT_CODE
@@ -1,4 +1,4 @@
 # !/bin/bash
-python3 /data/opt/LEDMonitoring/check_dvi.py
+python3 /data/opt/LEDMonitoring/check_client.py CHECK_DVI
 EXIT_STATUS=$?
 exit $EXIT_STATUS
@@ -1,5 +1,5 @@
 # !/bin/bash
-python3 /data/opt/LEDMonitoring/check_receiving_cards.py
+python3 /data/opt/LEDMonitoring/check_client.py CHECK_RECEIVING_CARDS
 EXIT_STATUS=$?
 
 exit $EXIT_STATUS
@@ -1,5 +1,5 @@
 # !/bin/bash
-python3 /data/opt/LEDMonitoring/check_receiving_cards_temperature.py
+python3 /data/opt/LEDMonitoring/check_client.py CHECK_RECEIVING_CARDS_TEMPERATURE
 EXIT_STATUS=$?
 
 exit $EXIT_STATUS
@@ -1,4 +1,4 @@
 # !/bin/bash
-python3 /data/opt/LEDMonitoring/check_sender_cards.py
+python3 /data/opt/LEDMonitoring/check_client.py CHECK_SENDER_CARDS
 EXIT_STATUS=$?
 exit $EXIT_STATUS
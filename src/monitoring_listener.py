@@ -1,61 +1,636 @@
-import asyncio
-async def handle_client(reader, writer, script_queue):
-    task_name = (await reader.read(1024)).decode().strip()
-    print(f"Received task: {task_name}")
+import asyncio, bisect, collections, fnmatch, glob, heapq, itertools, json, os, signal, socket, struct, time
+try:
+    import grp, termios
+except ImportError: # Windows, no socket group and no serial port flush
+    grp = termios = None
+try:
+    import winreg
+except ImportError: # not Windows, serial ports are device nodes
+    winreg = None
 
-    # Create an event specific to this task
-    task_event = asyncio.Event()
+# Messages are JSON objects preceded by their length as a 4 byte big endian unsigned integer, same framing as
+# LEDMonitoring/protocol.py (see there for the message types)
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 16*1024*1024
 
-    # Add the task to the queue
-    await script_queue.put((task_name, task_event, reader, writer))
-    print(f"Task '{task_name}' added to queue")
+# Endpoints: "listenerEndpoint" of config.json (a Unix socket path by default, the checks connect there), plus
+# 127.0.0.1:8888 for older clients only with "listenerTcpMode": "Enabled". Under systemd the sockets are handed
+# over by led-monitoring-listener.socket instead. Windows has no Unix sockets for asyncio, TCP only there
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # /data/opt/LEDMonitoring
+CONFIG = os.path.join(BASE_DIR, "config.json")
+TCP_ENDPOINT = "127.0.0.1:8888"
+DEFAULT_ENDPOINT = TCP_ENDPOINT if os.name == "nt" else "/run/LEDMonitoring/listener.sock"
+SOCKET_MODE = 0o660 # only root and SOCKET_GROUP may connect to the Unix socket
+SOCKET_GROUP = "nagios" # Icinga runs the checks as nagios
+SD_LISTEN_FDS_START = 3 # first file descriptor passed by systemd socket activation
+
+# Serial ports a task may ask for, and the ports it gets when it does not name any. A task naming other ports, or
+# none when no port is known, is rejected: the listener runs as root and opens the ports of a dead client to flush
+# them. "listenerPorts" of config.json replaces the patterns of the platform (only the file name may hold wildcards)
+DEFAULT_PORT_PATTERNS = (["COM[0-9]", "COM[0-9][0-9]", "COM[0-9][0-9][0-9]"] if os.name == "nt"
+                         else ["/dev/ttyUSB*", "/dev/ttyACM*", "/dev/ttyS*"])
+PORT_PATTERNS = list(DEFAULT_PORT_PATTERNS)
+WILDCARDS = "*?["
+
+# Priority classes, lower runs first: display control, regular checks, long diagnostics (module status/flash)
+PRIORITIES = {"control": 0, "fast": 1, "heavy": 2}
+HEAVY_TASKS = ("CHECK_MODULES",)
+
+# Deadlines: a request carrying a deadline (epoch seconds) is rejected instead of queued when the expected wait
+# plus its expected duration ends after the deadline, and again when the deadline passes while queued
+DEFAULT_DURATION = 5.0 # seconds expected from a task never seen before
+DURATION_WEIGHT = 0.3 # weight of the latest run in the moving average of a task duration
 
-    # Wait for the task to complete
-    await task_event.wait()
+# Instrumentation: per task name, histograms of the time waiting in the queue, holding the COM ports and waiting
+# for the client to send done, plus a count of every outcome. Answered to {"type": "status"} and printed as a
+# summary every SUMMARY_INTERVAL seconds
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120) # upper bounds in seconds, +Inf comes on top
+SUMMARY_INTERVAL = 300
 
-    # Notify the client
-    writer.write(f"Task '{task_name}' finished\n".encode())
+# Watchdog ("listenerWatchdog" in config.json overrides these): a task holding its ports longer than the maximum
+# of its class, or not heard from for idleTimeout seconds, is considered dead, same as a client closing its
+# connection. Its ports are flushed and released and the incident is appended to INCIDENT_LOG
+WATCHDOG = {
+    "idleTimeout": 120, # seconds without done or yield, heavy tasks yield between two receiver cards
+    "maxHold": {"control": 60, "fast": 120, "heavy": 1800}, # seconds holding the ports, yields excluded
+}
+INCIDENT_LOG = os.path.join(BASE_DIR, "listener_incidents.jsonl")
+INCIDENTS_KEPT = 20 # most recent incidents listed in the status answer
+
+async def read_message(reader):
+    """Returns the next message of the stream, None once the client closed the connection."""
+    try:
+        (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+        if length > MAX_MESSAGE_SIZE:
+            raise ValueError(f"Message of {length} bytes exceeds the limit of {MAX_MESSAGE_SIZE} bytes")
+        message = json.loads((await reader.readexactly(length)).decode())
+    except asyncio.IncompleteReadError:
+        return None
+    if not isinstance(message, dict):
+        raise ValueError("Message is not a JSON object")
+    return message
+
+async def write_message(writer, message):
+    payload = json.dumps(message, separators=(",", ":")).encode()
+    writer.write(HEADER.pack(len(payload)) + payload)
     await writer.drain()
-    writer.close()
-    await writer.wait_closed()
 
-async def process_queue(script_queue, com_port_lock):
+class Task:
+    """One client request, from its first message until its ports are released."""
+    ids = itertools.count(1) # for requests sent without an id
+
+    def __init__(self, request_id, name, ports, priority, deadline, writer):
+        self.id = request_id
+        self.name = name
+        self.ports = ports
+        self.priority = priority
+        self.deadline = deadline
+        self.writer = writer
+        self.messages = asyncio.Queue() # filled by handle_client(), the only reader of the connection
+        self.done = asyncio.Event()
+        self.job = None # run_task() of this task, cancelled when the client goes away while queued
+        self.queued = time.time()
+        self.started = None # time the ports were granted
+        self.gone = False # nothing more is sent to the client for this task
+
+class Durations:
+    """Moving average of how long each task name holds its ports."""
+    def __init__(self):
+        self.averages = {}
+
+    def expected(self, task_name):
+        return self.averages.get(task_name, DEFAULT_DURATION)
+
+    def update(self, task_name, seconds):
+        if task_name in self.averages:
+            self.averages[task_name] += DURATION_WEIGHT * (seconds - self.averages[task_name])
+        else:
+            self.averages[task_name] = seconds
+
+class Histogram:
+    """Counts observations per bucket of BUCKETS, like a Prometheus histogram."""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile, the maximum for the +Inf bucket."""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (self.max,), self.counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return min(bound, self.max)
+        return 0.0
+
+    def as_dict(self):
+        cumulative = list(itertools.accumulate(self.counts))
+        buckets = {str(bound): count for bound, count in zip(BUCKETS, cumulative)}
+        buckets["+Inf"] = self.count
+        return {"buckets": buckets, "count": self.count, "sum": round(self.sum, 3), "max": round(self.max, 3)}
+
+class TaskStats:
+    def __init__(self):
+        self.queue_wait = Histogram() # request received until the ports are granted
+        self.lock_hold = Histogram() # ports held, without the time given away by yields
+        self.client_wait = Histogram() # ports granted until the client sends done (or goes away)
+        self.outcomes = collections.Counter() # done, gone, watchdog, cancelled, rejected, expired, failed
+
+class Stats:
+    """Instrumentation of the listener, per task name."""
+    def __init__(self):
+        self.started = time.time()
+        self.tasks = {}
+        self.incidents = collections.deque(maxlen=INCIDENTS_KEPT)
+
+    def task(self, task_name):
+        return self.tasks.setdefault(task_name, TaskStats())
+
+    def outcome(self, task_name, outcome):
+        self.task(task_name).outcomes[outcome] += 1
+
+def queue_depth(script_queue, port_locks):
+    """Tasks waiting for their COM ports, a task waits on one port at a time."""
+    waiting = {id(waiter[3]) for lock in port_locks.values() for waiter in lock.waiters}
+    return script_queue.qsize() + len(waiting)
+
+def status(stats, script_queue, port_locks):
+    return {
+        "type": "status",
+        "uptime": round(time.time() - stats.started, 3),
+        "queue_depth": queue_depth(script_queue, port_locks),
+        "holding": {port: lock.owner.name for port, lock in sorted(port_locks.items()) if lock.owner is not None},
+        "incidents": list(stats.incidents),
+        "tasks": {
+            task_name: {
+                "queue_wait": task_stats.queue_wait.as_dict(),
+                "lock_hold": task_stats.lock_hold.as_dict(),
+                "client_wait": task_stats.client_wait.as_dict(),
+                "outcomes": dict(task_stats.outcomes),
+            }
+            for task_name, task_stats in sorted(stats.tasks.items())
+        },
+    }
+
+async def summary_loop(stats, script_queue, port_locks):
     while True:
-        task_name, task_event, reader, writer = await script_queue.get()
-        print(f"Processing task: {task_name}")
+        await asyncio.sleep(SUMMARY_INTERVAL)
+        print(f"Summary: queue depth {queue_depth(script_queue, port_locks)}")
+        for task_name, task_stats in sorted(stats.tasks.items()):
+            summary = ", ".join(
+                f"{label} p50/p95/max {histogram.quantile(0.5):.2f}/{histogram.quantile(0.95):.2f}/{histogram.max:.2f}s"
+                for label, histogram in (("queue", task_stats.queue_wait), ("hold", task_stats.lock_hold), ("client", task_stats.client_wait))
+            )
+            print(f"Summary {task_name}: {task_stats.queue_wait.count} run(s), {summary} - {dict(task_stats.outcomes)}")
+
+class PortLock:
+    """Lock for one serial port handing ownership to the waiter with the best priority, FIFO within a class."""
+    sequence = itertools.count()
+
+    def __init__(self):
+        self.owner = None # Task holding the port
+        self.waiters = [] # heap of (priority, sequence, future, task)
+
+    async def acquire(self, task, first=False):
+        if self.owner is None and not self.waiters:
+            self.owner = task
+            return
+        # first puts a yielding task back in front of its own class
+        order = -next(self.sequence) if first else next(self.sequence)
+        future = asyncio.get_event_loop().create_future()
+        waiter = (task.priority, order, future, task)
+        heapq.heappush(self.waiters, waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release() # ownership was handed over while being cancelled, pass it on
+            else:
+                self.waiters.remove(waiter)
+                heapq.heapify(self.waiters)
+            raise
+
+    def release(self):
+        while self.waiters:
+            _, _, future, task = heapq.heappop(self.waiters)
+            if not future.done():
+                self.owner = task # ownership passes directly to the next task
+                future.set_result(True)
+                return
+        self.owner = None
+
+    def waiting(self, priority):
+        """True when a task with a better priority than the given one waits for this port."""
+        return any(waiter[0] < priority for waiter in self.waiters)
+
+    def expected_wait(self, priority, durations):
+        """Seconds until a new task of the given priority would get this port."""
+        wait = 0.0
+        if self.owner is not None:
+            elapsed = time.time() - self.owner.started if self.owner.started else 0.0
+            wait += max(0.0, durations.expected(self.owner.name) - elapsed)
+        wait += sum(durations.expected(waiter[3].name) for waiter in self.waiters if waiter[0] <= priority)
+        return wait
+
+def default_priority(task_name):
+    if task_name.startswith("SET_"):
+        return "control"
+    if task_name in HEAVY_TASKS:
+        return "heavy"
+    return "fast"
+
+def valid_port(port):
+    """True for a name matching one of PORT_PATTERNS, in the same directory (no "/dev/ttyUSB0/../watchdog")."""
+    return isinstance(port, str) and any(
+        os.path.dirname(port) == os.path.dirname(pattern) and fnmatch.fnmatchcase(os.path.basename(port), os.path.basename(pattern))
+        for pattern in PORT_PATTERNS)
 
-        # Lock the COM port
-        async with com_port_lock:
-            print("COM port locked")
-            writer.write("START\n".encode())
-            await writer.drain()
+def parse_request(message, writer, port_locks):
+    """Builds the task of a request message: ports default to every port, priority to the class of the task name.
+    Raises ValueError when the ports are not a non empty list of serial ports matching PORT_PATTERNS."""
+    task_name = str(message.get("task", ""))
+    ports = message.get("ports") or known_ports(port_locks)
+    if not isinstance(ports, list) or not all(valid_port(port) for port in ports):
+        raise ValueError(f"invalid ports {ports!r}, expected a list of {', '.join(PORT_PATTERNS)}")
+    if not ports:
+        raise ValueError("no serial port known, the task must name its ports")
+    priority = message.get("priority")
+    if priority not in PRIORITIES:
+        priority = default_priority(task_name)
+    deadline = message.get("deadline")
+    if not isinstance(deadline, (int, float)):
+        deadline = None
+    request_id = message.get("id")
+    if not isinstance(request_id, (str, int)):
+        request_id = next(Task.ids)
+    return Task(request_id, task_name, sorted(set(ports)), PRIORITIES[priority], deadline, writer)
 
-            # Wait for client response
-            client_response = await reader.read(1024)
-            print(f"Client response: {client_response.decode().strip()}")
+def present_ports():
+    """Serial ports present on the system: the COM ports listed in the registry on Windows, the device nodes matching
+    PORT_PATTERNS elsewhere."""
+    if winreg is not None:
+        ports = []
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"HARDWARE\DEVICEMAP\SERIALCOMM") as key:
+                for i in itertools.count():
+                    ports.append(winreg.EnumValue(key, i)[1])
+        except OSError: # no more values, or no serial port at all
+            pass
+        return {port for port in ports if valid_port(port)}
+    return {port for pattern in PORT_PATTERNS for port in glob.glob(pattern)}
 
+def known_ports(port_locks):
+    """Ports present on the system plus every port a task asked for before."""
+    return sorted(present_ports() | set(port_locks))
+
+def expected_wait(task, port_locks, durations):
+    """Seconds before the task would get all its ports."""
+    return max([port_locks[port].expected_wait(task.priority, durations) for port in task.ports if port in port_locks] + [0.0])
+
+async def submit(message, writer, script_queue, port_locks, durations, stats):
+    """Queues the task of a request message, returns None when it was rejected straight away."""
+    try:
+        task = parse_request(message, writer, port_locks)
+    except ValueError as e:
+        print(f"Request rejected: {e}")
+        await write_message(writer, {"type": "reject", "id": message.get("id"), "reason": "ports"})
+        return None
+    print(f"Received task: {task.name} ({task.id}) - ports: {', '.join(task.ports)} - priority: {task.priority}")
+
+    # Reject straight away what can not finish before its deadline
+    if task.deadline is not None:
+        expected = expected_wait(task, port_locks, durations) + durations.expected(task.name)
+        if time.time() + expected > task.deadline:
+            print(f"Task '{task.name}' rejected, expected to take {expected:.1f}s, {max(0.0, task.deadline - time.time()):.1f}s left")
+            await write_message(writer, {"type": "reject", "id": task.id, "reason": "deadline", "expected": round(expected, 3)})
+            stats.outcome(task.name, "rejected")
+            return None
+
+    # Add the task to the queue
+    await script_queue.put((task.priority, next(PortLock.sequence), task))
+    print(f"Task '{task.name}' added to queue")
+    return task
+
+def find_task(tasks, request_id):
+    """Task a message belongs to; without id the only unfinished task of the connection."""
+    if request_id is not None:
+        return tasks.get(request_id)
+    active = [task for task in tasks.values() if not task.done.is_set()]
+    return active[0] if len(active) == 1 else None
+
+def drop_task(task, stats):
+    """Stops sending to the client of a task and cancels the task when it is still waiting for its ports."""
+    task.gone = True
+    if task.job is not None and task.started is None:
+        print(f"Task '{task.name}' cancelled while queued")
+        stats.outcome(task.name, "cancelled")
+        task.job.cancel()
+        task.done.set() # a job cancelled before it ever ran never gets to set it
+
+async def handle_client(reader, writer, script_queue, port_locks, durations, stats):
+    # All reads of the connection happen here, so a client going away is noticed while its tasks are queued.
+    # Requests are queued, every other message is passed on to the task it belongs to
+    tasks = {} # request id -> Task
+    try:
+        while True:
+            try:
+                message = await read_message(reader)
+            except (ValueError, UnicodeDecodeError) as e:
+                print(f"Invalid message, closing connection: {e}")
+                break
+            if message is None:
+                break
+            for request_id in [i for i, task in tasks.items() if task.done.is_set()]:
+                del tasks[request_id]
+            if message.get("type") == "request":
+                task = await submit(message, writer, script_queue, port_locks, durations, stats)
+                if task is not None:
+                    tasks[task.id] = task
+                continue
+            if message.get("type") == "status":
+                await write_message(writer, status(stats, script_queue, port_locks))
+                continue
+            task = find_task(tasks, message.get("id"))
+            if task is None:
+                print(f"Message for unknown task: {message}")
+                await write_message(writer, {"type": "error", "id": message.get("id"), "reason": "unknown request"})
+            elif message.get("type") == "cancel" and task.started is None:
+                drop_task(task, stats)
+                await write_message(writer, {"type": "finished", "id": task.id, "cancelled": True})
+            else:
+                await task.messages.put(message)
+    except Exception as e:
+        print(f"Connection failed: {e}")
+    finally:
+        # The client went away: cancel what is still queued and release the ports of what is running
+        for task in tasks.values():
+            if not task.done.is_set():
+                drop_task(task, stats)
+                await task.messages.put(None)
+        writer.close()
+
+def load_config():
+    try:
+        with open(CONFIG, "r") as f:
+            return json.load(f)
+    except (IOError, ValueError) as e:
+        print(f"Could not read {CONFIG}, using defaults: {e}")
+        return {}
+
+def apply_watchdog(config):
+    watchdog = config.get("listenerWatchdog", {})
+    try:
+        idle_timeout = float(watchdog.get("idleTimeout", WATCHDOG["idleTimeout"]))
+        max_holds = {priority: float(seconds) for priority, seconds in watchdog.get("maxHold", {}).items() if priority in PRIORITIES}
+    except (TypeError, ValueError, AttributeError) as e:
+        print(f"Invalid listenerWatchdog in {CONFIG}, keeping {WATCHDOG}: {e}")
+        return
+    WATCHDOG["idleTimeout"] = idle_timeout
+    WATCHDOG["maxHold"].update(max_holds)
+    print(f"Watchdog: {WATCHDOG}")
+
+def apply_ports(config):
+    patterns = config.get("listenerPorts", DEFAULT_PORT_PATTERNS)
+    if (not isinstance(patterns, list) or not patterns or not all(isinstance(pattern, str) for pattern in patterns)
+            or any(char in os.path.dirname(pattern) for pattern in patterns for char in WILDCARDS)):
+        print(f"Invalid listenerPorts in {CONFIG}, keeping {PORT_PATTERNS}: expected a list of patterns, wildcards in the file name only")
+        return
+    PORT_PATTERNS[:] = patterns
+    print(f"Serial ports: {', '.join(PORT_PATTERNS)}")
+
+def load_endpoints(config):
+    endpoints = [config.get("listenerEndpoint", DEFAULT_ENDPOINT)]
+    if config.get("listenerTcpMode", "Disabled") == "Enabled" and TCP_ENDPOINT not in endpoints:
+        endpoints.append(TCP_ENDPOINT)
+    return endpoints
+
+def activated_sockets():
+    """Listening sockets passed by systemd (sd_listen_fds protocol), empty when started by hand."""
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return []
+    count = int(os.environ.get("LISTEN_FDS", "0"))
+    return [socket.socket(fileno=SD_LISTEN_FDS_START + i) for i in range(count)]
+
+async def serve(endpoint, client_connected):
+    if not endpoint.startswith("/"):
+        host, _, port = endpoint.rpartition(":")
+        return await asyncio.start_server(client_connected, host, int(port))
+    os.makedirs(os.path.dirname(endpoint), exist_ok=True)
+    if os.path.exists(endpoint):
+        os.unlink(endpoint) # left behind by a listener that did not shut down cleanly
+    server = await asyncio.start_unix_server(client_connected, endpoint)
+    os.chmod(endpoint, SOCKET_MODE)
+    try:
+        if grp is None:
+            raise KeyError("no groups on this platform")
+        os.chown(endpoint, -1, grp.getgrnam(SOCKET_GROUP).gr_gid)
+    except (KeyError, PermissionError) as e:
+        print(f"Could not hand {endpoint} to group {SOCKET_GROUP}: {e}")
+    return server
+
+def max_hold(task):
+    priority = next(name for name, value in PRIORITIES.items() if value == task.priority)
+    return float(WATCHDOG["maxHold"].get(priority, max(WATCHDOG["maxHold"].values())))
+
+def flush_ports(ports):
+    """Discards whatever a dead client left in the buffers of its serial ports, so the next task starts clean."""
+    if termios is None:
+        return
+    for port in ports:
+        if not valid_port(port): # never open anything but a serial port as root
+            continue
+        try:
+            fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            try:
+                termios.tcflush(fd, termios.TCIOFLUSH)
+            finally:
+                os.close(fd)
+        except (OSError, termios.error) as e:
+            print(f"Could not flush {port}: {e}")
+
+def record_incident(stats, task, reason, held_time):
+    incident = {
+        "time": round(time.time(), 3),
+        "task": task.name,
+        "id": task.id,
+        "ports": task.ports,
+        "reason": reason,
+        "held": round(held_time, 3),
+    }
+    stats.incidents.append(incident)
+    print(f"Incident: task '{task.name}' {reason} after holding {', '.join(task.ports)} for {held_time:.1f}s")
+    try:
+        with open(INCIDENT_LOG, "a") as f:
+            f.write(json.dumps(incident) + "\n")
+    except IOError as e:
+        print(f"Could not write {INCIDENT_LOG}: {e}")
+
+async def acquire_all(locks, task, first=False):
+    # Locks are always taken in sorted port order, so two tasks sharing ports can never deadlock and a
+    # task needing several ports only starts once it holds all of them
+    acquired = []
+    try:
+        for lock in locks:
+            await lock.acquire(task, first)
+            acquired.append(lock)
+    except BaseException:
+        release_all(acquired)
+        raise
+
+def release_all(locks):
+    for lock in reversed(locks):
+        lock.release()
+
+async def run_task(task, port_locks, durations, stats):
+    try:
+        await hold_ports(task, port_locks, durations, stats)
+    finally:
         # Mark the task as complete
+        task.done.set()
+
+async def hold_ports(task, port_locks, durations, stats):
+    if task.gone:
+        return
+    locks = [port_locks.setdefault(port, PortLock()) for port in task.ports]
+    try:
+        if task.deadline is None:
+            await acquire_all(locks, task)
+        else:
+            # Give up waiting once the task could no longer finish before its deadline
+            await asyncio.wait_for(acquire_all(locks, task), task.deadline - time.time() - durations.expected(task.name))
+    except asyncio.TimeoutError:
+        print(f"Task '{task.name}' rejected, deadline reached while queued")
+        stats.outcome(task.name, "expired")
+        await notify(task, {"type": "reject", "id": task.id, "reason": "deadline"})
+        return
+    except asyncio.CancelledError:
+        return
+
+    task.started = time.time()
+    task_stats = stats.task(task.name)
+    task_stats.queue_wait.observe(task.started - task.queued)
+    held = True
+    held_since = task.started
+    held_time = 0.0
+    outcome = "failed"
+    try:
+        print(f"COM port(s) locked for {task.name}: {', '.join(task.ports)}")
+        await notify(task, {"type": "start", "id": task.id, "waited": round(task.started - task.queued, 3)})
+
+        # Wait for the client to finish. A yield is sent by long tasks between two transactions: when a task
+        # of a better class waits for one of the ports, the ports are handed over and given back afterwards
+        # The watchdog gives up on the client after idleTimeout seconds of silence or once the task held its
+        # ports for the maximum of its class
+        incident = None
+        while True:
+            remaining = max_hold(task) - (held_time + time.time() - held_since)
+            idle_timeout = float(WATCHDOG["idleTimeout"])
+            try:
+                message = await asyncio.wait_for(task.messages.get(), max(0.0, min(remaining, idle_timeout)))
+            except asyncio.TimeoutError:
+                message = None
+                incident = "exceeded its maximum hold time" if remaining <= idle_timeout else f"silent for {idle_timeout:.0f}s"
+            if message is None or message.get("type") != "yield":
+                break
+            yielded = any(lock.waiting(task.priority) for lock in locks)
+            if yielded:
+                print(f"Task '{task.name}' yields its COM port(s)")
+                release_all(locks)
+                held = False
+                held_time += time.time() - held_since
+                await acquire_all(locks, task, first=True)
+                held = True
+                held_since = time.time()
+                print(f"COM port(s) locked again for {task.name}")
+            await notify(task, {"type": "start", "id": task.id, "yielded": yielded})
+        task_stats.client_wait.observe(time.time() - task.started)
+        outcome = "done" if message else "watchdog" if incident else "gone"
+        result = message.get("result") if message else None
+        print(f"Client response: {task.name} {outcome} - result: {result}")
+        if message is None:
+            # Dead client: whatever it sent last may still sit in the serial buffers
+            if incident:
+                await notify(task, {"type": "abort", "id": task.id, "reason": "watchdog"})
+                task.gone = True
+            record_incident(stats, task, incident or "client went away while holding the COM port(s)", held_time + time.time() - held_since)
+            flush_ports(task.ports)
+    except Exception as e:
+        print(f"Task '{task.name}' failed: {e}")
+    finally:
+        if held:
+            release_all(locks)
+            held_time += time.time() - held_since
+        task_stats.lock_hold.observe(held_time)
+        stats.outcome(task.name, outcome)
+        durations.update(task.name, time.time() - task.started)
+    await notify(task, {"type": "finished", "id": task.id, "waited": round(task.started - task.queued, 3), "held": round(held_time, 3)})
+
+async def notify(task, message):
+    if task.gone:
+        return
+    try:
+        await write_message(task.writer, message)
+    except Exception as e:
+        print(f"Task '{task.name}' failed to notify client: {e}")
+
+async def process_queue(script_queue, port_locks, durations, stats):
+    while True:
+        _, _, task = await script_queue.get()
+        print(f"Processing task: {task.name}")
+
+        # Each task waits for its own ports, tasks on different sender cards run in parallel and tasks on the
+        # same port are served by priority class
+        task.job = asyncio.create_task(run_task(task, port_locks, durations, stats))
         script_queue.task_done()
-        task_event.set()
+
+def reload(config):
+    apply_watchdog(config)
+    apply_ports(config)
 
 async def main():
+    config = load_config()
+    apply_watchdog(config)
+    apply_ports(config)
+    # SIGHUP (systemctl reload) applies new watchdog limits and serial ports, running tasks keep their queue position
+    # and ports
+    try:
+        asyncio.get_event_loop().add_signal_handler(signal.SIGHUP, lambda: reload(load_config()))
+    except (AttributeError, NotImplementedError): # no SIGHUP on Windows, restart the listener instead
+        pass
+
     # Initialize shared resources in the same loop
-    script_queue = asyncio.Queue()
-    com_port_lock = asyncio.Lock()
+    script_queue = asyncio.PriorityQueue()
+    port_locks = {} # one PortLock per serial port, created on first use
+    durations = Durations()
+    stats = Stats()
 
-    # Start the task processor
-    asyncio.create_task(process_queue(script_queue, com_port_lock))
+    # Start the task processor and the periodic summary
+    asyncio.create_task(process_queue(script_queue, port_locks, durations, stats))
+    asyncio.create_task(summary_loop(stats, script_queue, port_locks))
 
-    # Start the server
-    server = await asyncio.start_server(
-        lambda r, w: handle_client(r, w, script_queue),
-        "127.0.0.1",
-        8888
-    )
-    print("Server running on 127.0.0.1:8888")
+    # Start the servers, on the sockets systemd listens on when socket activated
+    client_connected = lambda r, w: handle_client(r, w, script_queue, port_locks, durations, stats)
+    servers = []
+    for sock in activated_sockets():
+        if sock.family == socket.AF_UNIX:
+            servers.append(await asyncio.start_unix_server(client_connected, sock=sock))
+        else:
+            servers.append(await asyncio.start_server(client_connected, sock=sock))
+        print(f"Server running on {sock.getsockname()} (socket activated)")
+    if not servers:
+        for endpoint in load_endpoints(config):
+            servers.append(await serve(endpoint, client_connected))
+            print(f"Server running on {endpoint}")
 
-    async with server:
-        await server.serve_forever()
+    await asyncio.gather(*(server.serve_forever() for server in servers))
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
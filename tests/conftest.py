@@ -0,0 +1,15 @@
+import os, sys, tempfile
+
+# The LEDMonitoring modules and the listener are plain scripts, not an installed package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "packaging", "usr", "local", "share", "LEDMonitoring"))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+# methods.py and base_monitoring.py move to the install directory (/data/opt/LEDMonitoring) when imported. Under
+# test they move to an empty directory instead, the logs and status files of the modules land there
+INSTALL_DIR = tempfile.mkdtemp(prefix="LEDMonitoring-")
+chdir, os.chdir = os.chdir, lambda directory: chdir(INSTALL_DIR)
+try:
+    import methods, base_monitoring
+finally:
+    os.chdir = chdir
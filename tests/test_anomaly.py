@@ -0,0 +1,53 @@
+import pytest
+from anomaly import Detectors, Ewma
+
+PORT = "/dev/ttyUSB0"
+SETTINGS = {"alpha": 0.1, "threshold": 4, "warmup": 5}
+
+
+def sweep(temperature, ts, fresh=True):
+    """Snapshot with one receiver card, its temperature read in this sweep unless fresh is False."""
+    return {
+        "timestamp": ts,
+        "ports": {PORT: {"receiverCard": {0: {"temperature": temperature}}}},
+        "fresh": {PORT: {(0, "temperature"): ts}} if fresh else {},
+    }
+
+
+def test_ewma_starts_as_a_plain_average():
+    ewma = Ewma()
+    for value in (10, 20, 30):
+        ewma.update(value, 0.05)
+    assert ewma.count == 3
+    assert ewma.mean == pytest.approx(20)
+
+
+def test_a_jump_is_an_anomaly_after_the_warmup():
+    detectors = Detectors()
+    for i in range(10):
+        result = detectors.update(sweep(30 + i % 2, i), SETTINGS)
+    assert not result[PORT][0]["temperature"]["anomaly"]
+    score = detectors.update(sweep(60, 10), SETTINGS)[PORT][0]["temperature"]
+    assert score["anomaly"]
+    assert score["deviation"] > 4
+
+
+def test_nothing_is_flagged_during_the_warmup():
+    detectors = Detectors()
+    detectors.update(sweep(30, 0), SETTINGS)
+    assert not detectors.update(sweep(90, 1), SETTINGS)[PORT][0]["temperature"]["anomaly"]
+
+
+def test_min_deviation_keeps_a_flat_series_quiet():
+    detectors = Detectors()
+    for i in range(10):
+        detectors.update(sweep(30, i), SETTINGS)
+    assert not detectors.update(sweep(32, 10), SETTINGS)[PORT][0]["temperature"]["anomaly"] # 2 degrees, minDeviation 1
+
+
+def test_cached_registers_are_not_samples():
+    detectors = Detectors()
+    detectors.update(sweep(30, 0), SETTINGS)
+    for i in range(1, 10):
+        assert detectors.update(sweep(30, i, fresh=False), SETTINGS) == {}
+    assert detectors.series[(PORT, 0, "temperature")].count == 1
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+import base_monitoring, protocol
+from base_monitoring import UNKNOWN
+
+
+def rejected(tmp_path, monkeypatch, **options):
+    """Runs communicate_with_server against a listener rejecting the request. Returns the exception it ended with
+    and every message the listener received, None once the client closed the connection."""
+    endpoint = str(tmp_path / "listener.sock")
+    monkeypatch.setattr(base_monitoring.methods, "listener_endpoint", lambda: endpoint)
+    received = []
+    async def run():
+        finished = asyncio.Event()
+        async def listener(reader, writer):
+            received.append(await protocol.read_message(reader))
+            await protocol.write_message(writer, {"type": "reject", "id": 1, "reason": "deadline"})
+            received.append(await protocol.read_message(reader))
+            finished.set()
+        server = await protocol.start_server(listener, endpoint)
+        async def callback(reader, writer):
+            raise AssertionError("the ports were never granted")
+        try:
+            await base_monitoring.communicate_with_server(callback, "CHECK_DVI", **options)
+        except BaseException as e:
+            error = e
+        await asyncio.wait_for(finished.wait(), 5)
+        server.close()
+        return error
+    return asyncio.run(run()), received
+
+
+def test_a_rejected_sweep_raises_without_output(tmp_path, monkeypatch, capsys):
+    error, received = rejected(tmp_path, monkeypatch, last_good=False)
+    assert isinstance(error, ConnectionError)
+    assert received[0]["task"] == "CHECK_DVI"
+    assert received[1:] == [None] # closed without "done", the task never held the ports
+    assert capsys.readouterr().out == ""
+
+
+def test_a_rejected_check_answers_unknown(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(base_monitoring, "loadConfig", lambda logger_name: {"lastGoodFile": str(tmp_path / "check_results.json")})
+    error, received = rejected(tmp_path, monkeypatch)
+    assert isinstance(error, SystemExit) and error.code == UNKNOWN
+    assert received[1:] == [None]
+    assert capsys.readouterr().out == "COM ports not available before the check deadline\n"
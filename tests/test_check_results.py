@@ -0,0 +1,38 @@
+import time
+import check_results
+from check_results import UNKNOWN
+
+
+def config(tmp_path, max_age=900):
+    return {"lastGoodFile": str(tmp_path / "check_results.json"), "lastGoodMaxAge": max_age}
+
+
+def test_store_leaves_out_unknown_and_cached_answers(tmp_path):
+    filename = str(tmp_path / "check_results.json")
+    results = {"CHECK_DVI": (0, "DVI SIGNAL OK"), "CHECK_MODULES": (UNKNOWN, "NO DEVICE"), "CHECK_CABINET": (0, check_results.mark_cached("OK", 10))}
+    assert check_results.store(results, filename) == 1
+    assert list(check_results.read(filename)) == ["CHECK_DVI"]
+
+
+def test_an_unavailable_unknown_answers_the_last_good_result(tmp_path):
+    settings = config(tmp_path)
+    assert check_results.with_fallback("CHECK_DVI", 2, "DVI SIGNAL MISSING", settings) == (2, "DVI SIGNAL MISSING")
+    exit_code, output = check_results.with_fallback("CHECK_DVI", UNKNOWN, "COM ports busy", settings, unavailable=True)
+    assert exit_code == 2
+    assert output.startswith("(cached, 0s old) DVI SIGNAL MISSING")
+    assert check_results.is_cached(output)
+
+
+def test_other_unknowns_are_passed_on(tmp_path):
+    settings = config(tmp_path)
+    check_results.with_fallback("CHECK_DVI", 0, "DVI SIGNAL OK", settings)
+    assert check_results.with_fallback("CHECK_DVI", UNKNOWN, "NO DEVICE", settings) == (UNKNOWN, "NO DEVICE")
+    assert check_results.with_fallback("CHECK_MODULES", UNKNOWN, "busy", settings, unavailable=True) == (UNKNOWN, "busy")
+
+
+def test_a_result_past_its_max_age_is_not_used(tmp_path):
+    settings = config(tmp_path, max_age=60)
+    check_results.store({"CHECK_DVI": (0, "DVI SIGNAL OK")}, settings["lastGoodFile"], timestamp=time.time() - 120)
+    assert check_results.last_good("CHECK_DVI", 60, settings["lastGoodFile"]) is None
+    assert check_results.last_good("CHECK_DVI", 0, settings["lastGoodFile"]) is None # 0 disables the fallback
+    assert check_results.last_good("CHECK_DVI", 300, settings["lastGoodFile"])[0] == 0
@@ -0,0 +1,92 @@
+import asyncio, logging, time
+import pytest
+import check_runner
+import read_engine
+from check_runner import UNKNOWN, CRITICAL, GOOD
+
+PORT = "/dev/ttyUSB0"
+CONFIG = {"baudrate": 115200, "sleepTime": "0.5", "flashWaitTime": "15", "devices": 1, "receiver_cards": 1, "modules": 4}
+
+
+def sweep(dvi="Valid"):
+    return read_engine.make_snapshot({PORT: {"DVISignal": dvi, "receiverCard": {0: {"kill": "On"}}}})
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    """The globals main() sets up, with the results file in tmp_path and no serial port behind the sweeps."""
+    config = dict(CONFIG, lastGoodFile=str(tmp_path / "check_results.json"), coalesceWindow=0)
+    for name, value in (("config", config), ("logger", logging.getLogger("test")), ("snapshot", None), ("sweep_task", None),
+                        ("pending", None), ("cache", check_runner.RegisterCache()), ("ring", None), ("history", None)):
+        monkeypatch.setattr(check_runner, name, value, raising=False)
+    monkeypatch.setattr(check_runner, "store_snapshot", lambda result: asyncio.sleep(0))
+    sweeps = []
+    async def locked_sweep(registers, register_cache, deadline=None, name="SNAPSHOT"):
+        sweeps.append((name, registers))
+        return sweeps_answer[0]
+    sweeps_answer = [sweep()]
+    monkeypatch.setattr(check_runner, "locked_sweep", locked_sweep)
+    monkeypatch.setattr(check_runner, "sweeps", sweeps, raising=False) # what the test swept, and what the sweeps return
+    monkeypatch.setattr(check_runner, "sweeps_answer", sweeps_answer, raising=False)
+    return check_runner
+
+
+def test_validate_config():
+    assert check_runner.validate_config(CONFIG) == []
+    problems = check_runner.validate_config(dict(CONFIG, baudrate="fast", sweepInterval=-1, pollingCadence={"dvi": "often"}))
+    assert problems == ["baudrate is not a number", "sweepInterval below 0", "pollingCadence must give seconds per register"]
+    assert "modules missing" in check_runner.validate_config({key: value for key, value in CONFIG.items() if key != "modules"})
+
+
+def test_a_live_batch_reads_every_check_in_one_sweep(runner):
+    async def run():
+        return await runner.answer(["CHECK_DVI", "CHECK_CABINET", "CHECK_FOO"], time.time() + 10)
+    answers = asyncio.run(run())
+    assert runner.sweeps == [("CHECK_CABINET+CHECK_DVI", ["dvi", "kill_mode"])]
+    assert answers == [(GOOD, "DVI SIGNAL OK"), (GOOD, f"{PORT}\nAll CABINETS OK - DISPLAY OK"), (UNKNOWN, "Unknown check: CHECK_FOO")]
+
+
+def test_a_live_check_whose_sweep_failed_answers_the_last_good_result(runner):
+    async def run():
+        first = await runner.answer(["CHECK_DVI"], time.time() + 10)
+        runner.sweeps_answer[0] = None
+        runner.snapshot = None
+        return first, await runner.answer(["CHECK_DVI"], time.time() + 10), await runner.answer(["CHECK_CABINET"], time.time() + 10)
+    first, cached, unknown = asyncio.run(run())
+    assert first == [(GOOD, "DVI SIGNAL OK")]
+    assert cached[0][0] == GOOD and cached[0][1].startswith("(cached, ")
+    assert unknown == [(UNKNOWN, runner.NOT_READ)]
+
+
+def test_snapshot_mode_answers_from_the_snapshot(runner):
+    runner.config.update(snapshotMode="Enabled", snapshotMaxAge=60)
+    runner.snapshot = sweep(dvi="Not valid")
+    answers = asyncio.run(runner.answer(["CHECK_DVI"], time.time() + 10))
+    assert answers == [(CRITICAL, "DVI SIGNAL MISSING")]
+    assert runner.sweeps == []
+
+
+def test_a_stale_snapshot_is_refreshed_first(runner):
+    runner.config.update(snapshotMode="Enabled", snapshotMaxAge=60)
+    runner.snapshot = sweep(dvi="Not valid")
+    runner.snapshot["timestamp"] -= 120
+    assert asyncio.run(runner.answer(["CHECK_DVI"], time.time() + 10)) == [(GOOD, "DVI SIGNAL OK")]
+    assert [name for name, _ in runner.sweeps] == ["SNAPSHOT"]
+    runner.sweeps_answer[0] = None
+    runner.snapshot["timestamp"] -= 120
+    assert asyncio.run(runner.answer(["CHECK_CABINET"], time.time() + 10)) == [(UNKNOWN, runner.NO_SNAPSHOT.format(60))]
+
+
+def test_batch_requests_get_one_results_message(runner):
+    class Writer:
+        def __init__(self):
+            self.data = b""
+        def write(self, data):
+            self.data += data
+        async def drain(self):
+            pass
+    writer = Writer()
+    asyncio.run(runner.handle_message({"type": "request", "id": 7, "checks": ["check_dvi", "CHECK_CABINET"]}, writer))
+    reply = runner.protocol.decode(writer.data[runner.protocol.HEADER.size:])
+    assert (reply["type"], reply["id"]) == ("results", 7)
+    assert [(result["check"], result["exit_code"]) for result in reply["results"]] == [("CHECK_DVI", GOOD), ("CHECK_CABINET", GOOD)]
@@ -0,0 +1,44 @@
+import time
+import exporter
+
+PORT = "/dev/ttyUSB0"
+
+
+def snapshot(dvi, receiver):
+    return {
+        "timestamp": time.time(),
+        "devices": 1,
+        "ports": {PORT: {"controllerModel": "MCTRL300", "DVISignal": dvi, "brightnessLevelPC": 50, "receiverCard": {0: receiver}}},
+    }
+
+
+def samples(text):
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+
+def test_render_writes_each_family_once():
+    text = exporter.render(snapshot("Valid", {"temperature": 31, "voltage": 5.1, "kill": "On", "modulesOk": True, "moduleFaults": 0}))
+    assert text.endswith("# EOF\n")
+    assert 'led_dvi_signal_valid{port="/dev/ttyUSB0",model="MCTRL300"} 1' in samples(text)
+    assert 'led_receiver_modules_ok{port="/dev/ttyUSB0",model="MCTRL300",receiver="0"} 1' in samples(text)
+    assert 'led_receiver_cabinet_on{port="/dev/ttyUSB0",model="MCTRL300",receiver="0"} 1' in samples(text)
+    assert text.count("# TYPE led_receiver_temperature_celsius gauge") == 1
+
+
+def test_a_missing_signal_is_zero():
+    text = exporter.render(snapshot("Not valid", {"modulesOk": False, "moduleFaults": 2}))
+    assert 'led_dvi_signal_valid{port="/dev/ttyUSB0",model="MCTRL300"} 0' in samples(text)
+    assert 'led_receiver_modules_ok{port="/dev/ttyUSB0",model="MCTRL300",receiver="0"} 0' in samples(text)
+
+
+def test_values_read_as_na_are_left_out():
+    text = exporter.render(snapshot("N/A", {"temperature": "N/A", "modulesOk": "N/A", "moduleFaults": "N/A", "moduleFlashOk": "N/A"}))
+    for name in ("dvi_signal_valid", "receiver_temperature_celsius", "receiver_modules_ok", "receiver_module_faults", "receiver_module_flash_ok"):
+        assert "led_" + name not in text
+    assert 'led_brightness_percent{port="/dev/ttyUSB0",model="MCTRL300"} 50' in samples(text)
+
+
+def test_no_snapshot_only_renders_the_self_metrics():
+    text = exporter.render(None)
+    assert "led_exporter_scrapes_total" in text
+    assert "led_snapshot_age_seconds" not in text
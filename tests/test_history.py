@@ -0,0 +1,66 @@
+import time
+import pytest
+import history
+from history import History, SENDER
+
+PORT = "/dev/ttyUSB0"
+
+
+def sweep(ts, temperature, brightness=50, fresh_keys=((0, "temperature"), (None, "brightnessLevelPC"))):
+    return {
+        "timestamp": ts,
+        "ports": {PORT: {"brightnessLevelPC": brightness, "receiverCard": {0: {"temperature": temperature, "voltage": "N/A"}}}},
+        "fresh": {PORT: {key: ts for key in fresh_keys}},
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    recorder = History(str(tmp_path / "history.db"))
+    yield recorder
+    recorder.close()
+
+
+def test_fresh_samples_only_keep_registers_read_in_the_sweep():
+    snapshot = sweep(120, 30, fresh_keys=[(0, "temperature")])
+    snapshot["fresh"][PORT][(0, "temperature")] = 118.5
+    assert history.fresh_samples(snapshot) == [(118.5, PORT, 0, "temperature", 30.0)]
+
+
+def test_record_writes_samples_and_rollups(db):
+    day = int(time.time()) // 86400 * 86400 - 86400 # yesterday, younger than the raw sample retention
+    assert db.record(sweep(day + 60, 30)) == 2
+    assert db.record(sweep(day + 90, 34)) == 2
+    assert db.record(sweep(day + 130, 40)) == 2
+    assert history.raw_values(db.db, PORT, 0, "temperature", day, day + 1000) == [30, 34, 40]
+    assert history.raw_values(db.db, PORT, SENDER, "brightness", day, day + 1000) == [50, 50, 50]
+    minutes = history.rollup_values(db.db, 60, PORT, 0, "temperature", day + 60, day + 180)
+    assert sorted(minutes) == [(30, 34, 64, 2), (40, 40, 40, 1)]
+    assert history.rollup_values(db.db, 86400, PORT, 0, "temperature", day, day + 1000) == [(30, 40, 104, 3)]
+    assert history.series(db.db, metric="temperature") == [(PORT, 0, "temperature")]
+
+
+def test_expire_drops_samples_and_rollups_past_their_retention(db, monkeypatch):
+    now = 100 * 86400
+    monkeypatch.setattr(history.time, "time", lambda: now)
+    db.record(sweep(now - history.RAW_MAX_AGE - 60, 30))
+    db.record(sweep(now - 60, 31))
+    db.expire()
+    assert history.raw_values(db.db, PORT, 0, "temperature", 0, now) == [31]
+    assert len(history.rollup_values(db.db, 60, PORT, 0, "temperature", 0, now)) == 2 # a month of minutes
+    db.record(sweep(now - 40 * 86400, 32))
+    db.expire()
+    assert len(history.rollup_values(db.db, 60, PORT, 0, "temperature", 0, now)) == 2
+    assert len(history.rollup_values(db.db, 86400, PORT, 0, "temperature", 0, now)) == 3 # daily rollups are kept
+
+
+def test_prune_keeps_the_database_below_max_bytes(db):
+    start = time.time() - 3600
+    for i in range(200):
+        db.record(sweep(start + i, 30 + i % 5))
+    db.max_bytes = db.used_bytes() // 2
+    db.prune()
+    assert db.used_bytes() <= db.max_bytes
+    remaining = db.db.execute("SELECT min(ts), count(*) FROM samples").fetchone()
+    assert 0 < remaining[1] < 400
+    assert remaining[0] > start # the oldest samples went first
@@ -0,0 +1,68 @@
+import argparse, json, time
+import pytest
+import history, history_query
+from history import History
+
+PORT = "/dev/ttyUSB0"
+
+
+def sweep(ts, temperatures):
+    return {
+        "timestamp": ts,
+        "ports": {PORT: {"receiverCard": {receiver: {"temperature": value} for receiver, value in enumerate(temperatures)}}},
+        "fresh": {PORT: {(receiver, "temperature"): ts for receiver in range(len(temperatures))}},
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    recorder = History(str(tmp_path / "history.db"))
+    now = time.time()
+    for i, temperatures in enumerate([(30, 40), (32, 42), (34, 44), (36, 46)]):
+        recorder.record(sweep(now - 3600 + i * 60, temperatures))
+    yield recorder
+    recorder.close()
+
+
+def query(db, by="series", resolution=None):
+    args = argparse.Namespace(metric="temperature", port=None, receiver=None, start=time.time() - 7200, end=time.time(), by=by)
+    return history_query.aggregate(db.db, args, resolution)
+
+
+def test_parse_time():
+    assert history_query.parse_time("1700000000") == 1700000000
+    assert history_query.parse_time("24h") == pytest.approx(time.time() - 86400, abs=5)
+    with pytest.raises(argparse.ArgumentTypeError):
+        history_query.parse_time("yesterday")
+
+
+def test_short_recent_ranges_read_raw_samples():
+    now = time.time()
+    assert history_query.choose_resolution(now - 3600, now, history.RAW_MAX_AGE) is None
+    assert history_query.choose_resolution(now - 30 * 86400, now, history.RAW_MAX_AGE) == 900
+    assert history_query.choose_resolution(now - 3 * 365 * 86400, now, history.RAW_MAX_AGE) == 86400
+
+
+def test_p95_is_the_nearest_rank():
+    assert history_query.p95(list(range(1, 101))) == 95
+    assert history_query.p95([7]) == 7
+    assert history_query.p95([]) is None
+
+
+def test_aggregate_per_series_and_per_port(db):
+    rows = query(db)
+    assert [(row["receiver"], row["count"], row["min"], row["max"], row["avg"]) for row in rows] == [(0, 4, 30, 36, 33), (1, 4, 40, 46, 43)]
+    assert [(row["receiver"], row["count"], row["min"], row["max"], row["avg"]) for row in query(db, by="port")] == [("*", 8, 30, 46, 38)]
+
+
+def test_rollups_keep_min_and_max_exact(db):
+    raw, rolled = query(db, by="port"), query(db, by="port", resolution=60)
+    assert (rolled[0]["min"], rolled[0]["max"], rolled[0]["count"], rolled[0]["avg"]) == (raw[0]["min"], raw[0]["max"], raw[0]["count"], raw[0]["avg"])
+
+
+def test_main_prints_json(db, monkeypatch, capsys):
+    monkeypatch.setattr(history_query.methods, "loadConfig", lambda logger_name: {"historyFile": db.filename})
+    assert history_query.main(["history_query.py", "-m", "temperature", "--since", "2h", "--by", "metric", "--format", "json"]) == 0
+    output = json.loads(capsys.readouterr().out)
+    assert output["resolution"] == "raw"
+    assert [(row["metric"], row["count"]) for row in output["results"]] == [("temperature", 8)]
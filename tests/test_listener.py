@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+import monitoring_listener as listener
+from monitoring_listener import PortLock, PRIORITIES, Task
+
+
+def task(name, priority):
+    return Task(name, name, ["/dev/ttyUSB0"], PRIORITIES[priority], None, None)
+
+
+def grant_order(requests, yielding=None):
+    """Queues the (name, priority) requests behind a task holding the port (and, with yielding, the name of a
+    queued task going back in front of its class), then releases the port until every task had it."""
+    async def run():
+        lock = PortLock()
+        order = []
+        await lock.acquire(task("OWNER", "fast"))
+        async def wait(waiter, first=False):
+            await lock.acquire(waiter, first)
+            order.append(waiter.name)
+        waiters = [asyncio.ensure_future(wait(task(name, priority), name == yielding)) for name, priority in requests]
+        await asyncio.sleep(0)
+        while len(order) < len(requests):
+            lock.release()
+            await asyncio.sleep(0)
+        lock.release()
+        await asyncio.gather(*waiters)
+        assert lock.owner is None
+        return order
+    return asyncio.run(run())
+
+
+def test_port_lock_serves_the_best_priority_first():
+    order = grant_order([("MODULES", "heavy"), ("DVI", "fast"), ("SET_DISPLAY_OFF", "control")])
+    assert order == ["SET_DISPLAY_OFF", "DVI", "MODULES"]
+
+
+def test_port_lock_is_fifo_within_a_class():
+    assert grant_order([("A", "fast"), ("B", "fast"), ("C", "fast")]) == ["A", "B", "C"]
+
+
+def test_a_yielding_task_goes_back_in_front_of_its_class():
+    assert grant_order([("A", "heavy"), ("B", "heavy"), ("C", "control")], yielding="B") == ["C", "B", "A"]
+
+
+def test_a_cancelled_waiter_leaves_the_queue():
+    async def run():
+        lock = PortLock()
+        owner, first, second = task("OWNER", "fast"), task("FIRST", "fast"), task("SECOND", "fast")
+        await lock.acquire(owner)
+        waiting = asyncio.ensure_future(lock.acquire(first))
+        queued = asyncio.ensure_future(lock.acquire(second))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert lock.waiting(PRIORITIES["heavy"])
+        lock.release()
+        await queued
+        return lock.owner
+    assert asyncio.run(run()).name == "SECOND"
+
+
+def test_valid_port():
+    assert listener.valid_port("/dev/ttyUSB3")
+    assert listener.valid_port("/dev/ttyACM0")
+    assert listener.valid_port("/dev/ttyS1")
+    assert not listener.valid_port("/dev/watchdog")
+    assert not listener.valid_port("/dev/ttyUSB0/../watchdog")
+    assert not listener.valid_port(["/dev/ttyUSB0"])
+
+
+def test_parse_request_only_takes_a_list_of_serial_ports():
+    async def run():
+        parsed = listener.parse_request({"task": "CHECK_DVI", "ports": ["/dev/ttyUSB1", "/dev/ttyUSB0", "/dev/ttyUSB1"]}, None, {})
+        assert parsed.ports == ["/dev/ttyUSB0", "/dev/ttyUSB1"]
+        assert parsed.priority == PRIORITIES["fast"]
+        for ports in ("/dev/ttyUSB0", ["/etc/shadow"], [1]):
+            with pytest.raises(ValueError):
+                listener.parse_request({"task": "CHECK_DVI", "ports": ports}, None, {})
+    asyncio.run(run())
+
+
+def test_a_request_without_ports_needs_a_known_port(monkeypatch):
+    monkeypatch.setattr(listener, "present_ports", set)
+    with pytest.raises(ValueError):
+        listener.parse_request({"task": "CHECK_DVI"}, None, {})
+    assert listener.parse_request({"task": "CHECK_DVI"}, None, {"/dev/ttyACM0": PortLock()}).ports == ["/dev/ttyACM0"]
+
+
+def test_listener_ports_replace_the_platform_patterns(monkeypatch):
+    monkeypatch.setattr(listener, "PORT_PATTERNS", list(listener.PORT_PATTERNS))
+    listener.apply_ports({"listenerPorts": ["COM[0-9]", "COM[0-9][0-9]"]})
+    assert listener.valid_port("COM3") and listener.valid_port("COM12")
+    assert not listener.valid_port("/dev/ttyUSB0") and not listener.valid_port("COM3X")
+    for invalid in ([], "/dev/ttyUSB*", ["/dev/*/ttyUSB0"]):
+        listener.apply_ports({"listenerPorts": invalid})
+        assert listener.PORT_PATTERNS == ["COM[0-9]", "COM[0-9][0-9]"]
+
+
+def test_tcp_endpoint_is_opt_in():
+    assert listener.load_endpoints({}) == [listener.DEFAULT_ENDPOINT]
+    assert listener.load_endpoints({"listenerTcpMode": "Enabled"}) == [listener.DEFAULT_ENDPOINT, listener.TCP_ENDPOINT]
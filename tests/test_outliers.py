@@ -0,0 +1,27 @@
+import outliers
+
+
+def wall(temperatures):
+    return {"receiverCard": {receiver: {"temperature": value} for receiver, value in enumerate(temperatures)}}
+
+
+def test_a_hot_cabinet_is_an_outlier():
+    result = outliers.find(wall([30, 31, 30, 32, 31, 45]))
+    assert [outlier["receiver"] for outlier in result["temperature"]] == [5]
+    assert result["temperature"][0]["median"] == 31
+    assert result["temperature"][0]["score"] > outliers.THRESHOLD
+
+
+def test_min_deviation_keeps_a_uniform_wall_quiet():
+    assert outliers.find(wall([30, 30, 30, 30, 31])) == {}
+
+
+def test_needs_min_receivers():
+    assert outliers.find(wall([30, 30, 60])) == {}
+    assert "temperature" in outliers.find(wall([30, 30, 60]), {"minReceivers": 3})
+
+
+def test_missing_values_are_left_out():
+    entry = wall([30, 31, 30, 32, 31, 45])
+    entry["receiverCard"][1]["temperature"] = "N/A"
+    assert [outlier["receiver"] for outlier in outliers.find(entry)["temperature"]] == [5]
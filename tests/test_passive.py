@@ -0,0 +1,57 @@
+import os, threading
+import pytest
+import passive
+
+CONFIG = {"passiveHost": "wall-1", "passiveServices": {"CHECK_DVI": "dvi"}}
+
+
+def test_a_result_is_one_command_line():
+    line = passive.format_result("wall-1", "dvi", 2, "DVI SIGNAL MISSING\nport 1\\2\n", timestamp=1000.7)
+    assert line == "[1000] PROCESS_SERVICE_CHECK_RESULT;wall-1;dvi;2;DVI SIGNAL MISSING\\nport 1\\\\2\n"
+
+
+def test_service_names_default_to_the_check_name():
+    lines = passive.format_results(CONFIG, [("CHECK_DVI", 0, "OK"), ("CHECK_MODULES", 0, "OK")], timestamp=0)
+    assert [line.split(";")[2] for line in lines] == ["dvi", "CHECK_MODULES"]
+
+
+def test_spool_files_appear_complete(tmp_path):
+    path = passive.submit(dict(CONFIG, passiveSpoolDir=str(tmp_path)), [("CHECK_DVI", 0, "OK")], timestamp=0)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    assert path.endswith(passive.SPOOL_SUFFIX)
+    with open(path) as f:
+        assert f.read() == "[0] PROCESS_SERVICE_CHECK_RESULT;wall-1;dvi;0;OK\n"
+
+
+def test_a_long_command_is_written_in_full(tmp_path):
+    pipe = str(tmp_path / "icinga2.cmd")
+    os.mkfifo(pipe)
+    received = []
+    reader = threading.Thread(target=lambda: received.append(open(pipe, "rb").read()))
+    reader.start()
+    while not received and reader.is_alive():
+        try:
+            passive.submit(dict(CONFIG, passiveCommandFile=pipe), [("CHECK_DVI", 0, "x" * 200000)], timestamp=0)
+            break
+        except OSError: # the reader has not opened the pipe yet
+            pass
+    reader.join()
+    assert received[0].decode() == passive.format_result("wall-1", "dvi", 0, "x" * 200000, 0)
+
+
+def test_without_icinga_reading_the_pipe_the_push_fails(tmp_path):
+    pipe = str(tmp_path / "icinga2.cmd")
+    os.mkfifo(pipe)
+    with pytest.raises(OSError):
+        passive.submit(dict(CONFIG, passiveCommandFile=pipe), [("CHECK_DVI", 0, "OK")])
+
+
+def test_a_pipe_which_stays_full_times_out(tmp_path):
+    pipe = str(tmp_path / "icinga2.cmd")
+    os.mkfifo(pipe)
+    fd = os.open(pipe, os.O_RDONLY | os.O_NONBLOCK) # a reader which never reads
+    try:
+        with pytest.raises(TimeoutError):
+            passive.write_command_file(pipe, ["x" * 200000], timeout=0.1)
+    finally:
+        os.close(fd)
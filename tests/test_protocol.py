@@ -0,0 +1,65 @@
+import asyncio, json, socket
+import pytest
+import protocol
+
+
+def test_parse_endpoint():
+    assert protocol.parse_endpoint("/run/LEDMonitoring/listener.sock") == ("unix", "/run/LEDMonitoring/listener.sock")
+    assert protocol.parse_endpoint("127.0.0.1:8888") == ("tcp", ("127.0.0.1", 8888))
+    assert protocol.parse_endpoint(":8889") == ("tcp", ("127.0.0.1", 8889))
+
+
+def test_encode_is_length_prefixed():
+    data = protocol.encode({"type": "done"})
+    (length,) = protocol.HEADER.unpack(data[:protocol.HEADER.size])
+    assert length == len(data) - protocol.HEADER.size
+    assert protocol.decode(data[protocol.HEADER.size:]) == {"type": "done"}
+
+
+def test_decode_rejects_anything_but_an_object():
+    with pytest.raises(ValueError):
+        protocol.decode(b"[1, 2]")
+
+
+def read(data):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await protocol.read_message(reader)
+    return asyncio.run(run())
+
+
+def test_read_message():
+    assert read(protocol.encode({"type": "start", "id": 7})) == {"type": "start", "id": 7}
+
+
+def test_read_message_returns_none_on_a_closed_connection():
+    assert read(b"") is None
+    assert read(protocol.encode({"type": "start"})[:-1]) is None
+
+
+def test_read_message_refuses_oversized_messages():
+    with pytest.raises(ValueError):
+        read(protocol.HEADER.pack(protocol.MAX_MESSAGE_SIZE + 1))
+
+
+def test_blocking_send_and_receive():
+    left, right = socket.socketpair()
+    with left, right:
+        protocol.send_message(left, {"type": "request", "checks": ["CHECK_DVI"]})
+        assert protocol.recv_message(right) == {"type": "request", "checks": ["CHECK_DVI"]}
+        left.close()
+        assert protocol.recv_message(right) is None
+
+
+def test_endpoints_from_config(tmp_path):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"runnerEndpoint": "127.0.0.1:9000"}))
+    assert protocol.endpoints(str(config)) == {"listener": protocol.LISTENER_ENDPOINT, "runner": "127.0.0.1:9000"}
+    config.write_text(json.dumps({"runnerEndpoint": "127.0.0.1:9001"}))
+    assert protocol.endpoints(str(config))["runner"] == "127.0.0.1:9000" # read once per process
+
+
+def test_endpoints_without_config(tmp_path):
+    assert protocol.endpoints(str(tmp_path / "missing.json")) == {"listener": protocol.LISTENER_ENDPOINT, "runner": protocol.RUNNER_ENDPOINT}
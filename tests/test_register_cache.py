@@ -0,0 +1,37 @@
+import register_cache
+from register_cache import RegisterCache
+
+
+def test_get_returns_what_was_put():
+    cache = RegisterCache()
+    cache.put("/dev/ttyUSB0", "dvi", {"DVISignal": "Valid"})
+    cache.put("/dev/ttyUSB0", "kill_mode", {"kill": "On"}, receiver=2)
+    assert cache.get("/dev/ttyUSB0", "dvi") == {"DVISignal": "Valid"}
+    assert cache.get("/dev/ttyUSB0", "kill_mode", 2) == {"kill": "On"}
+    assert cache.get("/dev/ttyUSB0", "kill_mode", 1) is None
+    assert cache.get("/dev/ttyUSB1", "dvi") is None
+
+
+def test_entries_expire_after_max_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(register_cache.time, "time", lambda: now[0])
+    cache = RegisterCache()
+    cache.put("/dev/ttyUSB0", "brightness", {"brightnessLevel": 255})
+    now[0] += 30
+    assert cache.get("/dev/ttyUSB0", "brightness", max_age=60) == {"brightnessLevel": 255}
+    assert cache.get("/dev/ttyUSB0", "brightness", max_age=10) is None
+    assert cache.get("/dev/ttyUSB0", "brightness") == {"brightnessLevel": 255}
+
+
+def test_invalidate():
+    cache = RegisterCache()
+    for port in ("/dev/ttyUSB0", "/dev/ttyUSB1"):
+        cache.put(port, "dvi", {})
+        cache.put(port, "module_status", {}, receiver=0)
+    cache.invalidate(register="module_status")
+    assert len(cache) == 2
+    cache.invalidate(port="/dev/ttyUSB0")
+    assert cache.get("/dev/ttyUSB1", "dvi") == {}
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
@@ -0,0 +1,54 @@
+import pytest
+from ringbuffer import RingBuffer, RingReader
+
+PORT = "/dev/ttyUSB0"
+
+
+@pytest.fixture
+def ring(tmp_path):
+    writer = RingBuffer(str(tmp_path / "telemetry.ring"), capacity=4)
+    yield writer
+    writer.close()
+
+
+def rows(start, count, port=PORT):
+    return [(float(ts), port, 0, "temperature", 30.0 + ts) for ts in range(start, start + count)]
+
+
+def test_reader_gets_the_rows_written_since_its_last_read(ring):
+    reader = RingReader(ring.filename)
+    assert ring.append(rows(0, 2)) == 2
+    count, first = reader.read()
+    assert (count, first) == (2, rows(0, 2))
+    ring.append(rows(2, 1, port="/dev/ttyUSB1"))
+    assert reader.read(count) == (3, rows(2, 1, port="/dev/ttyUSB1"))
+    reader.close()
+
+
+def test_the_oldest_rows_are_overwritten(ring):
+    ring.append(rows(0, 6))
+    reader = RingReader(ring.filename)
+    assert reader.read() == (6, rows(2, 4))
+    reader.close()
+
+
+def test_unknown_metrics_are_skipped(ring):
+    assert ring.append([(0.0, PORT, 0, "humidity", 1.0)] + rows(0, 1)) == 1
+
+
+def test_a_reopened_ring_keeps_its_samples_and_ports(ring):
+    ring.append(rows(0, 2, port="/dev/ttyUSB1"))
+    reopened = RingBuffer(ring.filename, capacity=4)
+    assert reopened.ports == {"/dev/ttyUSB1": 0}
+    reopened.close()
+    resized = RingBuffer(ring.filename, capacity=8) # another capacity starts an empty ring
+    reader = RingReader(ring.filename)
+    assert reader.read() == (0, [])
+    reader.close()
+    resized.close()
+
+
+def test_a_foreign_file_is_refused(tmp_path):
+    (tmp_path / "other").write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        RingReader(str(tmp_path / "other"))
@@ -0,0 +1,74 @@
+import snapshot_checks
+from snapshot_checks import SNAPSHOT_CHECKS, GOOD, WARNING, CRITICAL, UNKNOWN
+
+PORT = "/dev/ttyUSB0"
+CONFIG = {"devices": 1, "receiver_cards": 2, "modules": 4}
+
+
+def card(**values):
+    receiver = {"kill": "On", "modulesOk": True, "moduleFaults": 0, "temperature": 31, "tempValid": "Yes", "voltage": 5.1, "voltageValid": "Yes"}
+    receiver.update(values)
+    return receiver
+
+
+def snapshot(entry=None, **values):
+    if entry is None:
+        entry = {"DVISignal": "Valid", "brightnessLevelPC": 50, "receiverCard": {0: card(), 1: card()}}
+        entry.update(values)
+    return {"timestamp": 0, "ports": {PORT: entry}, "fresh": {}}
+
+
+def test_a_healthy_wall_is_good_everywhere():
+    for check_name, evaluate in SNAPSHOT_CHECKS.items():
+        output, exit_code = evaluate(snapshot(), CONFIG)
+        assert exit_code == GOOD, (check_name, output)
+
+
+def test_messages_match_the_check_scripts():
+    assert snapshot_checks.check_dvi(snapshot(DVISignal="Not valid"), CONFIG) == ("DVI SIGNAL MISSING", CRITICAL)
+    off = snapshot(receiverCard={0: card(), 1: card(kill="Off")})
+    assert snapshot_checks.check_cabinet(off, CONFIG) == (f"{PORT}\nONE OR MORE CABINETS OFF - DISPLAY NOK", CRITICAL)
+    faulty = snapshot(receiverCard={0: card(modulesOk=False, moduleFaults=1), 1: card()})
+    assert snapshot_checks.check_modules(faulty, CONFIG) == ("ERROR IN ONE OR MORE MODULES - 4 EXPECTED, 3 FOUND, RECEIVER_NR 0", CRITICAL)
+    assert snapshot_checks.check_receiving_cards(snapshot(receiverCard={0: card()}), CONFIG) == ("NO of receiver cards 1 EXPECTED 2", CRITICAL)
+
+
+def test_modules_which_could_not_be_read_are_not_ok():
+    unread = snapshot(receiverCard={0: card(modulesOk="N/A", moduleFaults="N/A"), 1: card()})
+    assert snapshot_checks.check_modules(unread, CONFIG)[1] == CRITICAL
+
+
+def test_brightness_ranges():
+    assert snapshot_checks.check_brightness(snapshot(brightnessLevelPC=20), CONFIG)[1] == WARNING
+    assert snapshot_checks.check_brightness(snapshot(brightnessLevelPC=95), CONFIG)[1] == CRITICAL
+    assert snapshot_checks.check_brightness(snapshot(brightnessLevelPC="N/A"), CONFIG)[1] == UNKNOWN
+
+
+def test_a_port_which_could_not_be_read_is_critical():
+    output, exit_code = snapshot_checks.check_dvi(snapshot({"error": "No answer"}), CONFIG)
+    assert (output, exit_code) == (f"Error reading serial port: {PORT} - No answer", CRITICAL)
+
+
+def test_no_sender_card_is_critical():
+    empty = {"timestamp": 0, "ports": {}, "fresh": {}}
+    for evaluate in SNAPSHOT_CHECKS.values():
+        assert evaluate(empty, CONFIG) == (snapshot_checks.NO_DEVICE, CRITICAL)
+
+
+def test_sweep_registers_reads_each_register_once():
+    registers = snapshot_checks.sweep_registers(["CHECK_RECEIVING_CARDS_TEMPERATURE", "CHECK_RECEIVING_CARDS_VOLTAGE", "CHECK_DVI"])
+    assert registers == ["temperature_voltage", "dvi"]
+
+
+def test_live_check_answers_with_the_evaluator_of_the_check(monkeypatch):
+    swept = []
+    monkeypatch.setattr(snapshot_checks.read_engine, "discover", lambda config: {PORT: {}})
+    def sweep_single_port(config, port, registers, entry, cache):
+        swept.append((port, registers))
+        entry["DVISignal"] = "Not valid"
+        return {(None, "DVISignal"): 0}
+    monkeypatch.setattr(snapshot_checks.read_engine, "sweep_single_port", sweep_single_port)
+    output, exit_code, sweep = snapshot_checks.live_check("CHECK_DVI", CONFIG)
+    assert (output, exit_code) == ("DVI SIGNAL MISSING", CRITICAL)
+    assert swept == [(PORT, ["dvi"])]
+    assert sweep["fresh"] == {PORT: {(None, "DVISignal"): 0}}
@@ -0,0 +1,42 @@
+import pytest
+import status_bin
+from status_bin import StatusReader
+from status_store import StatusStore
+
+PORT = "/dev/ttyUSB0"
+STATUS = {PORT: {
+    "controllerModel": "MCTRL300", "DVISignal": "Valid", "brightnessLevelPC": 50, "brightnessLevel": 128, "ambientLightLevel": "N/A",
+    "receiverCard": {"0": {"temperature": 31.5, "voltage": 5.1, "kill": "On", "modulesOk": True, "moduleFlashOk": "N/A",
+                           "tempValid": "Yes", "voltageValid": "Yes", "moduleFaults": 0, "blockFaults": "N/A"}},
+}}
+
+
+def test_decode_returns_what_was_encoded():
+    generation, status = status_bin.decode(status_bin.encode(STATUS, 7))
+    assert generation == 7
+    entry = status[PORT]
+    assert (entry["controllerModel"], entry["up"], entry["DVISignal"], entry["brightnessLevelPC"], entry["ambientLightLevel"]) == ("MCTRL300", True, "Valid", 50, "N/A")
+    assert entry["receiverCard"]["0"] == dict(STATUS[PORT]["receiverCard"]["0"], voltage=pytest.approx(5.1))
+
+
+def test_a_damaged_or_foreign_file_is_refused():
+    data = bytearray(status_bin.encode(STATUS, 1))
+    data[-1] ^= 0xFF
+    for content in (bytes(data), b"JSON" + bytes(data[4:]), b"LEDS"):
+        with pytest.raises(ValueError):
+            status_bin.decode(content)
+
+
+def test_reader_decodes_again_only_after_a_write(tmp_path):
+    store = StatusStore(str(tmp_path / "status.json"))
+    store.update(STATUS)
+    store.flush()
+    reader = StatusReader(status_bin.binary_filename(store.filename))
+    first = reader.read()
+    assert not reader.changed()
+    assert reader.read() is first
+    store.update_port(PORT, {"DVISignal": "Not valid"})
+    store.flush()
+    assert reader.changed()
+    assert reader.read()[PORT]["DVISignal"] == "Missing"
+    assert reader.generation == 2
@@ -0,0 +1,45 @@
+import json
+import status_journal
+from status_store import StatusStore
+
+PORT = "/dev/ttyUSB0"
+
+
+def sweep(last_updated, kill="On"):
+    """Port entry as read_engine builds it, with int receiver keys in the module maps."""
+    return {"lastUpdated": last_updated, "DVISignal": "Valid", "receiverCard": {
+        0: {"kill": kill, "temperature": 30, "module": {0: "OK", 1: "OK"}, "moduleFlash": {0: "OK"}},
+    }}
+
+
+def flush(store, entry):
+    store.update_port(PORT, entry)
+    return store.flush()
+
+
+def journal(tmp_path):
+    return status_journal.read_since(status_journal.journal_filename(str(tmp_path / "status.json")))
+
+
+def test_identical_flushes_write_no_journal_line(tmp_path):
+    store = StatusStore(str(tmp_path / "status.json"))
+    assert flush(store, sweep("19/10/2026 12:00"))
+    first = journal(tmp_path)
+    assert flush(store, sweep("19/10/2026 12:01")) # lastUpdated changed, nothing the journal keeps
+    assert not flush(store, sweep("19/10/2026 12:01"))
+    assert journal(tmp_path) == first
+
+
+def test_changes_are_numbered(tmp_path):
+    store = StatusStore(str(tmp_path / "status.json"))
+    flush(store, sweep("19/10/2026 12:00"))
+    sequence = journal(tmp_path)[-1]["seq"]
+    flush(store, sweep("19/10/2026 12:01", kill="Off"))
+    changes = journal(tmp_path)
+    assert [(c["seq"], c["receiver"], c["key"], c["old"], c["new"]) for c in changes if c["seq"] > sequence] == [(sequence + 1, 0, "kill", "On", "Off")]
+    assert status_journal.read_since(status_journal.journal_filename(str(tmp_path / "status.json")), sequence + 1) == []
+
+
+def test_diff_ignores_key_types_and_measurements():
+    old = json.loads(json.dumps({PORT: sweep("a")}))
+    assert status_journal.diff(old, {PORT: dict(sweep("b"), receiverCard={"0": dict(sweep("b")["receiverCard"][0], temperature=45)})}) == []
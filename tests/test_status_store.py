@@ -0,0 +1,55 @@
+import json
+import methods
+import status_bin
+from status_store import StatusStore
+
+PORT = "/dev/ttyUSB0"
+
+
+def read(tmp_path):
+    with open(tmp_path / "status.json") as f:
+        return json.load(f)
+
+
+def test_updates_are_merged_per_port_and_receiver(tmp_path):
+    store = StatusStore(str(tmp_path / "status.json"))
+    store.update({PORT: {"DVISignal": "Valid", "receiverCard": {0: {"temperature": 30}, 1: {"temperature": 31}}}})
+    assert store.flush()
+    store.update_receiver(PORT, 1, {"voltage": 5.1})
+    store.update_port("/dev/ttyUSB1", {"DVISignal": "Not valid"})
+    assert store.flush()
+    assert read(tmp_path) == {
+        PORT: {"DVISignal": "Valid", "receiverCard": {"0": {"temperature": 30}, "1": {"temperature": 31, "voltage": 5.1}}},
+        "/dev/ttyUSB1": {"DVISignal": "Not valid"},
+    }
+
+
+def test_none_removes_a_key_and_an_unchanged_merge_writes_nothing(tmp_path):
+    store = StatusStore(str(tmp_path / "status.json"))
+    store.update_port(PORT, {"error": "No answer", "DVISignal": "N/A"})
+    store.flush()
+    store.update_port(PORT, {"error": None, "DVISignal": "Valid"})
+    assert store.flush()
+    assert read(tmp_path) == {PORT: {"DVISignal": "Valid"}}
+    store.update_port(PORT, {"DVISignal": "Valid"})
+    assert not store.flush()
+    assert not store.flush() # nothing pending
+
+
+def test_every_write_replaces_status_bin(tmp_path):
+    store = StatusStore(str(tmp_path / "status.json"))
+    binary = status_bin.binary_filename(store.filename)
+    store.update_port(PORT, {"DVISignal": "Valid"})
+    store.flush()
+    store.update_port(PORT, {"DVISignal": "Not valid"})
+    store.flush()
+    assert status_bin.generation(binary) == 2
+
+
+def test_write_data_merges_into_status_json(tmp_path):
+    store = StatusStore(str(tmp_path / "status.json"))
+    store.update_port("/dev/ttyUSB1", {"DVISignal": "Valid"})
+    store.flush()
+    methods.write_data(store.filename, {PORT: {"DVISignal": "Valid"}}, "test")
+    assert read(tmp_path) == {PORT: {"DVISignal": "Valid"}, "/dev/ttyUSB1": {"DVISignal": "Valid"}}
+    assert status_bin.generation(status_bin.binary_filename(store.filename)) == 2